@@ -20,11 +20,16 @@ the most frequent 10,000 become the feature set. A sample is then the count
 of each of those phrases in it. Text drawn in a legacy indic font extracts as
 latin gibberish with its own very distinctive vocabulary ('fnYyh', 'ds', 'ls'
 for chanakya/kruti-dev), which is exactly what a phrase feature set captures.
+
+A corpus too large to count every phrase of is hashed instead (PhraseHasher):
+each phrase is counted in the column its hash picks out of a fixed number of
+them, so no vocabulary is built and the corpus can be read a chunk at a time.
 """
 
 import csv
 import json
 import codecs
+import hashlib
 import logging
 from pathlib import Path
 from collections import Counter
@@ -32,12 +37,20 @@ from collections import Counter
 import numpy as np
 import scipy.sparse as sp
 
-from Orange.data import Table, Domain, DiscreteVariable, ContinuousVariable
+try:
+    from Orange.data import Table, Domain, DiscreteVariable, ContinuousVariable
+    ORANGE_AVAILABLE = True
+except ImportError:
+    # reading the corpus and counting or hashing its phrases need only numpy,
+    # it is the feature table that is Orange's
+    ORANGE_AVAILABLE = False
 
 
 DEFAULT_MIN_N = 1
 DEFAULT_MAX_N = 5
 DEFAULT_TOP_K = 10000
+# the columns of a hashed feature space, see PhraseHasher
+DEFAULT_HASH_BITS = 16
 
 # the corpus: one row per sample, its class in the 'label' column
 CORPUS_CSV    = 'samples.csv'
@@ -82,16 +95,16 @@ def get_class_labels(data_dir):
     return [(p.stem, p) for p in paths]
 
 
-def read_corpus_csv(path, max_per_class = 0, lowercase = False):
-    """[(label, [token, ...]), ...] for every row of the corpus csv.
+def iter_corpus_csv(path, max_per_class = 0, lowercase = False, counts = None):
+    """(label, [token, ...]) for every row of the corpus csv, one at a time.
 
     The cap is per class and the classes are interleaved (the rows are in the
     order the pdfs drew them), so a class that has filled its quota is skipped
-    over rather than stopping the read.
+    over rather than stopping the read. counts, when given, is updated with
+    the samples of each class as they are read.
     """
     csv.field_size_limit(CSV_FIELD_LIMIT)
-    samples = []
-    counts  = Counter()
+    counts = Counter() if counts is None else counts
     with codecs.open(str(path), 'r', encoding = 'utf8') as f:
         reader  = csv.DictReader(f)
         missing = {LABEL_FIELD, TEXT_FIELD}.difference(reader.fieldnames or [])
@@ -107,34 +120,58 @@ def read_corpus_csv(path, max_per_class = 0, lowercase = False):
             tokens = tokenize((row.get(TEXT_FIELD) or '').strip(), lowercase)
             if not tokens:
                 continue
-            samples.append((label, tokens))
             counts[label] += 1
+            yield label, tokens
+
+
+def read_corpus_csv(path, max_per_class = 0, lowercase = False):
+    """[(label, [token, ...]), ...] for every row of the corpus csv."""
+    counts  = Counter()
+    samples = list(iter_corpus_csv(path, max_per_class, lowercase, counts))
 
     for label in sorted(counts):
         logger.info(f'{label}: {counts[label]} sample(s)')
     return samples, counts
 
 
-def read_corpus_files(data_dir, max_per_class = 0, lowercase = False):
+def iter_corpus_files(data_dir, max_per_class = 0, lowercase = False, \
+                      counts = None):
     """The same, from the older one-file-per-class layout."""
-    samples = []
-    counts  = Counter()
+    counts = Counter() if counts is None else counts
     for label, path in get_class_labels(data_dir):
-        taken = 0
         with codecs.open(str(path), 'r', encoding = 'utf8') as f:
             for line in f:
-                if max_per_class and taken >= max_per_class:
+                if max_per_class and counts[label] >= max_per_class:
                     break
                 tokens = tokenize(line.strip(), lowercase)
                 if not tokens:
                     continue
-                samples.append((label, tokens))
-                taken += 1
-        counts[label] = taken
-        logger.info(f'{path.name}: {taken} sample(s)')
+                counts[label] += 1
+                yield label, tokens
+
+
+def read_corpus_files(data_dir, max_per_class = 0, lowercase = False):
+    """The same, from the older one-file-per-class layout."""
+    counts  = Counter()
+    samples = list(iter_corpus_files(data_dir, max_per_class, lowercase, counts))
+
+    for label, path in get_class_labels(data_dir):
+        logger.info(f'{path.name}: {counts[label]} sample(s)')
     return samples, counts
 
 
+def iter_corpus(data_dir, max_per_class = 0, lowercase = False, counts = None):
+    """Every sample of the corpus as read_corpus() reads it, one at a time.
+
+    Nothing is held on to, so a corpus of gigabytes goes through in the
+    memory of one row - which is what the streaming trainer reads it with.
+    """
+    path = Path(data_dir).joinpath(CORPUS_CSV)
+    if path.is_file():
+        return iter_corpus_csv(path, max_per_class, lowercase, counts)
+    return iter_corpus_files(data_dir, max_per_class, lowercase, counts)
+
+
 def read_corpus(data_dir, max_per_class = 0, lowercase = False):
     """[(label, [token, ...]), ...] for every sample of the corpus."""
     data_dir = Path(data_dir)
@@ -201,20 +238,167 @@ def build_vocabulary(samples, top_k = DEFAULT_TOP_K, min_n = DEFAULT_MIN_N, \
     return [phrase for phrase, _count in ranked[:top_k]]
 
 
+class PhraseIndex:
+    """The vocabulary the way vectorize() looks phrases up in it.
+
+    The index of every phrase, and every phrase of it cut short after each
+    of its words: the phrases of a sample are walked from each word on, one
+    word longer at a time, and a phrase that no phrase of the vocabulary
+    starts with cannot be made into one by adding words to it, so the walk
+    stops there. Nearly every word of a sample starts nothing in a 10,000
+    phrase vocabulary, which makes a sample a lookup or two per word rather
+    than the max_n joins and lookups iter_phrases() costs.
+
+    It is built once with the vocabulary and pickled along with the model
+    (see training.save_model), so a process classifying thousands of texts
+    does not build it again for every batch of them.
+    """
+
+    def __init__(self, vocab, min_n = DEFAULT_MIN_N, max_n = DEFAULT_MAX_N):
+        self.vocab    = list(vocab)
+        self.min_n    = min_n
+        self.max_n    = max_n
+        self.index    = {phrase: i for i, phrase in enumerate(self.vocab)}
+        self.prefixes = set()
+        for phrase in self.vocab:
+            words = phrase.split(' ')
+            for size in range(1, len(words)):
+                self.prefixes.add(' '.join(words[:size]))
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def count(self, tokens):
+        """{column: count} of the vocabulary phrases in one sample."""
+        index    = self.index
+        prefixes = self.prefixes
+        num      = len(tokens)
+        counts   = Counter()
+        for start in range(num):
+            phrase = tokens[start]
+            size   = 1
+            while True:
+                if size >= self.min_n:
+                    col = index.get(phrase)
+                    if col is not None:
+                        counts[col] += 1
+                if size >= self.max_n or start + size >= num or \
+                        phrase not in prefixes:
+                    break
+                phrase = phrase + ' ' + tokens[start + size]
+                size  += 1
+        return counts
+
+
+class PhraseHasher:
+    """A fixed number of columns the phrases are hashed into, in place of a
+    vocabulary.
+
+    A vocabulary is the most frequent phrases of the corpus, and finding
+    them means counting every phrase of it first, which grows with the
+    corpus. Hashed, a phrase is the column its hash says, whether it was
+    ever seen or not, so nothing is counted, a corpus can be featurized a
+    chunk at a time as it is read (see training.train_streaming) and the
+    width of the matrix is 2 ** bits however much text there is. Two phrases
+    sharing a column is the price, which at 65,536 columns is rare enough
+    for the few thousand phrases a class is told by.
+
+    The hash is computed for a whole batch of samples at once with numpy: a
+    word is hashed once per batch, and the phrases of each length are the
+    phrases one word shorter times a constant plus the next word, so a
+    phrase is never joined into a string. The hash depends on nothing but
+    the words - not on the process, as hash() does - so a model saved with
+    one of these featurizes the same way wherever it is loaded.
+    """
+
+    MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+    def __init__(self, bits = DEFAULT_HASH_BITS, min_n = DEFAULT_MIN_N, \
+                 max_n = DEFAULT_MAX_N):
+        if not 1 <= bits <= 31:
+            raise ValueError(f'the hash width has to be 1 to 31 bits, not {bits}')
+        self.bits  = bits
+        self.min_n = min_n
+        self.max_n = max_n
+
+    def __len__(self):
+        return 1 << self.bits
+
+    def get_names(self):
+        # there is no phrase to name a column after, only its number
+        return [f'#{i}' for i in range(len(self))]
+
+    @staticmethod
+    def hash_word(word):
+        return int.from_bytes(hashlib.blake2b(\
+            word.encode('utf8', 'surrogatepass'), digest_size = 8).digest(), 'little')
+
+    @staticmethod
+    def mix(hashes):
+        """splitmix64's finalizer, so that every bit of the rolling hash
+        depends on every word of the phrase before the top bits are taken."""
+        hashes = hashes ^ (hashes >> np.uint64(30))
+        hashes = hashes * np.uint64(0xBF58476D1CE4E5B9)
+        hashes = hashes ^ (hashes >> np.uint64(27))
+        hashes = hashes * np.uint64(0x94D049BB133111EB)
+        return hashes ^ (hashes >> np.uint64(31))
+
+    def transform(self, token_lists):
+        """A sparse count matrix, a row per list of words."""
+        words   = {}
+        lengths = np.fromiter((len(tokens) for tokens in token_lists), \
+                              dtype = np.int64, count = len(token_lists))
+        flat    = np.fromiter((words[w] if w in words else \
+                               words.setdefault(w, self.hash_word(w)) \
+                               for tokens in token_lists for w in tokens), \
+                              dtype = np.uint64, count = int(lengths.sum()))
+        rows    = np.repeat(np.arange(len(token_lists)), lengths)
+        # how many words of its sample there are from each word on
+        left    = np.repeat(np.cumsum(lengths), lengths) - np.arange(len(flat))
+
+        all_rows = []
+        all_cols = []
+        phrases  = flat
+        with np.errstate(over = 'ignore'):
+            for size in range(1, self.max_n + 1):
+                if size > 1:
+                    # phrases[i] is the hash of the words i .. i + size - 1
+                    phrases = phrases[:-1] * self.MULTIPLIER + flat[size - 1:]
+                if size < self.min_n:
+                    continue
+                whole = left[:len(phrases)] >= size
+                cols  = self.mix(phrases[whole] ^ np.uint64(size)) >> \
+                        np.uint64(64 - self.bits)
+                all_cols.append(cols.astype(np.int64))
+                all_rows.append(rows[:len(phrases)][whole])
+
+        rows = np.concatenate(all_rows) if all_rows else np.zeros(0, np.int64)
+        cols = np.concatenate(all_cols) if all_cols else np.zeros(0, np.int64)
+        # the repeats of a phrase in a sample are summed into its count
+        return sp.csr_matrix(\
+            (np.ones(len(rows), dtype = np.float64), (rows, cols)), \
+            shape = (len(token_lists), len(self)))
+
+
 def vectorize(samples, vocab, min_n = DEFAULT_MIN_N, max_n = DEFAULT_MAX_N):
-    """Samples as a sparse count matrix over the vocabulary."""
-    index   = {phrase: i for i, phrase in enumerate(vocab)}
+    """Samples as a sparse count matrix over the vocabulary.
+
+    vocab is the list of phrases, or the PhraseIndex of it when there is one
+    already - which then also says min_n and max_n - or a PhraseHasher.
+    """
+    if isinstance(vocab, PhraseHasher):
+        return vocab.transform([tokens for _label, tokens in samples])
+    if not isinstance(vocab, PhraseIndex):
+        vocab = PhraseIndex(vocab, min_n, max_n)
+
     indptr  = [0]
     indices = []
     data    = []
     for _label, tokens in samples:
-        counts = Counter()
-        for phrase in iter_phrases(tokens, min_n, max_n):
-            col = index.get(phrase)
-            if col is not None:
-                counts[col] += 1
-        indices.extend(counts.keys())
-        data.extend(counts.values())
+        counts = vocab.count(tokens)
+        cols   = sorted(counts)
+        indices.extend(cols)
+        data.extend(counts[col] for col in cols)
         indptr.append(len(indices))
 
     return sp.csr_matrix(\
@@ -224,9 +408,13 @@ def vectorize(samples, vocab, min_n = DEFAULT_MIN_N, max_n = DEFAULT_MAX_N):
 
 
 def get_domain(vocab, labels):
+    if not ORANGE_AVAILABLE:
+        raise ImportError('Orange3 is needed to build a feature table')
     # a phrase can contain anything the pdf drew, and Orange takes the name
     # verbatim, so only the feature index is guaranteed unique - the phrase
     # itself rides along in the attribute's metadata for readability
+    if isinstance(vocab, PhraseHasher):
+        vocab = vocab.get_names()
     features = []
     for i, phrase in enumerate(vocab):
         var = ContinuousVariable(f'f{i}: {phrase}')
@@ -248,11 +436,19 @@ def build_table(samples, vocab, min_n = DEFAULT_MIN_N, max_n = DEFAULT_MAX_N):
 
 def build_dataset(data_dir, top_k = DEFAULT_TOP_K, min_n = DEFAULT_MIN_N, \
                   max_n = DEFAULT_MAX_N, max_per_class = 0, \
-                  min_samples = 10, lowercase = False, prune_at = 2000000):
-    """Corpus directory -> (Orange Table, vocabulary)."""
+                  min_samples = 10, lowercase = False, prune_at = 2000000, \
+                  hash_bits = 0):
+    """Corpus directory -> (Orange Table, vocabulary).
+
+    With hash_bits the phrases are hashed into 2 ** hash_bits columns and
+    the vocabulary is the PhraseHasher that does it; nothing is counted.
+    """
     samples, _counts = read_corpus(data_dir, max_per_class, lowercase)
     samples = drop_small_classes(samples, min_samples)
-    vocab   = build_vocabulary(samples, top_k, min_n, max_n, prune_at)
+    if hash_bits:
+        vocab = PhraseHasher(hash_bits, min_n, max_n)
+    else:
+        vocab = build_vocabulary(samples, top_k, min_n, max_n, prune_at)
     logger.info(f'{len(samples)} sample(s), {len(vocab)} feature(s)')
 
     table = build_table(samples, vocab, min_n, max_n)
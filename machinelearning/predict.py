@@ -5,12 +5,17 @@
 
 As a library:
 
-    classifier = FontClassifier('model/eng_hin_fonts.pkl')
+    classifier = FontClassifier.load('model/eng_hin_fonts.pkl')
     label, prob = classifier.classify(text)
+
+load() keeps the model for the rest of the process, so the documents a
+process converts one after the other share one copy of it.
 """
 
+import os
 import codecs
 import argparse
+import threading
 
 import numpy as np
 
@@ -23,6 +28,14 @@ from machinelearning.training import load_model
 class FontClassifier:
     """The trained model plus everything needed to featurize new text."""
 
+    # texts featurized and classified at once by classify_all(), which bounds
+    # the size of the count matrix however many texts are asked about
+    BATCH_SIZE = 1024
+
+    # model path -> (mtime, FontClassifier), see load()
+    loaded      = {}
+    loaded_lock = threading.Lock()
+
     def __init__(self, model_path):
         saved        = load_model(model_path)
         self.model   = saved['model']
@@ -32,23 +45,49 @@ class FontClassifier:
         self.min_n   = self.params.get('min_n', features.DEFAULT_MIN_N)
         self.max_n   = self.params.get('max_n', features.DEFAULT_MAX_N)
         self.lower   = self.params.get('lowercase', False)
+        # a model saved before the index was saved with it gets one built here
+        self.phrase_index = saved.get('phrase_index') or \
+                            features.PhraseIndex(self.vocab, self.min_n, self.max_n)
+
+    @classmethod
+    def load(cls, model_path):
+        """The classifier of model_path, loaded once per process.
+
+        Unpickling the model and importing Orange is most of what classifying
+        a document's fonts costs, so the classifier is kept for every later
+        document of the process, and loaded again only if the file changes.
+        """
+        model_path = os.path.abspath(str(model_path))
+        mtime      = os.stat(model_path).st_mtime_ns
+        with cls.loaded_lock:
+            known = cls.loaded.get(model_path)
+            if known is None or known[0] != mtime:
+                known = (mtime, cls(model_path))
+                cls.loaded[model_path] = known
+        return known[1]
 
     def get_table(self, texts):
         samples = [(None, features.tokenize(t, self.lower)) for t in texts]
-        X = features.vectorize(samples, self.vocab, self.min_n, self.max_n)
+        X = features.vectorize(samples, self.phrase_index)
         # the domain has a class variable and from_numpy insists on a column
         # for it; unknown is exactly what it is, that is what is being asked
         y = np.full(len(samples), np.nan)
         return Table.from_numpy(self.model.domain, X, y)
 
     def classify_all(self, texts):
-        """[(label, probability), ...], one per text."""
-        if not texts:
-            return []
-        probs = self.model(self.get_table(texts), self.model.Probs)
-        best  = np.argmax(probs, axis = 1)
-        return [(self.labels[i], float(probs[row][i])) \
-                for row, i in enumerate(best)]
+        """[(label, probability), ...], one per text.
+
+        The texts may come from any number of documents: they are featurized
+        and classified BATCH_SIZE at a time.
+        """
+        results = []
+        for start in range(0, len(texts), self.BATCH_SIZE):
+            batch = texts[start:start + self.BATCH_SIZE]
+            probs = self.model(self.get_table(batch), self.model.Probs)
+            best  = np.argmax(probs, axis = 1)
+            results.extend((self.labels[i], float(probs[row][i])) \
+                           for row, i in enumerate(best))
+        return results
 
     def classify(self, text):
         return self.classify_all([text])[0]
@@ -88,7 +127,7 @@ if __name__ == '__main__':
     if not texts:
         raise SystemExit('error: give something to classify with -t or -f')
 
-    classifier = FontClassifier(args.model_file)
+    classifier = FontClassifier.load(args.model_file)
     for text, (label, prob) in zip(texts, classifier.classify_all(texts)):
         # -w hands a whole file over as one sample, so the echo of it has to
         # stay on the one line its verdict is on
@@ -7,17 +7,34 @@ the top 10,000 phrase features (see features.py), runs a stratified k fold cross
 validation over every requested learner, and trains the chosen one on the
 whole corpus and pickles it together with its vocabulary so predict.py can
 classify the text of a font whose name says nothing about its encoding.
+
+A corpus too large to hold is trained on with -st/--stream instead:
+
+    python -m machinelearning.training -d training_data -m model/eng_hin_fonts.pkl -st
+
+which hashes the phrases (see features.PhraseHasher) and trains a logistic
+SGD classifier a chunk of the csv at a time, so that memory is bounded by
+the chunk rather than the corpus. The model it saves is an Orange model like
+any other, and predict.py loads it the same way.
 """
 
 import time
 import pickle
 import codecs
+import random
 import logging
 import argparse
 import warnings
+from collections import Counter
 
 import numpy as np
+import scipy.sparse as sp
 
+from sklearn.linear_model import SGDClassifier
+
+from Orange.base import Learner
+from Orange.data import Table
+from Orange.classification.base_classification import SklModelClassification
 from Orange.evaluation import CrossValidation, CA, F1, Precision, Recall
 from Orange.classification import LogisticRegressionLearner, \
                                   RandomForestLearner, \
@@ -40,6 +57,10 @@ LEARNERS = {
 
 DEFAULT_LEARNERS = ['logistic', 'sgd']
 
+# samples featurized and trained on at once by train_streaming()
+DEFAULT_CHUNK_SIZE = 10000
+DEFAULT_EPOCHS     = 5
+
 
 def get_learners(names):
     learners = []
@@ -87,17 +108,22 @@ def get_confusion(results, index, num_labels):
 def format_confusion(table, results, names):
     """The confusion matrix of each learner, in samples not proportions."""
     labels = list(table.domain.class_var.values)
-    width  = max(len(l) for l in labels + ['predicted ->']) + 2
     lines  = []
     for i, name in enumerate(names):
-        matrix = get_confusion(results, i, len(labels))
-        lines.append('')
-        lines.append(f'{name}: rows are the true font, columns the predicted')
-        lines.append(' ' * width + ''.join(f'{l:>{width}}' for l in labels))
-        for row, label in enumerate(labels):
-            counts = ''.join(f'{int(matrix[row][col]):>{width}}' \
-                             for col in range(len(labels)))
-            lines.append(f'{label:<{width}}{counts}')
+        lines.extend(format_confusion_matrix(\
+            name, labels, get_confusion(results, i, len(labels))))
+    return lines
+
+
+def format_confusion_matrix(name, labels, matrix):
+    width = max(len(l) for l in labels + ['predicted ->']) + 2
+    lines = ['']
+    lines.append(f'{name}: rows are the true font, columns the predicted')
+    lines.append(' ' * width + ''.join(f'{l:>{width}}' for l in labels))
+    for row, label in enumerate(labels):
+        counts = ''.join(f'{int(matrix[row][col]):>{width}}' \
+                         for col in range(len(labels)))
+        lines.append(f'{label:<{width}}{counts}')
     return lines
 
 
@@ -133,13 +159,143 @@ def train(table, learner):
     return model
 
 
+class PretrainedLearner(Learner):
+    """Hands Orange a scikit-learn classifier that is trained already.
+
+    train_streaming() trains outside of Orange, which only learns from a
+    Table held whole, so the model it saves is made by calling this on a
+    Table of one row per class: that gives the Orange model the domain and
+    the classes predict.py relies on, and its predictions are the ones of
+    the classifier handed in.
+    """
+
+    # the features are counts already, there is nothing to continuize or
+    # impute - and nothing to learn from the one row per class either
+    preprocessors = []
+
+    def __init__(self, skl_model, name = 'sgd-stream'):
+        super().__init__()
+        self.skl_model = skl_model
+        self.name      = name
+
+    def fit(self, X, Y, W = None):
+        return SklModelClassification(self.skl_model)
+
+
+def iter_chunks(samples, chunk_size):
+    chunk = []
+    for sample in samples:
+        chunk.append(sample)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def train_streaming(data_dir, hasher, max_per_class = 0, min_samples = 10, \
+                    lowercase = False, chunk_size = DEFAULT_CHUNK_SIZE, \
+                    epochs = DEFAULT_EPOCHS, holdout = 10):
+    """Train on a corpus read a chunk at a time: (Orange model, report).
+
+    The corpus is read once to find its classes, and then once per epoch,
+    each chunk of it hashed and handed to SGDClassifier.partial_fit(), so
+    no more than chunk_size samples are held at any time. With holdout every
+    holdout-th sample is kept out of the training and the model is scored
+    on those at the end, which is the evaluation a corpus too large for
+    cross validation gets.
+    """
+    counts = Counter()
+    for _sample in features.iter_corpus(data_dir, max_per_class, lowercase, counts):
+        pass
+    if not counts:
+        raise ValueError(f'no samples in {data_dir}')
+    for label in sorted(counts):
+        logger.info(f'{label}: {counts[label]} sample(s)')
+
+    labels = sorted(l for l, c in counts.items() if c >= min_samples)
+    for label in sorted(set(counts).difference(labels)):
+        logger.warning(f'dropping class {label}: only {counts[label]} '
+                       f'sample(s), fewer than the {min_samples} needed')
+    if len(labels) < 2:
+        raise ValueError(\
+            f'only {len(labels)} class(es) left with at least '
+            f'{min_samples} samples - nothing to learn from')
+    index = {label: i for i, label in enumerate(labels)}
+
+    def iter_split(training):
+        """The samples of the kept classes, either side of the holdout."""
+        samples = features.iter_corpus(data_dir, max_per_class, lowercase)
+        for i, (label, tokens) in enumerate(samples):
+            if label not in index:
+                continue
+            if holdout and (i % holdout == 0) == training:
+                continue
+            yield index[label], tokens
+
+    def featurize(chunk):
+        X = hasher.transform([tokens for _y, tokens in chunk])
+        y = np.array([y for y, _tokens in chunk], dtype = np.float64)
+        return X, y
+
+    # log loss, for the probabilities predict.py reports
+    clf     = SGDClassifier(loss = 'log_loss', random_state = 42)
+    classes = np.arange(len(labels), dtype = np.float64)
+    rng     = random.Random(42)
+    start   = time.time()
+    for epoch in range(epochs):
+        seen = 0
+        for chunk in iter_chunks(iter_split(True), chunk_size):
+            # the csv is in the order the pdfs drew their text, a class at a
+            # stretch, which a chunk is shuffled out of
+            rng.shuffle(chunk)
+            X, y = featurize(chunk)
+            clf.partial_fit(X, y, classes = classes)
+            seen += len(chunk)
+        logger.info(f'epoch {epoch + 1}/{epochs}: {seen} sample(s), '
+                    f'{time.time() - start:.1f}s')
+
+    lines = ['', f'{sum(counts[l] for l in labels)} sample(s), '
+                 f'{len(hasher)} hashed feature(s)']
+    lines.extend(f'    {label:<20} {counts[label]}' for label in labels)
+
+    if holdout:
+        matrix = np.zeros((len(labels), len(labels)), dtype = np.int64)
+        for chunk in iter_chunks(iter_split(False), chunk_size):
+            X, y = featurize(chunk)
+            np.add.at(matrix, (y.astype(int), clf.predict(X).astype(int)), 1)
+        total = int(matrix.sum())
+        if total:
+            lines.append('')
+            lines.append(f'held out every {holdout}th sample, {total} in all: '
+                         f'CA {np.trace(matrix) / total:.4f}')
+            lines.extend(format_confusion_matrix('sgd-stream', labels, matrix))
+
+    # the one row per class that gives the model its domain, see
+    # PretrainedLearner
+    domain = features.get_domain(hasher, labels)
+    table  = Table.from_numpy(domain, sp.csr_matrix((len(labels), len(hasher))), \
+                              classes)
+    return PretrainedLearner(clf)(table), '\n'.join(lines)
+
+
 def save_model(path, model, vocab, params):
+    # the index predict.py featurizes with goes along, so that loading the
+    # model is all a process has to do before classifying; a hashed model
+    # has no vocabulary, its hasher is all there is
+    if isinstance(vocab, features.PhraseHasher):
+        phrase_index, vocab = vocab, []
+    else:
+        phrase_index = features.PhraseIndex(\
+            vocab, params.get('min_n', features.DEFAULT_MIN_N), \
+            params.get('max_n', features.DEFAULT_MAX_N))
     with open(path, 'wb') as f:
         pickle.dump({
-            'model':  model,
-            'vocab':  vocab,
-            'params': params,
-            'labels': list(model.domain.class_var.values),
+            'model':        model,
+            'vocab':        vocab,
+            'params':       params,
+            'labels':       list(model.domain.class_var.values),
+            'phrase_index': phrase_index,
         }, f)
     logger.info(f'wrote {path}')
 
@@ -207,6 +363,28 @@ def get_arg_parser():
                         action = 'store', type = int, default = 10, \
                         help = 'drop a class with fewer samples than this, it '
                                'cannot be split across folds (default 10)')
+    parser.add_argument('-hb', '--hash-bits', dest = 'hash_bits', \
+                        action = 'store', type = int, default = 0, \
+                        help = 'hash the phrases into 2 ** N columns instead '
+                               'of counting them for a top -tk vocabulary '
+                               '(default 0, a vocabulary; -st hashes into '
+                               f'2 ** {features.DEFAULT_HASH_BITS} unless told)')
+    parser.add_argument('-st', '--stream', dest = 'stream', \
+                        action = 'store_true', \
+                        help = 'train an sgd model on the hashed phrases a '
+                               'chunk of the corpus at a time, for a corpus '
+                               'too large to hold; -k is then how often a '
+                               'sample is held out to score it on, and '
+                               '-le/-fl do not apply')
+    parser.add_argument('-cs', '--chunk-size', dest = 'chunk_size', \
+                        action = 'store', type = int, \
+                        default = DEFAULT_CHUNK_SIZE, \
+                        help = f'samples held at once with -st (default '
+                               f'{DEFAULT_CHUNK_SIZE})')
+    parser.add_argument('-ep', '--epochs', dest = 'epochs', \
+                        action = 'store', type = int, default = DEFAULT_EPOCHS, \
+                        help = f'passes over the corpus with -st (default '
+                               f'{DEFAULT_EPOCHS})')
     parser.add_argument('-lc', '--lowercase', dest = 'lowercase', \
                         action = 'store_true', \
                         help = 'lowercase the corpus; off by default because '
@@ -235,6 +413,37 @@ if __name__ == '__main__':
     # nothing here can act on that, and it buries the report
     warnings.filterwarnings('ignore', category = FutureWarning)
 
+    if args.stream:
+        hasher = features.PhraseHasher(\
+            args.hash_bits or features.DEFAULT_HASH_BITS, args.min_n, args.max_n)
+        try:
+            model, report = train_streaming(\
+                args.data_dir, hasher, max_per_class = args.max_per_class, \
+                min_samples = args.min_samples, lowercase = args.lowercase, \
+                chunk_size = args.chunk_size, epochs = args.epochs, \
+                holdout = args.folds)
+        except ValueError as e:
+            raise SystemExit(f'error: {e}')
+
+        if args.output_file:
+            with codecs.open(args.output_file, 'w', encoding = 'utf8') as f:
+                f.write(report + '\n')
+        else:
+            print(report)
+
+        if args.model_file:
+            save_model(args.model_file, model, hasher, {
+                'min_n':     args.min_n,
+                'max_n':     args.max_n,
+                'lowercase': args.lowercase,
+                'learner':   model.name,
+                'data_dir':  args.data_dir,
+                'hash_bits': hasher.bits,
+            })
+        else:
+            logger.info('no -m/--model-file given, nothing was saved')
+        raise SystemExit(0)
+
     names = args.learners or DEFAULT_LEARNERS
     try:
         learners = get_learners(names)
@@ -242,7 +451,8 @@ if __name__ == '__main__':
         table, vocab = features.build_dataset(\
             args.data_dir, top_k = args.top_k, min_n = args.min_n, \
             max_n = args.max_n, max_per_class = args.max_per_class, \
-            min_samples = args.min_samples, lowercase = args.lowercase)
+            min_samples = args.min_samples, lowercase = args.lowercase, \
+            hash_bits = args.hash_bits)
     except ValueError as e:
         raise SystemExit(f'error: {e}')
 
@@ -256,7 +466,9 @@ if __name__ == '__main__':
     else:
         print(report)
 
-    if args.vocab_file:
+    if args.vocab_file and isinstance(vocab, features.PhraseHasher):
+        logger.warning('-vf: hashed features have no vocabulary to write')
+    elif args.vocab_file:
         features.save_vocabulary(vocab, args.vocab_file)
 
     if args.model_file:
@@ -267,6 +479,7 @@ if __name__ == '__main__':
             'lowercase': args.lowercase,
             'learner':   final.name,
             'data_dir':  args.data_dir,
+            'hash_bits': args.hash_bits,
         })
     else:
         logger.info('no -m/--model-file given, nothing was saved')
@@ -587,7 +587,7 @@ class Acts(TableBuilder, SentenceMaker):
         
     def addSection(self, tb, side_note_datas, page_height, has_side_notes):
         try:
-            text = self.normalize_text(tb.extract_text_from_tb())
+            text = tb.get_normalized_text()
             if not self.is_body_added:
                 # self.is_preamble_reached = True
                 tab_level = self.get_tab_level('BODY')
@@ -976,7 +976,7 @@ class Acts(TableBuilder, SentenceMaker):
 
     def addAmendment(self, label, tb, side_note_datas, page_height):
         try:
-            text = self.normalize_text(tb.extract_text_from_tb())
+            text = tb.get_normalized_text()
             if re.fullmatch(self.act_end_re, text):
                     self.is_act_ended = True
                     if self.docend_symbol and self.is_act_ended:
@@ -1120,7 +1120,7 @@ class Acts(TableBuilder, SentenceMaker):
 
             text = ''
             if label not in ('figure',):
-                text = self.normalize_text(tb.extract_text_from_tb())
+                text = tb.get_normalized_text()
 
             is_table_label = isinstance(label, tuple) and label[0] in ("table", "borderless_table")
             if not is_table_label and label != "figure":
@@ -0,0 +1,203 @@
+import numpy as np
+
+
+class CharStore:
+    """The chars of a page's textboxes, read out of the xml once.
+
+    Everything asked of a textbox - its text, its font size, whether it is
+    bold, where its first glyph is, which of its glyphs are footnote marks -
+    comes down to the <text> elements under it, and finding those with
+    findall() and splitting and parsing their bbox strings again for every
+    one of the questions is most of what answering them costs. So the chars
+    of all the textboxes of a page are parsed here once, after the xml is
+    final (see Main.drop_overlapping_spaces() and convert_indic_fonts()), into
+    one column per attribute:
+
+        x0, y0, x1, y1, size   float arrays, NaN where the attribute is absent
+        font_ids               indices into fonts, each font name kept once
+        text                   the text of all the chars, one after another,
+                               text_offsets[i]:text_offsets[i + 1] being char i
+
+    with the chars of textline l at line_offsets[l]:line_offsets[l + 1] and
+    the textlines of textbox b at box_offsets[b]:box_offsets[b + 1]. A char
+    or textline is just an index into these, so a textbox keeps an index
+    instead of a tree of elements with a dict of strings each, and the text
+    of a whole textline is one slice of the text.
+
+    The coordinates are the very floats float() makes of the bbox strings,
+    so a bbox read from here is equal to one parsed from the xml and either
+    can be used as a key (TextBox.footnotes_superscript).
+    """
+
+    def __init__(self, textboxes = ()):
+        self.box_index = {}
+
+        lines = []
+        box_offsets = [0]
+        for box in textboxes:
+            self.box_index[id(box)] = len(box_offsets) - 1
+            for textline in box.iter('textline'):
+                lines.append((textline, list(textline.iter('text'))))
+            box_offsets.append(len(lines))
+
+        self.box_offsets = np.array(box_offsets, dtype = np.int32)
+        self.build(lines)
+
+    # --- func to make a store of loose runs of chars, e.g. the children of any element ---
+    @classmethod
+    def from_lines(cls, lines):
+        """A store with a single box, whose lines are the given
+        (element, [<text>, ...]) pairs."""
+        store = cls()
+        store.box_offsets = np.array([0, len(lines)], dtype = np.int32)
+        store.build(lines)
+
+        return store
+
+    def build(self, lines):
+        self.fonts = []
+        self.font_masks = {}
+        font_ids = {}
+
+        line_bboxes = []
+        line_offsets = [0]
+        coords = []
+        sizes = []
+        chars_font = []
+        texts = []
+        text_offsets = [0]
+        nan_bbox = (np.nan, np.nan, np.nan, np.nan)
+
+        for line, chars in lines:
+            line_bboxes.append(self.parse_bbox(line.get("bbox")) or nan_bbox)
+
+            for char in chars:
+                attrib = char.attrib
+                coords.append(self.parse_bbox(attrib.get("bbox")) or nan_bbox)
+                sizes.append(self.parse_float(attrib.get("size")))
+
+                font = attrib.get("font", "")
+                font_id = font_ids.get(font)
+                if font_id is None:
+                    font_id = font_ids[font] = len(self.fonts)
+                    self.fonts.append(font)
+                chars_font.append(font_id)
+
+                text = char.text or ""
+                texts.append(text)
+                text_offsets.append(text_offsets[-1] + len(text))
+
+            line_offsets.append(len(coords))
+
+        coords = np.array(coords, dtype = np.float64).reshape(-1, 4)
+        self.x0, self.y0, self.x1, self.y1 = (coords[:, i].copy() for i in range(4))
+        self.size = np.array(sizes, dtype = np.float64)
+        self.font_ids = np.array(chars_font, dtype = np.int32)
+        self.text = "".join(texts)
+        self.text_offsets = np.array(text_offsets, dtype = np.int64)
+        self.line_offsets = np.array(line_offsets, dtype = np.int64)
+        self.line_bboxes = np.array(line_bboxes, dtype = np.float64).reshape(-1, 4)
+
+    @staticmethod
+    def parse_bbox(bbox):
+        if not bbox:
+            return None
+
+        try:
+            coords = tuple(map(float, bbox.split(",")))
+        except ValueError:
+            return None
+
+        return coords if len(coords) == 4 else None
+
+    @staticmethod
+    def parse_float(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
+
+    def __len__(self):
+        return len(self.size)
+
+    def get_box(self, tbox):
+        return self.box_index.get(id(tbox))
+
+    def get_line_range(self, box):
+        return range(int(self.box_offsets[box]), int(self.box_offsets[box + 1]))
+
+    def get_char_range(self, line):
+        return range(int(self.line_offsets[line]), int(self.line_offsets[line + 1]))
+
+    # --- func to get the chars of a textbox, as one slice of the columns ---
+    def get_box_chars(self, box):
+        lines = self.get_line_range(box)
+        return slice(int(self.line_offsets[lines.start]),
+                     int(self.line_offsets[lines.stop]))
+
+    def get_text(self, idx):
+        return self.text[self.text_offsets[idx]:self.text_offsets[idx + 1]]
+
+    # --- func to get the texts of a run of chars, one string per char ---
+    def get_texts(self, chars):
+        offsets = self.text_offsets[chars.start:chars.stop + 1].tolist()
+        text = self.text
+        return [text[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+    # --- func to get the text of chars start to stop, i.e. all their texts joined ---
+    def get_span_text(self, start, stop):
+        return self.text[self.text_offsets[start]:self.text_offsets[stop]]
+
+    def get_line_text(self, line):
+        return self.get_span_text(self.line_offsets[line], self.line_offsets[line + 1])
+
+    def get_box_text(self, box):
+        chars = self.get_box_chars(box)
+        return self.get_span_text(chars.start, chars.stop)
+
+    # --- func to get the bboxes of a run of chars, None for a char without one ---
+    def get_bboxes(self, chars):
+        return [
+            None if x0 != x0 else (x0, y0, x1, y1)
+            for x0, y0, x1, y1 in zip(self.x0[chars].tolist(),
+                                      self.y0[chars].tolist(),
+                                      self.x1[chars].tolist(),
+                                      self.y1[chars].tolist())
+        ]
+
+    # --- func to get the (text, bbox) of every char of a textline ---
+    def get_line_chars(self, line):
+        span = self.get_char_range(line)
+        return list(zip(self.get_texts(span),
+                        self.get_bboxes(slice(span.start, span.stop))))
+
+    def get_bbox(self, idx):
+        if np.isnan(self.x0[idx]):
+            return None
+
+        return (float(self.x0[idx]), float(self.y0[idx]),
+                float(self.x1[idx]), float(self.y1[idx]))
+
+    def get_line_bbox(self, line):
+        bbox = self.line_bboxes[line]
+        if np.isnan(bbox[0]):
+            return None
+
+        return tuple(bbox.tolist())
+
+    def get_font(self, idx):
+        return self.fonts[self.font_ids[idx]]
+
+    # --- func to get a mask over the fonts, of those whose name matches a pattern ---
+    def get_font_mask(self, font_re):
+        mask = self.font_masks.get((font_re.pattern, font_re.flags))
+        if mask is None:
+            mask = np.array([bool(font_re.search(font)) for font in self.fonts],
+                            dtype = bool)
+            self.font_masks[font_re.pattern, font_re.flags] = mask
+
+        return mask
+
+    # --- func to get the length of the text of every char of a run ---
+    def get_text_lengths(self, chars):
+        return np.diff(self.text_offsets[chars.start:chars.stop + 1])
@@ -0,0 +1,347 @@
+import logging
+from collections import OrderedDict
+
+import camelot
+import pymupdf
+
+from pdfminer.layout import LAParams, LTImage, LTFigure
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.converter import PDFPageAggregator
+from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+
+
+class DocumentSession:
+    """The pdf being converted, opened once and shared by everything reading it:
+    one pdfminer and one pymupdf document, the layouts, renders and ruled
+    tables of its pages kept until released. set_path() drops everything read
+    from the old file when a repaired or cached copy is swapped in.
+    """
+
+    # rasters are large (a 300 dpi A4 page is ~25MB as RGB) and a page is only
+    # ever rendered by the consumers of one stage at a time, so only the last
+    # few are kept
+    MAX_CACHED_PIXMAPS = 2
+
+    def __init__(self, pdf_path, laparams = None):
+        self.logger = logging.getLogger(__name__)
+        self.pdf_path = pdf_path
+        # the layout analysis asked for when a consumer does not say, pdfminer's
+        # own defaults being what extract_pages() used
+        self.laparams = laparams if laparams is not None else LAParams()
+
+        self.fitz_doc = None
+        self.miner_file = None
+        self.miner_doc = None
+        self.miner_pages = None
+        self.rsrcmgr = None
+
+        # (page number, LAParams key) -> LTPage
+        self.layouts = {}
+        # page number -> the LTImages of its layout, which outlive the layout
+        # itself when only the text of that was wanted
+        self.images = {}
+        # (page number, dpi) -> pymupdf Pixmap, oldest first
+        self.pixmaps = OrderedDict()
+        # page number -> (tables, table_bbox) as TableExtraction keeps them
+        self.tables = {}
+
+    # --- func to point the session at another file, dropping what was read ---
+    def set_path(self, pdf_path):
+        if pdf_path == self.pdf_path:
+            return
+
+        self.close()
+        self.pdf_path = pdf_path
+
+    # --- func to get the pymupdf document, opened on first use ---
+    def get_document(self):
+        if self.fitz_doc is None:
+            self.fitz_doc = pymupdf.open(self.pdf_path)
+
+        return self.fitz_doc
+
+    def get_page_count(self):
+        return len(self.get_document())
+
+    # --- func to get pdfminer's view of the document, opened on first use ---
+    def get_miner_pages(self):
+        if self.miner_pages is None:
+            self.miner_file = open(self.pdf_path, 'rb')
+            parser = PDFParser(self.miner_file)
+            self.miner_doc = PDFDocument(parser)
+            # fonts, colour spaces and xobjects are decoded once per document
+            # rather than once per page
+            self.rsrcmgr = PDFResourceManager(caching = True)
+            self.miner_pages = list(PDFPage.create_pages(self.miner_doc))
+
+        return self.miner_pages
+
+    @staticmethod
+    def get_laparams_key(laparams):
+        if laparams is None:
+            return None
+
+        return tuple(sorted(
+            (name, value) for name, value in vars(laparams).items()
+            if isinstance(value, (int, float, bool, str, type(None)))
+        ))
+
+    # --- func to get the analysed layout of a page, 1 based like the xml ---
+    def get_page_layout(self, page_num, laparams = None):
+        """The LTPage of a page, analysed with laparams (the session's own if
+        None), once however many times it is asked for.
+
+        The layout keeps references into the open document - an LTImage's
+        stream is read from it when it is exported - which is why the session
+        keeps the file open rather than handing out layouts of a closed one.
+        """
+        page_num = int(page_num)
+        laparams = laparams if laparams is not None else self.laparams
+        key = (page_num, self.get_laparams_key(laparams))
+
+        if key in self.layouts:
+            return self.layouts[key]
+
+        layout = self.interpret_page(page_num, laparams)
+        self.layouts[key] = layout
+
+        return layout
+
+    # --- func to run pdfminer over a page, analysing it if laparams given ---
+    def interpret_page(self, page_num, laparams):
+        pages = self.get_miner_pages()
+
+        if not 1 <= page_num <= len(pages):
+            raise IndexError(
+                f"page {page_num} is out of range, {self.pdf_path} has "
+                f"{len(pages)} page(s)"
+            )
+
+        device = PDFPageAggregator(self.rsrcmgr, laparams = laparams,
+                                   pageno = page_num)
+        try:
+            interpreter = PDFPageInterpreter(self.rsrcmgr, device)
+            interpreter.process_page(pages[page_num - 1])
+            layout = device.get_result()
+        finally:
+            device.close()
+
+        self.name_inline_images(layout, page_num)
+
+        return layout
+
+    # --- func to give the inline images of a page names that do not change from run to run ---
+    @classmethod
+    def name_inline_images(cls, layout, page_num):
+        """pdfminer names an inline image, and the figure around it, by the
+        id() of its stream, which is another number in every process and every
+        run. The page xml names its figures after the images in them, so a
+        page built in a worker or read from the LayoutCache would name them
+        differently from the images the session hands to Pictures. They are
+        named by page and draw order instead, which are the same in all of
+        them."""
+        count = 0
+
+        for parent, image in cls.walk_images_with_parent(layout, None):
+            if getattr(image.stream, "objid", None) is not None:
+                # an XObject, named by the page's resources
+                continue
+
+            name = f"InlineImage{page_num}_{count}"
+            count += 1
+
+            if isinstance(parent, LTFigure) and parent.name == image.name:
+                parent.name = name
+            image.name = name
+
+    @staticmethod
+    def walk_images_with_parent(obj, parent):
+        if isinstance(obj, LTImage):
+            yield parent, obj
+
+        elif hasattr(obj, "__iter__"):
+            for child in obj:
+                yield from DocumentSession.walk_images_with_parent(child, obj)
+
+    @staticmethod
+    def walk_images(obj):
+        if isinstance(obj, LTImage):
+            yield obj
+
+        elif hasattr(obj, "__iter__"):
+            for child in obj:
+                yield from DocumentSession.walk_images(child)
+
+    # --- func to get the images of a page, 1 based ---
+    def get_page_images(self, page_num):
+        """The LTImages of a page, in the order the page draws them.
+
+        What an image is does not depend on the LAParams it was found with -
+        layout analysis only regroups text, the images around it keep their
+        order - so any layout of the page already analysed serves, and the
+        images of one whose text has been taken and released are kept here.
+        A page no one has analysed (its text came from the LayoutCache, say)
+        is only interpreted, which is all it takes to find its images.
+        """
+        page_num = int(page_num)
+
+        if page_num not in self.images:
+            layout = next((layout for (num, _), layout in self.layouts.items()
+                           if num == page_num), None)
+            if layout is None:
+                layout = self.interpret_page(page_num, None)
+
+            self.images[page_num] = list(self.walk_images(layout))
+
+        return self.images[page_num]
+
+    # --- func to drop the layouts of a page but keep its images ---
+    def release_layouts(self, page_num):
+        """Once the text of a page has been taken, its layout - every char of
+        the page as an object - is the bulk of what the session holds, while
+        its images are read much later, when the page is built."""
+        page_num = int(page_num)
+
+        for key in [k for k in self.layouts if k[0] == page_num]:
+            if page_num not in self.images:
+                self.images[page_num] = list(self.walk_images(self.layouts[key]))
+            del self.layouts[key]
+
+    # --- func to get a page rendered by pymupdf, 1 based ---
+    def get_pixmap(self, page_num, dpi = 300):
+        page_num = int(page_num)
+        key = (page_num, dpi)
+
+        if key in self.pixmaps:
+            self.pixmaps.move_to_end(key)
+            return self.pixmaps[key]
+
+        page = self.get_document()[page_num - 1]
+        pix = page.get_pixmap(dpi = dpi, alpha = False)
+
+        self.pixmaps[key] = pix
+
+        while len(self.pixmaps) > self.MAX_CACHED_PIXMAPS:
+            self.pixmaps.popitem(last = False)
+
+        return pix
+
+    # --- func to get the ruled tables camelot finds on a page, 1 based ---
+    def get_page_tables(self, page_num):
+        """(tables, table_bbox) of a page, {index: DataFrame} and {index: bbox}.
+
+        camelot parses the pdf itself and not through this session, but what
+        it finds is kept here all the same, so a page's tables are looked for
+        once whichever of its consumers asks first.
+        """
+        page_num = int(page_num)
+
+        if page_num in self.tables:
+            return self.copy_tables(self.tables[page_num])
+
+        tables = {}
+        table_bbox = {}
+
+        found = camelot.read_pdf(self.pdf_path, pages = str(page_num),
+                                 flavor = 'lattice')
+
+        for idx, tab in enumerate(found):
+            tables[idx] = tab.df
+            table_bbox[idx] = tab._bbox
+
+        self.tables[page_num] = (tables, table_bbox)
+
+        return self.copy_tables(self.tables[page_num])
+
+    # --- func to get a page's tables as dicts of its own, that a consumer can change ---
+    @staticmethod
+    def copy_tables(page_tables):
+        tables, table_bbox = page_tables
+        return dict(tables), dict(table_bbox)
+
+    # --- func to look for the ruled tables of many pages in one camelot call ---
+    def prefetch_tables(self, page_nums, workers = 1):
+        """get_page_tables() for all of page_nums at once, 1 based.
+
+        camelot opens the pdf and sets its lattice parser up once a call, so
+        a document's candidate pages are handed to it together and what it
+        finds is shared out by the page each table is on, a page's tables
+        keeping the order a call for it alone gives them. With more than one
+        worker camelot parses the pages in that many processes, 0 being one
+        per cpu. Should the call
+        fail, nothing is kept and each page is looked at on its own when it
+        asks, so that one bad page costs only its own tables.
+        """
+        page_nums = sorted({int(page_num) for page_num in page_nums} - set(self.tables))
+        if not page_nums:
+            return
+
+        try:
+            found = camelot.read_pdf(self.pdf_path,
+                                     pages = ",".join(map(str, page_nums)),
+                                     flavor = 'lattice',
+                                     parallel = workers != 1,
+                                     cpu_count = workers or None)
+        except Exception as e:
+            self.logger.warning("Could not look for the tables of %d page(s) of %s "
+                                "at once, looking page by page: %s",
+                                len(page_nums), self.pdf_path, e)
+            return
+
+        found_tables = {page_num: ({}, {}) for page_num in page_nums}
+        for tab in found:
+            tables, table_bbox = found_tables.setdefault(int(tab.page), ({}, {}))
+            idx = len(tables)
+            tables[idx] = tab.df
+            table_bbox[idx] = tab._bbox
+
+        self.tables.update(found_tables)
+
+    # --- func to forget the tables of a page that is written out ---
+    def release_tables(self, page_num):
+        self.tables.pop(int(page_num), None)
+
+    # --- func to forget what was read for a page that is done with ---
+    def release_page(self, page_num):
+        page_num = int(page_num)
+
+        for key in [k for k in self.layouts if k[0] == page_num]:
+            del self.layouts[key]
+
+        for key in [k for k in self.pixmaps if k[0] == page_num]:
+            del self.pixmaps[key]
+
+        self.images.pop(page_num, None)
+
+    # --- func to close both documents and drop everything cached ---
+    def close(self):
+        self.layouts = {}
+        self.images = {}
+        self.pixmaps = OrderedDict()
+        self.tables = {}
+
+        if self.fitz_doc is not None:
+            try:
+                self.fitz_doc.close()
+            except Exception as e:
+                self.logger.debug("Error closing %s: %s", self.pdf_path, e)
+            self.fitz_doc = None
+
+        if self.miner_file is not None:
+            try:
+                self.miner_file.close()
+            except Exception as e:
+                self.logger.debug("Error closing %s: %s", self.pdf_path, e)
+
+        self.miner_file = None
+        self.miner_doc = None
+        self.miner_pages = None
+        self.rsrcmgr = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
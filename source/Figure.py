@@ -1,5 +1,7 @@
 import os
+import hashlib
 import logging
+import tempfile
 import numpy as np
 from .Utils import *
 from PIL import Image
@@ -24,52 +26,130 @@ def apply_png_predictor(pred, colors, columns, bitspercomponent, data):
     is ceil(width * colors * bpc / 8), which is the only thing this differs in;
     bpp rounds up the same way and never falls below 1, so Sub/Average/Paeth
     look a whole pixel back as they must.
+
+    The rows are undone as numpy arrays and not byte by byte, a scanned page
+    being megabytes of them. None and Sub rows depend on no other row and are
+    undone all at once, Sub as a running sum of each byte lane mod 256. Up
+    rows add the row above, so a run of them after a row of any other filter
+    is a running sum down the columns from that row; an image of only these
+    three - what most encoders write - is undone without a loop over its
+    rows. Average and Paeth look left at what was just undone and are undone
+    row by row, in Python over plain ints.
     """
     nbytes = (colors * columns * bitspercomponent + 7) // 8
     bpp = max(1, (colors * bitspercomponent + 7) // 8)
 
-    buf = bytearray()
-    line_above = bytearray(nbytes)
+    if not data:
+        return b""
+
+    stride = nbytes + 1
+    nrows = -(-len(data) // stride)
+    # a truncated final row is undone padded with zeros, which no byte before
+    # them depends on, and cut back after
+    size = len(data) - nrows
+
+    rows = np.frombuffer(data, dtype=np.uint8)
+    if len(data) < nrows * stride:
+        rows = np.concatenate([rows, np.zeros(nrows * stride - len(data), np.uint8)])
+    rows = rows.reshape(nrows, stride)
+
+    filters = rows[:, 0]
+    unsupported = filters > 4
+    if unsupported.any():
+        raise PDFValueError(
+            f"Unsupported predictor value: {filters[unsupported.argmax()]}"
+        )
 
-    for i in range(0, len(data), nbytes + 1):
-        filter_type = data[i]
-        line = data[i + 1: i + 1 + nbytes]
-        raw = bytearray()
+    out = rows[:, 1:].copy()
 
-        if filter_type == 0:
-            raw += line
+    sub = filters == 1
+    if sub.any():
+        out[sub] = unfilter_sub_rows(out[sub], bpp)
 
-        elif filter_type == 1:
-            for j, x in enumerate(line):
-                left = raw[j - bpp] if j >= bpp else 0
-                raw.append((x + left) & 0xFF)
+    if ((filters == 3) | (filters == 4)).any():
+        unfilter_rows(out, filters, bpp)
+    elif (filters == 2).any():
+        unfilter_up_runs(out, filters)
 
-        elif filter_type == 2:
-            for j, x in enumerate(line):
-                raw.append((x + line_above[j]) & 0xFF)
+    return out.tobytes()[:size]
 
-        elif filter_type == 3:
-            for j, x in enumerate(line):
-                left = raw[j - bpp] if j >= bpp else 0
-                raw.append((x + (left + line_above[j]) // 2) & 0xFF)
 
+# --- func to undo Sub rows, each byte lane a running sum mod 256 ---
+def unfilter_sub_rows(rows, bpp):
+    count, nbytes = rows.shape
+    pad = -nbytes % bpp
+    if pad:
+        rows = np.concatenate([rows, np.zeros((count, pad), np.uint8)], axis=1)
+
+    pixels = rows.reshape(count, -1, bpp)
+    return np.cumsum(pixels, axis=1, dtype=np.uint8).reshape(count, -1)[:, :nbytes]
+
+
+# --- func to undo the Up rows of rows that are otherwise undone already ---
+def unfilter_up_runs(out, filters):
+    """Every Up row is the sum of itself and the rows above it up to the
+    first that is not Up - or to the top, above which the PNG spec has
+    zeros. That is a running sum down the columns less the running sum above
+    that row."""
+    nrows = len(out)
+    anchors = np.where(filters != 2, np.arange(nrows), -1)
+    last_anchor = np.maximum.accumulate(anchors)
+
+    sums = np.cumsum(out, axis=0, dtype=np.uint8)
+    # sums shifted a row down, with the zeros above the top first
+    above = np.concatenate([np.zeros((1, out.shape[1]), np.uint8), sums])
+    base = above[np.maximum(last_anchor, 0)]
+
+    out[:] = sums - base
+
+
+# --- func to undo the rows one by one, for an image with Average or Paeth rows ---
+def unfilter_rows(out, filters, bpp):
+    line_above = np.zeros(out.shape[1], np.uint8)
+
+    for i, filter_type in enumerate(filters.tolist()):
+        if filter_type == 2:
+            out[i] += line_above
+        elif filter_type == 3:
+            out[i] = unfilter_average_row(out[i].tolist(), line_above.tolist(), bpp)
         elif filter_type == 4:
-            for j, x in enumerate(line):
-                left = raw[j - bpp] if j >= bpp else 0
-                upleft = line_above[j - bpp] if j >= bpp else 0
-                paeth = pdfminer_utils.paeth_predictor(
-                    left, line_above[j], upleft
-                )
-                raw.append((x + paeth) & 0xFF)
+            if line_above.any():
+                out[i] = unfilter_paeth_row(out[i].tolist(), line_above.tolist(), bpp)
+            else:
+                # with zeros above, Paeth always predicts the byte to the left
+                out[i] = unfilter_sub_rows(out[i:i + 1], bpp)[0]
+        # None and Sub rows are undone already
 
-        else:
-            raise PDFValueError(f"Unsupported predictor value: {filter_type}")
+        line_above = out[i]
+
+
+def unfilter_average_row(line, above, bpp):
+    raw = [(x + (b >> 1)) & 0xFF for x, b in zip(line[:bpp], above[:bpp])]
+
+    for x, b in zip(line[bpp:], above[bpp:]):
+        raw.append((x + ((raw[-bpp] + b) >> 1)) & 0xFF)
 
-        buf += raw
-        # a truncated final row must not leave line_above short of nbytes
-        line_above = raw + bytearray(nbytes - len(raw))
+    return raw
 
-    return bytes(buf)
+
+def unfilter_paeth_row(line, above, bpp):
+    # left and upper left are 0 for the first pixel, so Paeth predicts up
+    raw = [(x + b) & 0xFF for x, b in zip(line[:bpp], above[:bpp])]
+
+    for x, b, c in zip(line[bpp:], above[bpp:], above):
+        a = raw[-bpp]
+        # pdfminer.utils.paeth_predictor, inlined
+        pa = abs(b - c)
+        pb = abs(a - c)
+        pc = abs(a + b - c - c)
+        if pa <= pb and pa <= pc:
+            raw.append((x + a) & 0xFF)
+        elif pb <= pc:
+            raw.append((x + b) & 0xFF)
+        else:
+            raw.append((x + c) & 0xFF)
+
+    return raw
 
 
 def patch_png_predictor():
@@ -113,7 +193,8 @@ class Figure:
     def __init__(self, fig):
         self.logger = logging.getLogger(__name__)
 
-        # Must match LTImage.name
+        # LTImage.name, only unique on the page; Page.get_figures() makes it
+        # the key of the image in unique_images
         self.figname = fig.attrib["name"]
 
         self.coords = tuple(
@@ -143,14 +224,22 @@ class Pictures:
         figure_text=False,
         image_base_dir="manifest",
         pdf_type=None,
-        ocr_engine="tesseract"
+        ocr_engine="tesseract",
+        session=None,
+        image_contents=None
     ):
         self.logger = logging.getLogger(__name__)
 
         self.pg_num = pg_num
+        # the DocumentSession of the conversion, whose layout of the page is
+        # read instead of parsing the pdf again for this one page
+        self.session = session
         self.ocr_language = ocr_language
         self.ocr_engine = ocr_engine
         self.unique_images = unique_images
+        # content hash -> what was made of the image, across the document,
+        # see add_content()
+        self.image_contents = image_contents if image_contents is not None else {}
         self.figure_text = figure_text
         self.pdf_type = pdf_type
 
@@ -187,16 +276,18 @@ class Pictures:
             for img in self.walk_layout(element)
         ]
 
-    def register_global(self, img_name, path, text_content = None, text_language = None, width = None, height = None):
+    def register_global(self, content_hash, img_name, path, text_content = None, text_language = None, width = None, height = None):
         reg = self.unique_images.setdefault(
-            img_name,
+            content_hash,
             {
+                "name": img_name,
                 "count": 0,
                 "path": path,
                 "text": text_content if text_content else "",
                 "language": text_language,
                 "width": width,
                 "height": height,
+                "hash": content_hash,
                 "pages": set()
             }
         )
@@ -204,107 +295,103 @@ class Pictures:
         reg["count"] += 1
         reg["pages"].add(self.pg_num)
 
+    # --- func to get what the html looks a figure of this page up by ---
+    def get_key(self, img_name):
+        """The name of an image is that of its XObject, which is only unique
+        on its page: Im0 of one page and Im0 of the next are as often two
+        images as one. unique_images is keyed by the hash of the pixels
+        instead, and this is the key of the image named img_name here, or
+        the name itself for an image that was not kept."""
+        saved = self.pics.get(img_name)
+        return saved["hash"] if saved else img_name
 
-    def remove_hash(self, img_name):
+    def remove_hash(self, content_hash):
 
-        if img_name in self.pics:
-            del self.pics[img_name]
+        for img_name, saved in list(self.pics.items()):
+            if saved["hash"] == content_hash:
+                del self.pics[img_name]
 
-    def remove_empty_dirs_up_to(self, start_dir, stop_dir):
-        current = start_dir
-        while current and current != stop_dir and os.path.isdir(current):
-            try:
-                os.rmdir(current)
-            except OSError:
-                break
-            current = os.path.dirname(current)
-
-    def has_visual_content(self, image_path):
+    def has_visual_content(self, img, img_name):
         try:
-            with Image.open(image_path) as img:
-                img_array = np.array(img.convert("RGB"))
-                height, width = img_array.shape[:2]
+            img_array = np.array(img.convert("RGB"))
+            height, width = img_array.shape[:2]
 
-                tile_size = 32
+            tile_size = 32
 
-                max_contrast_pct = 0.0
-                for y in range(0, height, tile_size):
-                    for x in range(0, width, tile_size):
-                        tile = img_array[y:y + tile_size, x:x + tile_size]
-                        if tile.size == 0:
-                            continue
-                        channel_std = tile.reshape(-1, tile.shape[-1]).std(axis=0)
-                        tile_contrast_pct = (channel_std.max() / 255.0) * 100
-                        max_contrast_pct = max(max_contrast_pct, tile_contrast_pct)
+            max_contrast_pct = 0.0
+            for y in range(0, height, tile_size):
+                for x in range(0, width, tile_size):
+                    tile = img_array[y:y + tile_size, x:x + tile_size]
+                    if tile.size == 0:
+                        continue
+                    channel_std = tile.reshape(-1, tile.shape[-1]).std(axis=0)
+                    tile_contrast_pct = (channel_std.max() / 255.0) * 100
+                    max_contrast_pct = max(max_contrast_pct, tile_contrast_pct)
 
-                return max_contrast_pct > 2
+            return max_contrast_pct > 2
         except Exception as e:
-            self.logger.warning(f"Failed to analyze image {image_path}: {e}")
+            self.logger.warning(f"Failed to analyze image {img_name}: {e}")
             return True
 
-    def extract_text_content(self, image_path):
+    def extract_text_content(self, image_path, img):
         try:
-            with Image.open(image_path) as img:
-                # Image for OCR (keep original colors)
-                ocr_img = img.convert("RGB") if img.mode != "RGB" else img
+            # Image for heuristic analysis
+            img_gray = img.convert("L")
+            img_array = np.array(img_gray)
 
-                # Image for heuristic analysis
-                img_gray = img.convert("L")
-                img_array = np.array(img_gray)
+            dark_pixels = np.sum(img_array < 200)
+            total_pixels = img_array.size
+            dark_ratio = dark_pixels / total_pixels if total_pixels > 0 else 0
 
-                dark_pixels = np.sum(img_array < 200)
-                total_pixels = img_array.size
-                dark_ratio = dark_pixels / total_pixels if total_pixels > 0 else 0
+            variance = np.var(img_array) if img_array.size > 100 else 0
 
-                variance = np.var(img_array) if img_array.size > 100 else 0
+            looks_like_text = (
+                0.05 < dark_ratio < 0.95
+                and variance > 100
+            )
 
-                looks_like_text = (
-                    0.05 < dark_ratio < 0.95
-                    and variance > 100
-                )
+            self.logger.debug(
+                f"{image_path} | "
+                f"dark_ratio={dark_ratio:.2%}, "
+                f"variance={variance:.1f}, "
+                f"looks_like_text={looks_like_text}"
+            )
 
-                self.logger.debug(
-                    f"{image_path} | "
-                    f"dark_ratio={dark_ratio:.2%}, "
-                    f"variance={variance:.1f}, "
-                    f"looks_like_text={looks_like_text}"
+            if not looks_like_text:
+                self.logger.info(
+                    f"Skipping {image_path}: no meaningful text-like content detected."
                 )
-
-                if not looks_like_text:
-                    self.logger.info(
-                        f"Skipping {image_path}: no meaningful text-like content detected."
-                    )
-                    return None, None
+                return None, None
 
 
-                try:
-                    # config = "--oem 3 --psm 6"
+            try:
+                # config = "--oem 3 --psm 6"
 
-                    # ocr_text = pytesseract.image_to_string(
-                    #     ocr_img,
-                    #     config=config
-                    # ).strip()
+                # ocr_text = pytesseract.image_to_string(
+                #     ocr_img,
+                #     config=config
+                # ).strip()
 
-                    ocr_text = extract_text(image_path, self.ocr_language, self.ocr_engine)
+                ocr_text = extract_text(image_path, self.ocr_language, self.ocr_engine)
 
-                    if not ocr_text:
-                        self.logger.info(f"OCR found no text in {image_path}.")
-                        return None, None
+                if not ocr_text:
+                    self.logger.info(f"OCR found no text in {image_path}.")
+                    return None, None
 
-                    lang, confidence = detect_language(ocr_text)
+                lang, confidence = detect_language(ocr_text)
 
-                    if confidence >= 0.3:
-                        return ocr_text, lang
+                if confidence >= 0.3:
+                    return ocr_text, lang
 
-                    self.logger.info(
-                        f"Rejected OCR text due to low language confidence "
-                        f"({confidence:.3f}) for {image_path}"
-                    )
-                    return None, None
+                self.logger.info(
+                    f"Rejected OCR text due to low language confidence "
+                    f"({confidence:.3f}) for {image_path}"
+                )
+                return None, None
 
-                except Exception as e:
-                    self.logger.debug(f"OCR failed for {image_path}: {e}")
-                    return None, None
+            except Exception as e:
+                self.logger.debug(f"OCR failed for {image_path}: {e}")
+                return None, None
 
         except Exception as e:
             self.logger.warning(f"Failed to analyze image {image_path}: {e}")
@@ -334,6 +421,94 @@ class Pictures:
 
         return False
 
+    # --- func to decode an image of the pdf into an RGB image in memory ---
+    def decode_image(self, lt_image, scratch_dir):
+        iw = StableImageWriter(scratch_dir)
+        img_saved = iw.export_image(lt_image)
+
+        if not img_saved:
+            return None
+
+        temp_path = os.path.join(scratch_dir, img_saved)
+
+        if not os.path.exists(temp_path):
+            return None
+
+        try:
+            with Image.open(temp_path) as img:
+                converted = img
+                if img.mode == "P":
+                    converted = img.convert("RGBA")
+                if img.mode in ("RGBA", "LA"):
+                    background = Image.new("RGB", img.size, (255, 255, 255))
+                    alpha = img.getchannel("A")
+                    background.paste(img.convert("RGB"), mask=alpha)
+                    converted = background
+                elif img.mode != "RGB":
+                    converted = img.convert("RGB")
+
+                if converted is img:
+                    # read in full before the file goes
+                    converted = img.copy()
+        finally:
+            os.remove(temp_path)
+
+        return converted
+
+    # --- func to get the hash of the pixels of a decoded image ---
+    @staticmethod
+    def get_content_hash(img):
+        sha = hashlib.sha256()
+        sha.update(f"{img.mode} {img.width}x{img.height}:".encode("ascii"))
+        sha.update(img.tobytes())
+        return sha.hexdigest()
+
+    # --- func to make the file and the text of an image not seen before in the document ---
+    def add_content(self, content_hash, img, img_name, file_dir):
+        """A logo, a seal or a signature is drawn on page after page of a
+        document, most often as the one XObject and sometimes as copies of it
+        under other names. Whatever it is called, an image of the same pixels
+        is checked for content, written out and OCRed once, the first time it
+        is seen, and every later one is given what was made of it then. The
+        file is written once, under a temporary name and renamed into place,
+        and only once the image is known to be kept. It is named after the
+        image, and a different image of a name already used on another page
+        has the start of its hash added, so that it does not overwrite the
+        first."""
+        file_name = img_name
+        if any(content["file_name"] == file_name for content in self.image_contents.values()):
+            file_name = f"{img_name}-{content_hash[:8]}"
+
+        content = {
+            "name": img_name,
+            "file_name": file_name,
+            "path": None,
+            "text": None,
+            "language": None,
+            "width": img.width,
+            "height": img.height
+        }
+        self.image_contents[content_hash] = content
+
+        if self.figure_text and not self.has_visual_content(img, img_name):
+            return content
+
+        if self.pdf_type in ('egazette', 'sebi'):
+            final_path = os.path.join(
+                file_dir, file_name, "full", "max", "0", "default.png"
+            )
+        else:
+            final_path = os.path.join(file_dir, f"{file_name}.png")
+
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        write_atomic(final_path, lambda f: img.save(f, "PNG"), suffix=".png")
+        content["path"] = final_path
+
+        if self.figure_text:
+            content["text"], content["language"] = self.extract_text_content(final_path, img)
+
+        return content
+
     def get_images(
         self,
         pdf_path,
@@ -348,10 +523,16 @@ class Pictures:
             return
         saved_images = {}
 
-        page_layouts = extract_pages(
-            pdf_path,
-            page_numbers=[int(page_num) - 1]
-        )
+        if self.session is not None:
+            page_images = [self.session.get_page_images(page_num)]
+        else:
+            page_images = (
+                self.get_images_from_page(page_layout)
+                for page_layout in extract_pages(
+                    pdf_path,
+                    page_numbers=[int(page_num) - 1]
+                )
+            )
 
         file_dir = os.path.join(
             output_dir,
@@ -360,109 +541,69 @@ class Pictures:
             'images'
         )
 
-        iw = None
+        # pdfminer only writes an image out to a file, which is read back from
+        # here and never from the output dir
+        scratch_dir = None
 
-        for page_layout in page_layouts:
+        try:
+            for images in page_images:
 
-            images = self.get_images_from_page(
-                page_layout
-            )
+                for lt_image in images:
 
-            for lt_image in images:
+                    try:
 
-                try:
+                        if self.should_skip(lt_image, min_img_pixels):
+                            continue
 
-                    if self.should_skip(lt_image, min_img_pixels):
-                        continue
-                
-                    if iw is None:
-                        os.makedirs(file_dir, exist_ok=True)
-                        iw = StableImageWriter(file_dir)
+                        if scratch_dir is None:
+                            scratch_dir = tempfile.TemporaryDirectory(prefix="figures-")
 
-                    img_saved = iw.export_image(lt_image)
+                        img = self.decode_image(lt_image, scratch_dir.name)
 
-                    if not img_saved:
-                        continue
-                    
-                    temp_path = os.path.join(
-                        file_dir,
-                        img_saved
-                    )
+                        if img is None:
+                            continue
 
-                    if not os.path.exists(temp_path):
-                        continue
+                        img_name = lt_image.name
+                        content_hash = self.get_content_hash(img)
+
+                        content = self.image_contents.get(content_hash)
+                        if content is None:
+                            content = self.add_content(
+                                content_hash, img, img_name, file_dir
+                            )
 
-                    img_name = lt_image.name
+                        if content["path"] is None:
+                            continue
 
-                    if self.pdf_type in ('egazette', 'sebi'):
-                        canonical_dir = os.path.join(
-                            file_dir, img_name, "full", "max", "0"
+                        saved_images[img_name] = {
+                            "name": img_name,
+                            "hash": content_hash,
+                            "path": content["path"],
+                            "text": content["text"],
+                            "language": content["language"],
+                            "width": content["width"],
+                            "height": content["height"]
+                        }
+
+                        self.register_global(
+                            content_hash,
+                            img_name,
+                            content["path"],
+                            content["text"],
+                            content["language"],
+                            content["width"],
+                            content["height"]
                         )
-                        os.makedirs(canonical_dir, exist_ok=True)
-                        final_path = os.path.join(canonical_dir, "default.png")
-                    else:
-                        canonical_dir = None
-                        final_path = os.path.join(file_dir, f"{img_name}.png")
-
-                    with Image.open(temp_path) as img:
-                        converted = img
-                        if img.mode == "P":
-                            converted = img.convert("RGBA")
-                        if img.mode in ("RGBA", "LA"):
-                            background = Image.new("RGB", img.size, (255, 255, 255))
-                            alpha = img.getchannel("A")
-                            background.paste(img.convert("RGB"), mask=alpha)
-                            converted = background
-                        elif img.mode != "RGB":
-                            converted = img.convert("RGB")
-
-                        converted.save(final_path, "PNG")
-                        img_width, img_height = converted.size
-
-                    if os.path.exists(temp_path):
-                        os.remove(temp_path)
-
-                    if self.figure_text and not self.has_visual_content(final_path):
-                        os.remove(final_path)
-                        if canonical_dir:
-                            self.remove_empty_dirs_up_to(canonical_dir, file_dir)
-                        continue
 
-                    if self.figure_text:
-                        text_content, text_language = self.extract_text_content(final_path)
-                    else:
-                        text_content, text_language = None, None
-
-                    saved_images[img_name] = {
-                        "name": img_name,
-                        "path": final_path,
-                        "text": text_content,
-                        "language": text_language,
-                        "width": img_width,
-                        "height": img_height
-                    }
-
-                    self.register_global(
-                        img_name,
-                        final_path,
-                        text_content,
-                        text_language,
-                        img_width,
-                        img_height
-                    )
-
-                except Exception:
-                    self.logger.exception(
-                        f"Failed image "
-                        f"{getattr(lt_image, 'name', '<unnamed>')}"
-                    )
-
-                    continue
-        
-        if iw is not None and not saved_images:
-            try:
-                os.rmdir(file_dir)
-            except OSError:
-                pass
+                    except Exception:
+                        self.logger.exception(
+                            f"Failed image "
+                            f"{getattr(lt_image, 'name', '<unnamed>')}"
+                        )
+
+                        continue
+        finally:
+            if scratch_dir is not None:
+                scratch_dir.cleanup()
 
         return saved_images
@@ -0,0 +1,76 @@
+import re
+
+
+class FontNameResolver:
+    """Which legacy indic font a pdf font name is, by a list of
+    (regex, font key) pairs the first of which to find the name says it.
+
+    The list is made of every converter indic2unicode has, under its own name
+    and its aliases, of the -fc mappings and of the repaired and the detected
+    fonts (see Main.indic_font_res), and trying the regexes of it one after
+    the other is a search per converter for every font a document names -
+    most of them Times or Arial, that none of them finds. So the regexes are
+    also compiled into one alternation, each without the '.*' around it,
+    which changes nothing of what a search finds and is most of what a
+    search of '.*name.*' costs. One search of that tells a name that no regex
+    finds; only a name that one does is looked for with the regexes in
+    order, the first to find it giving the key as before. The alternation
+    has no groups to tell which of it matched on purpose: groups keep re from
+    scanning for the first chars of the alternatives, which is what makes
+    the one search cheap.
+
+    Regexes that cannot be put together - of different flags, or with groups
+    of their own that a backreference may count on - are tried one after the
+    other for every name.
+    """
+
+    def __init__(self, font_res = ()):
+        self.font_res = list(font_res)
+        self.combined_re = None
+        # what the names are searched with in order, the regexes themselves
+        # or the same without the '.*' around them
+        self.search_res = [font_re for font_re, _ in self.font_res]
+
+        if not self.font_res:
+            return
+
+        flags = {font_re.flags for font_re, _ in self.font_res}
+        if len(flags) != 1 or any(font_re.groups for font_re, _ in self.font_res):
+            return
+        flags = flags.pop()
+
+        try:
+            search_res = [re.compile(self.strip_wildcards(font_re.pattern), flags)
+                          for font_re, _ in self.font_res]
+            self.combined_re = re.compile(
+                '|'.join('(?:%s)' % search_re.pattern for search_re in search_res),
+                flags
+            )
+        except re.error:
+            return
+
+        self.search_res = search_res
+
+    # --- func to take the '.*' off both ends of a pattern, which a search does not need ---
+    @staticmethod
+    def strip_wildcards(pattern):
+        if pattern.startswith('.*'):
+            pattern = pattern[2:]
+        if pattern.endswith('.*'):
+            body = pattern[:-2]
+            # '\.*' is a run of dots, not a wildcard
+            if (len(body) - len(body.rstrip('\\'))) % 2 == 0:
+                pattern = body
+
+        return pattern
+
+    # --- func to get the font key of a font name, None if no regex finds it ---
+    def resolve(self, font_name):
+        if self.combined_re is not None and not self.combined_re.search(font_name):
+            return None
+
+        for search_re, (_, font_key) in zip(self.search_res, self.font_res):
+            if search_re.search(font_name):
+                return font_key
+
+        return None
@@ -24,6 +24,15 @@ to classify an encoding from.
     python -m source.FontSurvey -i pdfs/ -r -td training_data \\
         -tf nirmala='nirmala\\s*ui' -tf krutidev='kruti\\s*dev' \\
         -nf 'times|arial|calibri'
+
+A large tree is surveyed in -w/--workers processes, each pdf on its own
+into records of its own that are merged in the order of the pdfs, so the
+report and the corpus are the same whatever the number of workers. With
+-cp/--checkpoint the survey so far is written there every so many pdfs, as
+the json -j writes plus what it takes to go on, and a survey started again
+with the same checkpoint skips the pdfs it has done.
+
+    python -m source.FontSurvey -i gazettes/ -r -w 0 -cp survey.json
 """
 
 import os
@@ -36,9 +45,13 @@ import logging
 import argparse
 import textwrap
 from pathlib import Path
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 
 import pymupdf
 
+from .Utils import write_atomic
+
 
 # fonts are usually embedded as subsets, named 'ABCDEF+RealName'. the subset
 # tag is per-file, so it is stripped for identity and kept only as a detail
@@ -107,7 +120,7 @@ class TrainingWriter:
     MIN_WORDS    = 50
 
     def __init__(self, outdir, label_res, min_words = MIN_WORDS):
-        self.outdir    = Path(outdir)
+        self.outdir    = Path(outdir) if outdir is not None else None
         self.label_res = label_res
         self.min_words = min_words
         self.corpus    = None
@@ -126,7 +139,11 @@ class TrainingWriter:
         # fonts no regexp claimed, and how much text was dropped with them
         self.dropped   = {}
         self.logger    = logging.getLogger('fontsurvey.training')
-        self.outdir.mkdir(parents = True, exist_ok = True)
+        # the size the corpus had at the checkpoint a survey goes on from,
+        # anything after which was written by the interrupted run
+        self.resume_size = None
+        if outdir is not None:
+            self.outdir.mkdir(parents = True, exist_ok = True)
 
     def __enter__(self):
         return self
@@ -146,10 +163,16 @@ class TrainingWriter:
         """The corpus csv, opened and given its header on first use."""
         if self.writer is None:
             path = self.outdir.joinpath(self.CORPUS_NAME)
-            self.corpus = codecs.open(str(path), 'w', encoding = 'utf8', \
-                                      errors = 'replace')
-            self.writer = csv.writer(self.corpus, lineterminator = '\n')
-            self.writer.writerow(self.CORPUS_FIELDS)
+            if self.resume_size and path.is_file():
+                os.truncate(path, self.resume_size)
+                self.corpus = codecs.open(str(path), 'a', encoding = 'utf8', \
+                                          errors = 'replace')
+                self.writer = csv.writer(self.corpus, lineterminator = '\n')
+            else:
+                self.corpus = codecs.open(str(path), 'w', encoding = 'utf8', \
+                                          errors = 'replace')
+                self.writer = csv.writer(self.corpus, lineterminator = '\n')
+                self.writer.writerow(self.CORPUS_FIELDS)
         return self.writer
 
     def write_sample(self, label, fontname, words, filepath = None):
@@ -201,6 +224,40 @@ class TrainingWriter:
         self.pending       = {}
         self.pending_files = {}
 
+    def merge(self, rows):
+        """Write out the samples a worker collected from one document."""
+        for label, fontname, words, filepath in rows.rows:
+            self.write_sample(label, fontname, words, filepath)
+        for fontname, count in rows.dropped.items():
+            self.dropped[fontname] = self.dropped.get(fontname, 0) + count
+
+    def get_corpus_size(self):
+        """The bytes of the corpus written so far, for a checkpoint."""
+        if self.corpus is None:
+            return self.resume_size or 0
+        self.corpus.flush()
+        return os.path.getsize(self.outdir.joinpath(self.CORPUS_NAME))
+
+    def get_state(self):
+        return {
+            'counts':       self.counts,
+            'words':        self.words,
+            'fonts':        {l: sorted(f) for l, f in self.fonts.items()},
+            'dropped':      self.dropped,
+            'corpus_bytes': self.get_corpus_size(),
+        }
+
+    def set_state(self, state):
+        if set(state['counts']) != set(self.counts):
+            raise ValueError('the checkpoint was written for the classes '
+                             f'{", ".join(sorted(state["counts"]))}, not '
+                             f'{", ".join(sorted(self.counts))}')
+        self.counts.update(state['counts'])
+        self.words.update(state['words'])
+        self.fonts       = {l: set(f) for l, f in state['fonts'].items()}
+        self.dropped     = dict(state['dropped'])
+        self.resume_size = state['corpus_bytes']
+
     def close(self):
         self.flush()
         if self.corpus is not None:
@@ -249,6 +306,24 @@ class TrainingWriter:
         return '\n'.join(lines)
 
 
+class TrainingRows(TrainingWriter):
+    """The samples of one document, kept rather than written.
+
+    A worker surveying a pdf hands them back to the process running the
+    survey, which writes them into the corpus in the order of the pdfs - so
+    samples.csv is the one a single process writes, whatever the number of
+    workers. Samples are stitched within a document only, so those of one
+    pdf do not depend on any other.
+    """
+
+    def __init__(self, label_res, min_words = TrainingWriter.MIN_WORDS):
+        super().__init__(None, label_res, min_words)
+        self.rows = []
+
+    def write_sample(self, label, fontname, words, filepath = None):
+        self.rows.append((label, fontname, words, filepath))
+
+
 def compile_font_re(label, pattern):
     try:
         return re.compile(pattern, re.IGNORECASE)
@@ -315,6 +390,9 @@ class FontRecord:
         # handful of headings in a long one
         self.file_words = {}
         self.pages      = set()
+        # the pages of the records merged into this one, which are only ever
+        # counted, and are in documents of their own
+        self.merged_pages = 0
         self.num_words  = 0
         self.words      = []
         self.word_set   = set()
@@ -347,6 +425,56 @@ class FontRecord:
         self.file_words[filepath] = self.file_words.get(filepath, 0) + num_words
         self.pages.add((filepath, pageno))
 
+    def merge(self, other):
+        """Add what another record saw of the font, in pdfs this one has not.
+
+        The words are taken in the order the other record kept them, up to
+        max_words, which is the order a single record surveying both would
+        have kept them in - as long as the other record kept max_words words
+        more than this one can hold, which survey_file() sees to.
+        """
+        self.subsets   |= other.subsets
+        self.types     |= other.types
+        self.exts      |= other.exts
+        self.encodings |= other.encodings
+        self.embedded   = self.embedded or other.embedded
+        self.tounicode  = self.tounicode or other.tounicode
+        self.files     |= other.files
+        self.drawn_files |= other.drawn_files
+        for filepath, words in other.file_words.items():
+            self.file_words[filepath] = self.file_words.get(filepath, 0) + words
+        self.merged_pages += len(other.pages) + other.merged_pages
+        self.num_words += other.num_words
+        for word in other.words:
+            if len(self.words) >= self.max_words:
+                break
+            if word not in self.word_set:
+                self.word_set.add(word)
+                self.words.append(word)
+
+    @classmethod
+    def from_dict(cls, data, max_words):
+        """The record to_dict() wrote, to go on surveying from."""
+        record = cls(data['name'], max_words)
+        record.subsets     = set(data['subset_names'])
+        record.types       = set(data['types'])
+        record.exts        = set(data['formats'])
+        record.embedded    = data['embedded']
+        record.encodings   = set(data['encodings'])
+        record.tounicode   = data['has_tounicode']
+        record.files       = set(data['files'])
+        record.drawn_files = set(data['drawn_files'])
+        record.file_words  = {s['file']: s['words'] \
+                              for s in data['drawn_file_shares']}
+        record.merged_pages= data['num_pages']
+        record.num_words   = data['num_words']
+        record.words       = list(data['words'])
+        record.word_set    = set(record.words)
+        return record
+
+    def get_num_pages(self):
+        return len(self.pages) + self.merged_pages
+
     def get_file_shares(self, file_totals):
         """(file, words, share) per drawn-in document, biggest share first.
 
@@ -382,7 +510,7 @@ class FontRecord:
                                   for f, w, s in shares],
             'num_files':     len(self.files),
             'files':         sorted(self.files),
-            'num_pages':     len(self.pages),
+            'num_pages':     self.get_num_pages(),
             'num_words':     self.num_words,
             'words':         self.words,
         }
@@ -507,8 +635,11 @@ class FontSurvey:
                     if self.training:
                         self.training.add_text(name, text, filepath)
 
+    def get_display_name(self, path, relative_to = None):
+        return str(path.relative_to(relative_to) if relative_to else path)
+
     def survey_pdf(self, path, relative_to = None):
-        filepath = str(path.relative_to(relative_to) if relative_to else path)
+        filepath = self.get_display_name(path, relative_to)
         try:
             doc = pymupdf.open(path)
         except Exception as e:
@@ -536,18 +667,99 @@ class FontSurvey:
             # across two of them
             self.training.flush()
 
-    def survey(self, inpaths, recursive = False):
+    def survey(self, inpaths, recursive = False, workers = 1, \
+               checkpoint = None, checkpoint_every = 100):
+        """Survey every pdf of inpaths, workers at a time (0 for one per cpu).
+
+        Each pdf is surveyed on its own by survey_file(), in a worker process
+        when there are several, and what it found is merged in here in the
+        order of the pdfs, so the records and the corpus are the same as one
+        process surveying them one after the other. With a checkpoint file
+        the survey is written to it every checkpoint_every pdfs and at the
+        end, and a survey that finds one there goes on from it.
+        """
         paths = self.get_pdf_paths(inpaths, recursive)
         self.logger.info(f'surveying {len(paths)} pdf file(s)')
 
         relative_to = self.get_display_base(paths)
-        for path in paths:
-            self.logger.debug(f'reading {path}')
-            self.survey_pdf(path, relative_to)
+        if checkpoint and os.path.isfile(checkpoint):
+            self.load_checkpoint(checkpoint)
+            done  = set(self.pdfs).union(f for f, _e in self.failed)
+            paths = [p for p in paths \
+                     if self.get_display_name(p, relative_to) not in done]
+            self.logger.info(f'resuming from {checkpoint}: {len(done)} pdf '
+                             f'file(s) done, {len(paths)} to go')
+
+        label_res = self.training.label_res if self.training else None
+        min_words = self.training.min_words if self.training else None
+        job = partial(survey_file, relative_to = relative_to, \
+                      max_words = self.max_words, label_res = label_res, \
+                      min_words = min_words)
+
+        if workers == 0:
+            workers = os.cpu_count() or 1
+        workers = max(1, min(workers, len(paths)))
+
+        def merge_all(results):
+            for num, partial_survey in enumerate(results, 1):
+                self.merge(partial_survey)
+                if checkpoint and num % checkpoint_every == 0:
+                    self.save_checkpoint(checkpoint)
+
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers = workers) as pool:
+                # a few pdfs to a task, so that a tree of small pdfs is not
+                # all pickling
+                merge_all(pool.map(job, paths, \
+                                   chunksize = max(1, min(16, len(paths) // (workers * 4)))))
+        else:
+            merge_all(job(path) for path in paths)
+
+        if checkpoint:
+            self.save_checkpoint(checkpoint)
 
         self.logger.info(f'found {len(self.fonts)} unique font(s)')
         return self.fonts
 
+    def merge(self, other):
+        """Add the survey of other pdfs, done by survey_file()."""
+        self.pdfs.extend(other.pdfs)
+        self.failed.extend(other.failed)
+        for name, record in other.fonts.items():
+            self.get_record(name).merge(record)
+        if self.training and other.training:
+            self.training.merge(other.training)
+
+    def save_checkpoint(self, path):
+        """Write the survey so far to path, atomically: the json to_json()
+        writes, and the state of the corpus being written with it."""
+        data = json.loads(self.to_json())
+        if self.training:
+            data['training'] = self.training.get_state()
+
+        write_atomic(path, json.dumps(data, indent = 2, ensure_ascii = False) + '\n')
+        self.logger.debug(f'checkpoint of {len(self.pdfs)} pdf file(s) '
+                          f'written to {path}')
+
+    def load_checkpoint(self, path):
+        """Go on from a checkpoint, or from the json of a finished survey."""
+        with codecs.open(str(path), 'r', encoding = 'utf8') as f:
+            data = json.load(f)
+
+        if data['max_words'] != self.max_words:
+            raise ValueError(f'{path} was surveyed with --max-words '
+                             f'{data["max_words"]}, not {self.max_words}')
+        if self.training and 'training' not in data:
+            raise ValueError(f'{path} has no training corpus to go on with')
+
+        self.pdfs   = list(data['pdfs'])
+        self.failed = [(u['file'], u['error']) for u in data['unreadable']]
+        self.fonts  = {}
+        for font in data['fonts']:
+            self.fonts[font['name']] = FontRecord.from_dict(font, self.max_words)
+        if self.training:
+            self.training.set_state(data['training'])
+
     def get_records(self):
         # the fonts used across the most documents first, so the report opens
         # with what the corpus as a whole is set in; only documents where the
@@ -619,7 +831,7 @@ class FontSurvey:
             if record.encodings:
                 lines.append(f'    encoding : {", ".join(sorted(record.encodings))}')
             lines.append(f'    files    : {len(record.drawn_files)} ({shown})')
-            lines.append(f'    pages    : {len(record.pages)}')
+            lines.append(f'    pages    : {record.get_num_pages()}')
             lines.append(f'    words    : {record.num_words} '
                          f'({len(record.words)} distinct shown)')
             if record.words:
@@ -643,6 +855,21 @@ class FontSurvey:
         return '\n'.join(lines)
 
 
+def survey_file(path, relative_to = None, max_words = 100, label_res = None, \
+                min_words = TrainingWriter.MIN_WORDS):
+    """The survey of one pdf, to be merged into the survey of them all.
+
+    Run in a worker process, so everything it returns is picklable. Its
+    records keep twice max_words words: at most max_words of a font's words
+    can already be in the record it is merged into, so that many more are
+    enough for the merge to take the words one survey of every pdf would.
+    """
+    training = TrainingRows(label_res, min_words) if label_res else None
+    survey   = FontSurvey(max_words = max_words * 2, training = training)
+    survey.survey_pdf(path, relative_to)
+    return survey
+
+
 def get_arg_parser():
     parser = argparse.ArgumentParser(\
         description = 'Find the unique fonts used across a directory of pdfs, '
@@ -696,6 +923,21 @@ def get_arg_parser():
                                f'({TrainingWriter.CORPUS_NAME}: label, font, '
                                'pdf, text per sample) into (default '
                                'training_data when --training-font is given)')
+    parser.add_argument('-w', '--workers', dest = 'workers', \
+                        action = 'store', type = int, default = 1, \
+                        help = 'processes to survey the pdfs in (default 1, '
+                               '0 for one per cpu); the report and the corpus '
+                               'are the same whatever the number')
+    parser.add_argument('-cp', '--checkpoint', dest = 'checkpoint', \
+                        action = 'store', default = None, \
+                        help = 'write the survey so far to this json file '
+                               'every --checkpoint-every pdfs, and go on from '
+                               'it if it is there already, skipping the pdfs '
+                               'it has done. It is the json -j writes, plus '
+                               'the state of the corpus')
+    parser.add_argument('-ce', '--checkpoint-every', dest = 'checkpoint_every', \
+                        action = 'store', type = int, default = 100, \
+                        help = 'pdfs between checkpoints (default 100)')
     parser.add_argument('-o', '--output-file', dest = 'output_file', \
                         action = 'store', default = None, \
                         help = 'write the report here instead of stdout')
@@ -748,7 +990,9 @@ if __name__ == '__main__':
                    if label_res else None
     survey   = FontSurvey(max_words = args.max_words, training = training)
     try:
-        survey.survey(args.input_paths, recursive = args.recursive)
+        survey.survey(args.input_paths, recursive = args.recursive, \
+                      workers = args.workers, checkpoint = args.checkpoint, \
+                      checkpoint_every = max(1, args.checkpoint_every))
     except ValueError as e:
         raise SystemExit(f'error: {e}')
     finally:
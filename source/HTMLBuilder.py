@@ -242,7 +242,7 @@ class HTMLBuilder(TableBuilder):
     # --- func to add Title in the html ---
     def addTitle(self, tb,pg_width,pg_height, next_text, next_text_tb,  at_page_end,next_label = None):
         try:
-          text = self.normalize_text(tb.extract_text_from_tb()).strip()
+          text = self.get_tb_text(tb).strip()
           #original
           sebi_level_close_re = re.compile(r'^(?:(?:Date|Dated)\s*[:\-]{1}\s*(?:\d{1,2}[./-]\d{1,2}[./-]\d{2,4}|[A-Za-z]+\s+\d{1,2},\s*\d{4})|(?:Place)\s*[:\-]{1}\s*[A-Z][A-Za-z .,&-]*|\(.*?(?:Judgment\s+pronounced|Order\s+pronounced|Decision\s+pronounced).*?\)|Sd/-)$', re.IGNORECASE)
           if self.handle_pending_text_continuation(text, next_text,at_page_end, tb, next_text_tb, pg_height, pg_width):
@@ -290,7 +290,7 @@ class HTMLBuilder(TableBuilder):
                                     self.builder += "</li>\n</ul>\n"
               
           if(tb.width > 0.58 * pg_width and tb.height > 0.15 * pg_height):
-              self.builder += f"<p class=\"preamble\">{self.normalize_text(tb.extract_text_from_tb())}</p>\n"
+              self.builder += f"<p class=\"preamble\">{self.get_tb_text(tb)}</p>\n"
           else:
               doc = ''
               for textline in tb.tbox.findall('.//textline'):
@@ -576,7 +576,7 @@ class HTMLBuilder(TableBuilder):
 
           self.pending_text = ""
           self.pending_tag = None
-          text = self.normalize_text(tb.extract_text_from_tb())
+          text = self.get_tb_text(tb)
           is_sentence_completed = text.strip().endswith(self.sentence_completion_punctuation)
           side_note_text = self.find_closest_side_note(tb.coords, side_note_datas,page_height)
           self.logger.debug("Side note matched for section text [%s] : %s",text, side_note_text)
@@ -747,7 +747,7 @@ class HTMLBuilder(TableBuilder):
     # ---func to add the textbox labelled as amendments in the html ---
     def addAmendment(self,label,tb,side_notes,pg_height):
         
-        text = self.normalize_text(tb.extract_text_from_tb())
+        text = self.get_tb_text(tb)
         try:
           if len(label) >1 :
             if label[1]=="title":
@@ -785,7 +785,7 @@ class HTMLBuilder(TableBuilder):
     
     def add_amendment_section(self,tb,side_note_datas,page_height):
       self.flushPrevious()
-      text = self.normalize_text(tb.extract_text_from_tb())
+      text = self.get_tb_text(tb)
       try:
         is_sentence_completed = text.strip().endswith(self.sentence_completion_punctuation)
         side_note_text = self.find_closest_side_note(tb.coords, side_note_datas,page_height)
@@ -955,7 +955,13 @@ class HTMLBuilder(TableBuilder):
             self.pending_header_footer = []
         
     def _normalize_and_linkify_footnotes(self, text):
-        text = self._base_normalize_text(text)
+        return self._linkify_footnotes(self._base_normalize_text(text))
+
+    # --- func to get the text of a textbox, normalised once by the box itself ---
+    def get_tb_text(self, tb):
+        return self._linkify_footnotes(tb.get_normalized_text())
+
+    def _linkify_footnotes(self, text):
         if not text or self.current_page_num is None:
             return text
 
@@ -1049,7 +1055,7 @@ class HTMLBuilder(TableBuilder):
                 #     next_text = self.normalize_text(next_tb.extract_text_from_tb())
                 #     next_text_tb = next_tb
                 if next_label not in ("figure", "header", "footer"):
-                    next_text = self.normalize_text(next_tb.extract_text_from_tb())
+                    next_text = self.get_tb_text(next_tb)
                     next_text_tb = next_tb
 
             at_page_end = (idx == len(all_items) - 1)
@@ -1064,13 +1070,13 @@ class HTMLBuilder(TableBuilder):
 
             if label == "header":
                 self.add_header(
-                  self.normalize_text(tb.extract_text_from_tb())
+                  self.get_tb_text(tb)
                )
                 continue
 
             elif label == "footer":#or self.is_pg_num(tb,page.pg_width):
                 self.add_footer(
-                  self.normalize_text(tb.extract_text_from_tb())
+                  self.get_tb_text(tb)
                )
                 continue
 
@@ -1096,7 +1102,7 @@ class HTMLBuilder(TableBuilder):
                     self.flush_pending_header_footer()
 
             if self.pdf_type == 'sebi' and not self.is_pre_added and label in ('title', 'level1'):
-                self.check_for_pre_ended(self.normalize_text(tb.extract_text_from_tb()), label)
+                self.check_for_pre_ended(self.get_tb_text(tb), label)
 
             if isinstance(label, tuple) and label[0] == "table":
                 table_id = label[1]
@@ -1141,26 +1147,26 @@ class HTMLBuilder(TableBuilder):
             elif isinstance(label,list) and label[0] == "amendment":
                self.addAmendment(label,tb,page.side_notes_datas,page.pg_height)
             elif isinstance(label, tuple) and label[1] == 'blockquote':
-               self.addItalicBlockQuote(self.normalize_text(tb.extract_text_from_tb()), next_text, tb, next_text_tb, page.pg_height, page.pg_width, at_page_end, tb)
+               self.addItalicBlockQuote(self.get_tb_text(tb), next_text, tb, next_text_tb, page.pg_height, page.pg_width, at_page_end, tb)
             elif label == "title":
                 self.addTitle(tb,page.pg_width,page.pg_height, next_text, next_text_tb,at_page_end,next_label)
             elif label == "section":
                 self.addSection(tb,page.side_notes_datas,page.pg_height,self.hierarchy.index(label))
             elif label == "subsection":
-                self.addSubsection(self.normalize_text(tb.extract_text_from_tb()),self.hierarchy.index(label))
+                self.addSubsection(self.get_tb_text(tb),self.hierarchy.index(label))
             elif label == "para":
-                self.addPara(self.normalize_text(tb.extract_text_from_tb()),self.hierarchy.index(label))
+                self.addPara(self.get_tb_text(tb),self.hierarchy.index(label))
             elif label == "subpara":
-                self.addSubpara(self.normalize_text(tb.extract_text_from_tb()),self.hierarchy.index(label))
+                self.addSubpara(self.get_tb_text(tb),self.hierarchy.index(label))
             elif label == 'blockquote':
-                self.addBlockQuote(self.normalize_text(tb.extract_text_from_tb()), next_text,tb, next_text_tb, page.pg_height, page.pg_width,  at_page_end, tb)
+                self.addBlockQuote(self.get_tb_text(tb), next_text,tb, next_text_tb, page.pg_height, page.pg_width,  at_page_end, tb)
             elif label == 'level1' or label == 'level2' or label == 'level3' or label == 'level4':
-                self.addLevel(self.normalize_text(tb.extract_text_from_tb()), self.level_hierarchy.index(label), next_text,tb, next_text_tb, page.pg_height, page.pg_width,  at_page_end)
+                self.addLevel(self.get_tb_text(tb), self.level_hierarchy.index(label), next_text,tb, next_text_tb, page.pg_height, page.pg_width,  at_page_end)
             elif label == "figure":
                self.addFigure(tb, page)
             elif label is None:
                 # if not self.is_pg_num(tb,page.pg_width):
-                  self.addUnlabelled(self.normalize_text(tb.extract_text_from_tb()), next_text,tb, next_text_tb, page.pg_height, page.pg_width,  at_page_end)
+                  self.addUnlabelled(self.get_tb_text(tb), next_text,tb, next_text_tb, page.pg_height, page.pg_width,  at_page_end)
 
         self.render_footnote_section()
 
@@ -1266,45 +1272,55 @@ class HTMLBuilder(TableBuilder):
 
 
 import asyncio
-import io
 from html import escape
 
 import pymupdf
-from PIL import Image
 from chrome_lens_py import LensAPI
 from statistics import median
 
+from .LensScheduler import LensPageScheduler
+
 
 class HTMLBuilderChromeLens:
 
-    def __init__(self, pdf_path):
+    def __init__(self, pdf_path, session=None, lens=None,
+                 concurrency=LensPageScheduler.DEFAULT_CONCURRENCY,
+                 allow_partial=False):
         self.pdf_path = pdf_path
-        self.lens = LensAPI()
+        # the DocumentSession of the conversion, whose document and rendered
+        # pages are used instead of opening the pdf again
+        self.session = session
+        # any client with LensAPI's process_image(), e.g. a local stub
+        self.lens = lens if lens is not None else LensAPI()
+        # pages rendered and sent to Lens at once
+        self.concurrency = concurrency
+        # leave out a page Lens failed every try, instead of failing
+        self.allow_partial = allow_partial
         self.builder = ""
         self.total_pages = 0
         self.logger = logging.getLogger(__name__)
 
-    async def process_page(self, page):
-
-        pix = page.get_pixmap(
-            dpi=300,
-            alpha=False
-        )
-
-        image = Image.open(
-            io.BytesIO(
-                pix.tobytes("png")
-            )
+    def open_document(self):
+        if self.session is not None:
+            return self.session.get_document()
+        return pymupdf.open(
+            self.pdf_path
         )
 
-        result = await self.lens.process_image(
-            image_path=image,
-            output_format="detailed"
-        )
+    def close_document(self, doc):
+        # the session's document is the session's to close
+        if self.session is None:
+            doc.close()
 
-        return result.get(
-            "detailed_blocks",
-            []
+    def get_pixmap(self, page):
+        if self.session is not None:
+            return self.session.get_pixmap(
+                page.number + 1,
+                300
+            )
+        return page.get_pixmap(
+            dpi=300,
+            alpha=False
         )
 
     async def _build_async(
@@ -1313,24 +1329,32 @@ class HTMLBuilderChromeLens:
         end_page
     ):
 
-        doc = pymupdf.open(
-            self.pdf_path
-        )
+        doc = self.open_document()
 
         try:
 
-            for page_num in range(
-                start_page,
-                end_page + 1
+            pages = [
+                doc[page_num - 1]
+                for page_num in range(start_page, end_page + 1)
+            ]
+
+            # the same scheduling as ChromeLensParserTool: a few pages in
+            # flight at once, each retried with backoff, in page order
+            results = await LensPageScheduler(
+                self.lens,
+                self.get_pixmap,
+                concurrency=self.concurrency,
+                allow_partial=self.allow_partial
+            ).process_pages(pages)
+
+            for page_num, detailed_blocks in zip(
+                range(start_page, end_page + 1),
+                results
             ):
 
-                page = doc[
-                    page_num - 1
-                ]
-
-                detailed_blocks = await self.process_page(
-                    page
-                )
+                if detailed_blocks is None:
+                    # Lens failed it every try, and allow_partial was given
+                    continue
 
                 self.builder += (
                     self.build_page_html(
@@ -1342,7 +1366,7 @@ class HTMLBuilderChromeLens:
 
         finally:
 
-            doc.close()
+            self.close_document(doc)
 
     def build(
         self,
@@ -1350,15 +1374,13 @@ class HTMLBuilderChromeLens:
         end_page=None
     ):
 
-        doc = pymupdf.open(
-            self.pdf_path
-        )
+        doc = self.open_document()
 
         self.total_pages = len(
             doc
         )
 
-        doc.close()
+        self.close_document(doc)
 
         if start_page is None:
             start_page = 1
@@ -1376,21 +1398,18 @@ class HTMLBuilderChromeLens:
             end_page
         )
 
-        i = 1
-
-        while i <= 3:
-            try:
-                asyncio.run(
-                    self._build_async(
-                        start_page,
-                        end_page
-                    )
+        # every page is retried on its own by the scheduler, so the document
+        # is built once, and given up if a page failed every try
+        try:
+            asyncio.run(
+                self._build_async(
+                    start_page,
+                    end_page
                 )
-            
-            except Exception as e:
-               self.logger.warning(f'While using chrome lens to build html: {e}')
-            
-            i += 1
+            )
+
+        except Exception as e:
+            self.logger.warning(f'While using chrome lens to build html: {e}')
 
     def _detect_word_columns(self, rows, n_bins=100, coverage_threshold=0.15,
                               min_gap_ratio=0.02, min_zone=0.15, max_zone=0.85,
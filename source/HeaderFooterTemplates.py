@@ -0,0 +1,322 @@
+import os
+import json
+import hashlib
+import logging
+from collections import deque, defaultdict
+
+from .Utils import write_atomic
+
+
+class HeaderFooterTemplates:
+    """The header/footer groups of a streamed document learned from a sample
+    of its pages, for the rest of its pages to be classified against.
+
+    Main.adaptive_header_footer_detection() groups the header and footer zone
+    elements of all the pages of a document, so a streamed document has every
+    page laid out and read once before its first window can be labelled. But
+    a group is made of the elements alike to its first one, so the groups
+    found on a sample of the pages - the first ones and some spread over the
+    rest - are kept here as templates, that first element each, and an
+    element of any other page is in a group if it is alike to its template.
+    That is one similarity per template for an element, however many pages
+    the document has, and a page can be labelled as soon as it is read.
+
+    A sample can miss what the rest of a document does: a running header
+    that changes from one part to the next, a footer that only starts
+    halfway. So the pages classified are also checked against the templates:
+    a template matched on far fewer of the recent pages than of the sample,
+    or the elements of the recent pages no template matched making up a
+    group of their own, and the templates are no longer trusted (see
+    is_confident()), Main then grouping the whole document after all.
+    """
+
+    # a template is doubted once it is matched on fewer than this share of
+    # the recent pages of the share of the sample pages it was matched on
+    MIN_HIT_RATIO = 0.5
+
+    # the unmatched elements of the recent pages are only taken for a group
+    # the sample missed if they are on this share of them at least, more than
+    # a group of the sample needs, so that what merely recurs over a stretch
+    # of pages (a list of names, say) does not throw the templates away
+    MIN_NEW_GROUP_RATE = 0.6
+
+    # and nothing is doubted before this many pages are classified
+    MIN_PAGES = 10
+
+    def __init__(self, header_groups, footer_groups, sample_size, similarity_func,
+                 group_func, threshold, min_occurrence_rate, bottom_footers = False):
+        self.logger = logging.getLogger(__name__)
+        self.similarity_func = similarity_func
+        self.group_func = group_func
+        self.threshold = threshold
+        self.min_occurrence_rate = min_occurrence_rate
+        # the sample had no footer zone elements, and its footers were looked
+        # for at the bottom of the pages instead
+        self.bottom_footers = bottom_footers
+
+        # the 'uploaded by' groups are not templates, they are found on
+        # every page by their pattern
+        self.templates = {
+            kind: [group for group in groups if group.get('pattern_type') != 'uploaded_by']
+            for kind, groups in (('header', header_groups), ('footer', footer_groups))
+        }
+        # the share of the sample pages each template is on, which unlike the
+        # occurrence rate of its group counts a page once however many of its
+        # elements are in the group
+        self.sample_rates = {
+            kind: [len(set(group['pages'])) / sample_size for group in groups]
+            for kind, groups in self.templates.items()
+        }
+
+        # for each of the recent pages, the templates matched on it and the
+        # elements no template matched, by kind
+        self.recent = deque(maxlen = max(sample_size, self.MIN_PAGES))
+
+    # --- func to pick the pages the templates are learned from ---
+    @staticmethod
+    def get_sample(page_count, size):
+        """The positions, from 1, of the first size pages and of about size
+        more spread evenly over the rest of page_count pages."""
+        first = list(range(1, min(size, page_count) + 1))
+        rest = page_count - len(first)
+        if rest <= 0:
+            return first
+
+        stride = -(-rest // size)
+        return first + list(range(len(first) + stride, page_count + 1, stride))
+
+    # --- func to find the template an element is alike to ---
+    def match(self, kind, elem):
+        for idx, group in enumerate(self.templates[kind]):
+            if self.similarity_func(group['elements'][0], elem, self.threshold) >= self.threshold:
+                return idx
+
+        return None
+
+    # --- func to group the candidates of some pages by the templates ---
+    def classify(self, header_candidates, footer_candidates, page_nums):
+        """(header groups, footer groups) of the candidates of the pages
+        page_nums, the groups of the sample with their elements replaced by
+        the candidates alike to their template, in the order given."""
+        pages = {page_num: ({'header': set(), 'footer': set()},
+                            {'header': [], 'footer': []})
+                 for page_num in page_nums}
+
+        groups = {}
+        for kind, candidates in (('header', header_candidates),
+                                 ('footer', footer_candidates)):
+            elements = [[] for _ in self.templates[kind]]
+            for elem in candidates:
+                hits, unmatched = pages[elem['page_num']]
+                idx = self.match(kind, elem)
+                if idx is None:
+                    unmatched[kind].append(elem)
+                else:
+                    elements[idx].append(elem)
+                    hits[kind].add(idx)
+
+            groups[kind] = [
+                dict(group, elements=elems, pages=[elem['page_num'] for elem in elems])
+                for group, elems in zip(self.templates[kind], elements)
+            ]
+
+        for page_num in page_nums:
+            hits, unmatched = pages[page_num]
+            # only what grouping needs is kept, not the textboxes
+            for kind in unmatched:
+                unmatched[kind] = [dict(elem, textbox=None) for elem in unmatched[kind]]
+            self.recent.append((hits, unmatched))
+
+        return groups['header'], groups['footer']
+
+    # --- func to tell whether the recent pages still agree with the templates ---
+    def is_confident(self):
+        page_count = len(self.recent)
+        if page_count < self.MIN_PAGES:
+            return True
+
+        for kind, groups in self.templates.items():
+            for idx, (group, sample_rate) in enumerate(zip(groups, self.sample_rates[kind])):
+                hit_rate = sum(1 for hits, _ in self.recent if idx in hits[kind]) / page_count
+                if hit_rate < sample_rate * self.MIN_HIT_RATIO:
+                    self.logger.info("The %s template '%s' is on %.0f%% of the last %d pages, "
+                                     "against %.0f%% of the sample", kind,
+                                     group['representative_text'][:40], hit_rate * 100,
+                                     page_count, sample_rate * 100)
+                    return False
+
+            candidates = [elem for _, unmatched in self.recent for elem in unmatched[kind]]
+            new_groups = self.group_func(candidates, self.similarity_func, self.threshold,
+                                         page_count, max(self.min_occurrence_rate,
+                                                         self.MIN_NEW_GROUP_RATE))
+            if new_groups:
+                self.logger.info("The last %d pages have a %s the sample does not: '%s'",
+                                 page_count, kind, new_groups[0]['representative_text'][:40])
+                return False
+
+        return True
+
+
+class HeaderFooterStore:
+    """The headers and footers of a publication series, kept on disk across
+    the documents of it.
+
+    The issues of one gazette carry the same running headers and footers,
+    and every one of them has those found again from its own pages, which a
+    document of a page or two has too few of to tell a header by. So the
+    groups a document is found to have are kept here, each as a template
+    like HeaderFooterTemplates keeps them, under a key made of the series -
+    a name given by the caller, or the pdf type and page size of the
+    document - and of the pdf type. A template seen in MIN_DOCUMENTS of the
+    documents of the series is then a header or footer of every later one
+    outright, on the elements alike to it (classify()), and each document
+    adds what it found to the store (learn()).
+
+    A series changes over time, so a template no document had for MAX_AGE
+    documents is dropped, and no more than MAX_TEMPLATES are kept, the most
+    often seen. The store is one json file per series, read again right
+    before it is written and replaced as a whole, so that a document being
+    written meanwhile loses at worst its own update.
+    """
+
+    # bumped whenever what is kept for a template changes
+    FORMAT_VERSION = 1
+
+    # a template is used once this many documents of the series had it
+    MIN_DOCUMENTS = 2
+
+    # and dropped once this many documents of the series went by without it
+    MAX_AGE = 50
+
+    MAX_TEMPLATES = 64
+
+    # what _header_footer_similarity() looks at of an element, all that a
+    # template keeps of one
+    ELEMENT_FIELDS = ('text', 'x0_pct', 'y0_pct', 'width_pct', 'is_centered',
+                      'is_left_aligned', 'is_right_aligned')
+
+    def __init__(self, store_dir, series, pdf_type, similarity_func, threshold):
+        self.logger = logging.getLogger(__name__)
+        self.store_dir = str(store_dir)
+        self.series = series
+        self.similarity_func = similarity_func
+        self.threshold = threshold
+        os.makedirs(self.store_dir, exist_ok = True)
+
+        fields = {"series": series, "pdf_type": pdf_type,
+                  "format": self.FORMAT_VERSION}
+        blob = json.dumps(fields, sort_keys = True).encode('utf-8')
+        self.path = os.path.join(self.store_dir,
+                                 hashlib.sha256(blob).hexdigest() + ".json")
+
+        self.documents, self.templates = self.load()
+        # the templates the document at hand has, by position in templates
+        self.seen = set()
+
+        self.logger.info("Read %d header/footer template(s) of series '%s', "
+                         "learned from %d document(s)", len(self.templates),
+                         series, self.documents)
+
+    # --- func to read the store of the series, (documents, templates) ---
+    def load(self):
+        try:
+            with open(self.path, encoding = 'utf-8') as f:
+                store = json.load(f)
+            return int(store["documents"]), list(store["templates"])
+        except FileNotFoundError:
+            return 0, []
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.logger.warning("Ignoring unreadable header/footer store %s: %s",
+                                self.path, e)
+            return 0, []
+
+    # --- func to find the template an element is alike to ---
+    def match(self, kind, elem, min_documents = 0):
+        for idx, template in enumerate(self.templates):
+            if (template['kind'] == kind and template['count'] >= min_documents and
+                    self.similarity_func(template['element'], elem, self.threshold) >= self.threshold):
+                return idx
+
+        return None
+
+    # --- func to take out the candidates that the series has as headers or footers ---
+    def classify(self, kind, candidates, total_pages):
+        """(groups, the other candidates): a group per template of the series
+        that candidates of the kind are alike to, in the form
+        Main._group_similar_elements() makes them, whatever the share of the
+        pages it is on."""
+        elements = defaultdict(list)
+        rest = []
+        for elem in candidates:
+            idx = self.match(kind, elem, self.MIN_DOCUMENTS)
+            if idx is None:
+                rest.append(elem)
+            else:
+                elements[idx].append(elem)
+
+        groups = []
+        for idx, elems in sorted(elements.items()):
+            self.seen.add(idx)
+            groups.append({
+                'elements': elems,
+                'representative_text': self.templates[idx]['element']['text'],
+                'avg_x0_pct': sum(elem['x0_pct'] for elem in elems) / len(elems),
+                'avg_y0_pct': sum(elem['y0_pct'] for elem in elems) / len(elems),
+                'occurrence_rate': len(elems) / total_pages,
+                'pages': [elem['page_num'] for elem in elems],
+                'pattern_type': 'series',
+            })
+
+        if groups:
+            self.logger.info("%d %s element(s) matched %d template(s) of series '%s'",
+                             sum(len(group['elements']) for group in groups), kind,
+                             len(groups), self.series)
+
+        return groups, rest
+
+    # --- func to add the headers and footers of a document to the store ---
+    def learn(self, header_groups, footer_groups):
+        """Counts the templates the document has - the ones classify() found
+        on it and the ones alike to the first element of its other groups,
+        new templates being made of those alike to none - and writes the
+        store back. The groups of a single page and of 'uploaded by' lines
+        tell nothing of the series and are left out."""
+        found = [(template['kind'], template['element'])
+                 for idx, template in enumerate(self.templates) if idx in self.seen]
+        for kind, groups in (('header', header_groups), ('footer', footer_groups)):
+            for group in groups:
+                if group.get('pattern_type') is None and group['elements']:
+                    element = {field: group['elements'][0][field]
+                               for field in self.ELEMENT_FIELDS}
+                    found.append((kind, element))
+
+        # what other documents of the series added meanwhile is kept
+        self.documents, self.templates = self.load()
+        self.documents += 1
+
+        counted = set()
+        for kind, element in found:
+            idx = self.match(kind, element)
+            if idx is None:
+                self.templates.append({'kind': kind, 'element': element,
+                                       'count': 0, 'last_seen': 0})
+                idx = len(self.templates) - 1
+            if idx not in counted:
+                counted.add(idx)
+                self.templates[idx]['count'] += 1
+                self.templates[idx]['last_seen'] = self.documents
+
+        self.templates = [template for template in self.templates
+                          if self.documents - template['last_seen'] < self.MAX_AGE]
+        self.templates.sort(key = lambda template: -template['count'])
+        del self.templates[self.MAX_TEMPLATES:]
+        self.seen = set()
+
+        try:
+            store = {"series": self.series, "documents": self.documents,
+                     "templates": self.templates}
+            write_atomic(self.path, json.dumps(store, ensure_ascii = False))
+        except OSError as e:
+            # a store that cannot be written to only costs the next documents
+            self.logger.warning("Could not write the header/footer store %s: %s",
+                                self.path, e)
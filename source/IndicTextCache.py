@@ -0,0 +1,161 @@
+import os
+import time
+import logging
+import sqlite3
+
+
+class IndicTextCache:
+    """The unicode of the legacy indic font runs converted before, kept on
+    disk across runs and shared by the processes converting at once.
+
+    A Kruti Dev or Chanakya gazette draws the same boilerplate - the title
+    of the gazette, the ministry, the closing formula - on every page of it
+    and in every issue, and converting a run of text is a pass of
+    indic2unicode's rules over it. What a run converts to depends on nothing
+    but the converter, the text and the indic2unicode doing it, so it is kept
+    here under just those, for Main.convert_indic_fonts() to look up before
+    converting anything.
+
+    It is an sqlite database, which does the locking between the processes
+    of a batch reading and writing it together. Each entry has the time it
+    was last used, and past max_entries the least recently used are dropped
+    when it is opened. Looking entries up only reads: the ones found are
+    remembered and their time set in one write at close(), so that the
+    processes sharing the cache do not queue on its lock for every page. A
+    cache that cannot be read or written is turned off with a warning: it
+    only ever saves time. close() it when done, or use it as a context
+    manager.
+    """
+
+    # the default number of runs kept, a few hundred MB of text at most
+    DEFAULT_MAX_ENTRIES = 1000000
+
+    # sqlite's default cap on the parameters of one statement is 999
+    BATCH_SIZE = 500
+
+    def __init__(self, db_path, version, max_entries = DEFAULT_MAX_ENTRIES):
+        self.logger = logging.getLogger(__name__)
+        self.db_path = str(db_path)
+        self.version = version
+        self.max_entries = max_entries
+        self.conn = None
+        # the keys looked up and found since the last flush_used()
+        self.used = set()
+
+        try:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok = True)
+            self.conn = sqlite3.connect(self.db_path, timeout = 30)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversions ("
+                " version TEXT, font_key TEXT, text TEXT, converted TEXT,"
+                " used INTEGER DEFAULT 0,"
+                " PRIMARY KEY (version, font_key, text))"
+            )
+            # a cache written before the entries had a time of use
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(conversions)")]
+            if "used" not in columns:
+                self.conn.execute("ALTER TABLE conversions ADD COLUMN used INTEGER DEFAULT 0")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS conversions_used ON conversions (used)")
+            self.conn.commit()
+            self.evict()
+        except (OSError, sqlite3.Error) as e:
+            self.disable(e)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def disable(self, error):
+        self.logger.warning("Not using the indic text cache %s: %s", self.db_path, error)
+        self.close()
+
+    # --- func to look up the conversions of (font key, text) pairs, {pair: unicode} ---
+    def get_many(self, keys):
+        found = {}
+        if self.conn is None:
+            return found
+
+        texts_by_font = {}
+        for font_key, text in keys:
+            texts_by_font.setdefault(font_key, []).append(text)
+
+        try:
+            for font_key, texts in texts_by_font.items():
+                for i in range(0, len(texts), self.BATCH_SIZE):
+                    batch = texts[i:i + self.BATCH_SIZE]
+                    rows = self.conn.execute(
+                        "SELECT text, converted FROM conversions WHERE version = ? "
+                        "AND font_key = ? AND text IN (%s)" % ",".join("?" * len(batch)),
+                        [self.version, font_key] + batch
+                    )
+                    for text, converted in rows:
+                        found[(font_key, text)] = converted
+        except sqlite3.Error as e:
+            self.disable(e)
+
+        self.used.update(found)
+        return found
+
+    # --- func to set the time of use of the entries found, for the eviction ---
+    def flush_used(self):
+        """Sets the time of use of the entries get_many() found, all in one
+        transaction: evict() drops the oldest of them first. The boilerplate
+        every issue has is what is used the most, and is the last to go."""
+        if self.conn is None or not self.used:
+            return
+
+        used = int(time.time())
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE conversions SET used = ? "
+                    "WHERE version = ? AND font_key = ? AND text = ?",
+                    [(used, self.version, font_key, text) for font_key, text in self.used]
+                )
+        except sqlite3.Error as e:
+            self.logger.warning("Could not mark the entries used in the indic text cache %s: %s",
+                                self.db_path, e)
+        self.used.clear()
+
+    # --- func to keep the conversions of (font key, text) pairs ---
+    def put_many(self, conversions):
+        if self.conn is None or not conversions:
+            return
+
+        used = int(time.time())
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO conversions VALUES (?, ?, ?, ?, ?)",
+                    [(self.version, font_key, text, converted, used)
+                     for (font_key, text), converted in conversions.items()]
+                )
+        except sqlite3.Error as e:
+            self.disable(e)
+
+    # --- func to drop the least recently used entries over the cap ---
+    def evict(self):
+        count = self.conn.execute("SELECT count(*) FROM conversions").fetchone()[0]
+        if count <= self.max_entries:
+            return
+
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM conversions WHERE rowid IN "
+                "(SELECT rowid FROM conversions ORDER BY used, rowid LIMIT ?)",
+                (count - self.max_entries,)
+            )
+        self.logger.debug("Evicted %d entries of the indic text cache",
+                          count - self.max_entries)
+
+    def close(self):
+        if self.conn is not None:
+            self.flush_used()
+            try:
+                self.conn.close()
+            except sqlite3.Error:
+                pass
+            self.conn = None
@@ -0,0 +1,213 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import xml.etree.ElementTree as ET
+
+import pdfminer
+
+from .DocumentSession import DocumentSession
+from .Utils import write_atomic
+
+
+class LayoutCache:
+    """The page xml of the pdfs converted before, kept on disk across runs.
+
+    Layout analysis is the bulk of the time a text pdf takes, and it depends on
+    nothing but the bytes of the pdf, the LAParams it is run with and the
+    pdfminer doing it - not on anything Page or HTMLBuilder make of it. So the
+    <page> element built for a page is written here under a key made of just
+    those, and a batch that is run again after a change to the rules reads
+    its pages back instead of analysing them all again. Two pdfs of the same
+    name are two entries; a pdf renamed or copied is still the one entry.
+
+    An entry is a directory of one xml file per page, written as the page is
+    built, and an index with what the key was made of and the page count of
+    the pdf, so that a run that finds all its pages here opens no pdf at all.
+    Every file is written under a temporary name and renamed into place, so a
+    worker reading an entry another one is writing finds a page complete or
+    not at all, and one that is not valid - truncated, or not the page it is
+    named after - is dropped and analysed again rather than trusted.
+
+    Entries are evicted least recently used first once the cache is larger
+    than max_bytes, an entry being used whenever a page is read from it.
+    """
+
+    # bumped whenever what is written for a page changes, which makes every
+    # entry of the older format a miss
+    FORMAT_VERSION = 2
+
+    INDEX_NAME = "index.json"
+
+    # the default size cap in MB, about what a thousand gazettes of a hundred
+    # pages take
+    DEFAULT_MAX_MB = 1024
+
+    def __init__(self, cache_dir, max_bytes = DEFAULT_MAX_MB * 1024 * 1024):
+        self.logger = logging.getLogger(__name__)
+        self.cache_dir = str(cache_dir)
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok = True)
+
+    # pdf path -> (size, mtime, sha256), a pdf being hashed once a process
+    pdf_hashes = {}
+
+    # --- func to get the sha256 of a pdf's bytes ---
+    @classmethod
+    def get_pdf_hash(cls, pdf_path):
+        stat = os.stat(pdf_path)
+        known = cls.pdf_hashes.get(pdf_path)
+        if known and known[:2] == (stat.st_size, stat.st_mtime_ns):
+            return known[2]
+
+        sha = hashlib.sha256()
+        with open(pdf_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+
+        cls.pdf_hashes[pdf_path] = (stat.st_size, stat.st_mtime_ns,
+                                     sha.hexdigest())
+
+        return sha.hexdigest()
+
+    # --- func to get what an entry is keyed by, and the key itself ---
+    @classmethod
+    def get_key_fields(cls, pdf_path, laparams):
+        return {
+            "pdf_sha256": cls.get_pdf_hash(pdf_path),
+            "laparams": DocumentSession.get_laparams_key(laparams),
+            "pdfminer": pdfminer.__version__,
+            "format": cls.FORMAT_VERSION,
+        }
+
+    @staticmethod
+    def get_key(fields):
+        blob = json.dumps(fields, sort_keys = True).encode('utf-8')
+
+        return hashlib.sha256(blob).hexdigest()
+
+    def get_entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get_page_path(self, key, page_num):
+        return os.path.join(self.get_entry_dir(key), f"{int(page_num)}.xml")
+
+    # --- func to get the index of an entry, None if there is no valid one ---
+    def get_index(self, key):
+        index_path = os.path.join(self.get_entry_dir(key), self.INDEX_NAME)
+        try:
+            with open(index_path, encoding = 'utf-8') as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.logger.warning("Dropping unreadable layout cache index %s: %s",
+                                index_path, e)
+            self.remove_entry(key)
+            return None
+
+        if index.get("key") != key or not isinstance(index.get("page_count"), int):
+            self.logger.warning("Dropping layout cache entry %s, its index does "
+                                "not match it", key)
+            self.remove_entry(key)
+            return None
+
+        return index
+
+    # --- func to start an entry ---
+    def put_index(self, key, fields, page_count):
+        index = {"key": key, "page_count": page_count, **fields}
+        entry_dir = self.get_entry_dir(key)
+        os.makedirs(entry_dir, exist_ok = True)
+
+        write_atomic(os.path.join(entry_dir, self.INDEX_NAME),
+                     json.dumps(index, sort_keys = True).encode('utf-8'))
+
+    # --- func to mark an entry as just used, for the eviction ---
+    def touch(self, key):
+        try:
+            os.utime(os.path.join(self.get_entry_dir(key), self.INDEX_NAME))
+        except OSError:
+            pass
+
+    # --- func to get a cached <page>, None on a miss ---
+    def get_page(self, key, page_num):
+        page_path = self.get_page_path(key, page_num)
+        if not os.path.exists(page_path):
+            return None
+
+        try:
+            page = ET.parse(page_path).getroot()
+        except (OSError, ET.ParseError) as e:
+            self.logger.warning("Dropping invalid layout cache page %s: %s",
+                                page_path, e)
+            self.remove_file(page_path)
+            return None
+
+        if page.tag != "page" or page.get("id") != str(int(page_num)):
+            self.logger.warning("Dropping layout cache page %s, it holds "
+                                "another page", page_path)
+            self.remove_file(page_path)
+            return None
+
+        return page
+
+    # --- func to write a <page> into an entry ---
+    def put_page(self, key, page_num, page):
+        try:
+            write_atomic(self.get_page_path(key, page_num),
+                         ET.tostring(page, encoding = 'utf-8'))
+        except OSError as e:
+            # a cache that cannot be written to only costs the next run time
+            self.logger.warning("Could not write page %s to the layout cache: %s",
+                                page_num, e)
+
+    def remove_file(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def remove_entry(self, key):
+        shutil.rmtree(self.get_entry_dir(key), ignore_errors = True)
+
+    # --- func to evict the least recently used entries over the size cap ---
+    def evict(self, keep = None):
+        entries = []
+        total = 0
+
+        for key in os.listdir(self.cache_dir):
+            entry_dir = self.get_entry_dir(key)
+            if not os.path.isdir(entry_dir):
+                continue
+
+            size = 0
+            used = 0
+            try:
+                with os.scandir(entry_dir) as it:
+                    for f in it:
+                        st = f.stat()
+                        size += st.st_size
+                        if f.name == self.INDEX_NAME:
+                            used = st.st_mtime
+            except OSError:
+                # evicted by another worker meanwhile
+                continue
+
+            total += size
+            entries.append((used, key, size))
+
+        if total <= self.max_bytes:
+            return
+
+        for used, key, size in sorted(entries):
+            if key == keep:
+                continue
+
+            self.remove_entry(key)
+            self.logger.debug("Evicted layout cache entry %s (%d bytes)", key, size)
+            total -= size
+
+            if total <= self.max_bytes:
+                break
@@ -0,0 +1,202 @@
+import io
+import time
+import random
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+
+class LensOCRError(RuntimeError):
+    """A page Lens did not read in any of its tries, or Lens failing so many
+    requests in a row that it is taken to be down."""
+
+
+class LensPageScheduler:
+    """Sends the pages of a scanned pdf to Chrome Lens a few at a time.
+
+    A page is two things one after the other: rendering it at 300 dpi, which
+    is CPU in this process, and waiting for Lens to read it, which is the
+    network and takes seconds. One page at a time leaves the CPU idle for
+    the whole of every wait. Here up to `concurrency` pages are in hand at
+    once: while some are waiting on Lens the next ones are rendered, in a
+    thread of their own so that the event loop keeps the requests going.
+    That is one thread and not a pool on purpose - pymupdf does not render
+    one document from two threads at once - and it is enough, rendering
+    being the short part.
+
+    A request that fails is tried again after an exponentially growing
+    delay with full jitter, so that the pages that failed together do not
+    all come back together. min_interval spaces the requests out, for when
+    Lens answers too many at once with errors. Whatever order the answers
+    come in, they are returned in the order of the pages.
+
+    A page that fails every try fails the document with a LensOCRError, the
+    pages still waiting being cancelled, unless allow_partial is given: then
+    it is logged and returned as None, and the pages around it are kept.
+    Either way, `breaker` failed requests in a row, with no page read in
+    between, say that Lens is down rather than that some pages are hard, and
+    the document fails at once instead of every page waiting out all of its
+    tries.
+
+    The Lens client is anything with the `process_image()` of
+    chrome_lens_py's LensAPI, so a stub one answering locally, such as
+    StubLensAPI, can be put in its place to run the OCR path without the
+    network.
+    """
+
+    DEFAULT_CONCURRENCY = 4
+    DEFAULT_RETRIES = 5
+    # seconds before the second try of a page, doubled for every try after
+    BASE_DELAY = 1.0
+    MAX_DELAY = 30.0
+    # failed requests in a row that stop the document
+    DEFAULT_BREAKER = 8
+
+    def __init__(self, lens, get_pixmap, concurrency=DEFAULT_CONCURRENCY,
+                 retries=DEFAULT_RETRIES, base_delay=BASE_DELAY,
+                 max_delay=MAX_DELAY, min_interval=0.0, allow_partial=False,
+                 breaker=DEFAULT_BREAKER):
+        self.logger = logging.getLogger(__name__)
+        self.lens = lens
+        # page -> pymupdf Pixmap, see ChromeLensParserTool.get_pixmap()
+        self.get_pixmap = get_pixmap
+        self.concurrency = max(1, concurrency)
+        self.retries = max(1, retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.min_interval = min_interval
+        self.last_request = None
+        self.allow_partial = allow_partial
+        self.breaker = max(1, breaker)
+        # failed requests since Lens last read a page, and whether they
+        # reached `breaker`
+        self.failures_in_a_row = 0
+        self.broken = False
+
+    # --- func to get the detailed blocks Lens finds on each page, in page order ---
+    def run(self, pages):
+        return asyncio.run(self.process_pages(pages))
+
+    async def process_pages(self, pages):
+        slots = asyncio.Semaphore(self.concurrency)
+        pacing = asyncio.Lock()
+
+        with ThreadPoolExecutor(max_workers=1,
+                                thread_name_prefix='lens-render') as renderer:
+            tasks = [asyncio.ensure_future(
+                         self.process_page(page, slots, pacing, renderer))
+                     for page in pages]
+            try:
+                results = await asyncio.gather(
+                    *tasks, return_exceptions=self.allow_partial)
+            except BaseException:
+                # a page that failed every try fails the document, so the
+                # pages still waiting are not worth sending
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                if self.broken:
+                    raise self.get_breaker_error()
+                raise
+
+        if self.broken:
+            raise self.get_breaker_error()
+
+        # asked for: a page that failed every try is left out, and not the
+        # document
+        for i, (page, result) in enumerate(zip(pages, results)):
+            if isinstance(result, LensOCRError):
+                self.logger.error(f"{result}, leaving it out")
+                results[i] = None
+            elif isinstance(result, BaseException):
+                raise result
+
+        return results
+
+    async def process_page(self, page, slots, pacing, renderer):
+        # the slot is taken before rendering, so that no more than
+        # `concurrency` rendered pages are held at once
+        async with slots:
+            loop = asyncio.get_running_loop()
+            image = await loop.run_in_executor(renderer, self.render_page, page)
+
+            for attempt in range(self.retries):
+                if self.broken:
+                    raise LensOCRError(f"Page {page.number + 1} not sent, "
+                                       f"Chrome Lens is failing every request")
+                try:
+                    await self.wait_turn(pacing)
+                    result = await self.lens.process_image(
+                        image_path=image,
+                        output_format="detailed"
+                    )
+                    self.failures_in_a_row = 0
+                    return result.get("detailed_blocks", [])
+                except Exception as e:
+                    self.failures_in_a_row += 1
+                    if self.failures_in_a_row >= self.breaker:
+                        self.broken = True
+                    if attempt + 1 == self.retries or self.broken:
+                        raise LensOCRError(f"Page {page.number + 1} OCR failed "
+                                           f"after {attempt + 1} tries: {e}") from e
+
+                    delay = self.get_delay(attempt)
+                    self.logger.warning(
+                        f"Page {page.number + 1} OCR failed "
+                        f"(Attempt {attempt + 1}/{self.retries}), trying "
+                        f"again in {delay:.1f}s: {e}"
+                    )
+                    await asyncio.sleep(delay)
+
+    def get_breaker_error(self):
+        return LensOCRError(f"Chrome Lens failed {self.breaker} requests in a "
+                            f"row, giving the document up")
+
+    def render_page(self, page):
+        pix = self.get_pixmap(page)
+        return Image.open(io.BytesIO(pix.tobytes("png")))
+
+    # --- func to get the seconds to wait after a failed try, with full jitter ---
+    def get_delay(self, attempt):
+        return random.uniform(0, min(self.max_delay,
+                                     self.base_delay * (2 ** attempt)))
+
+    # --- func to wait until min_interval has passed since the last request ---
+    async def wait_turn(self, pacing):
+        if not self.min_interval:
+            return
+
+        async with pacing:
+            now = time.monotonic()
+            if self.last_request is not None:
+                wait = self.last_request + self.min_interval - now
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            self.last_request = time.monotonic()
+
+
+class StubLensAPI:
+    """A Lens client answering locally, with the `process_image()` of
+    chrome_lens_py's LensAPI: the detailed blocks of an image are what
+    answer(image) returns, after delay seconds, and an answer that raises is
+    a failed request. It counts the requests, and the most that were in
+    flight at once."""
+
+    def __init__(self, answer=None, delay=0.0):
+        self.answer = answer if answer is not None else (lambda image: [])
+        self.delay = delay
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def process_image(self, image_path, output_format="detailed"):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            return {"detailed_blocks": self.answer(image_path)}
+        finally:
+            self.in_flight -= 1
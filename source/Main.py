@@ -1,6 +1,8 @@
 import os
 import argparse
+import itertools
 from difflib import SequenceMatcher
+import bisect
 from pathlib import Path
 from collections import defaultdict
 import re
@@ -8,9 +10,16 @@ import codecs
 import html
 import logging
 import shutil
+import tempfile
+import xml.etree.ElementTree as ET
 import pymupdf
 from .ParserTool import ParserTool, ChromeLensParserTool, TesseractParserTool
-from .Page import Page, SectionState
+from .DocumentSession import DocumentSession
+from .LayoutCache import LayoutCache
+from .IndicTextCache import IndicTextCache
+from .CharStore import CharStore
+from .HeaderFooterTemplates import HeaderFooterTemplates, HeaderFooterStore
+from .Page import Page, PageOutline, SectionState
 from .Judgment import JudgmentBuilder
 from .HTMLBuilder import HTMLBuilder, HTMLBuilderChromeLens
 from .Acts import Acts
@@ -18,17 +27,25 @@ from .SebiCirculars import SebiCirculars
 from .Amendment import Amendment
 from .Utils import *
 from .FontMapper import DynamicFontMapper
+from .FontNameResolver import FontNameResolver
+from .ToUnicodeCache import ToUnicodeCache
+from .LensScheduler import LensPageScheduler
 from .Manifest import IIIFManifest
-from .TableExtraction import HeaderRowClassifier, RegionMergeClassifier, ContinuationClassifier
+from .TableExtraction import TableExtraction, HeaderRowClassifier, RegionMergeClassifier, ContinuationClassifier
 
 from contextlib import contextmanager
 
 try:
+    from indic2unicode import fontconv
     from indic2unicode.fontconv import FontConv
     INDIC2UNICODE_AVAILABLE = True
 except ImportError:
     INDIC2UNICODE_AVAILABLE = False
 
+# what the ToUnicodeCache and the IndicTextCache are kept under, see
+# get_indic2unicode_version()
+_INDIC2UNICODE_VERSION = None
+
 try:
     from indic2unicode.tools.fix_tounicode import ToUnicodeFixer, get_font_converter
     TOUNICODE_FIX_AVAILABLE = True
@@ -45,6 +62,17 @@ except ImportError:
     CAMELOT_LAYOUT_AVAILABLE = False
 
 
+# --- func to get the version of indic2unicode the indic caches are kept under ---
+def get_indic2unicode_version():
+    """Utils.get_package_version() of indic2unicode, which reads and hashes
+    the files of the package: done the first time a cache is opened, and
+    once a process, rather than by everything that imports Main."""
+    global _INDIC2UNICODE_VERSION
+    if _INDIC2UNICODE_VERSION is None:
+        _INDIC2UNICODE_VERSION = get_package_version(fontconv)
+    return _INDIC2UNICODE_VERSION
+
+
 # --- accessors that let one conversion run over both kinds of char it has to
 # --- handle: the <text> elements of the xml, and camelot's own LTChar objects
 
@@ -219,7 +247,14 @@ class Main:
                  rights=None, provider_id=None, provider_name=None, 
                  attribution=None, figure_text=False, font_conv_map=None,
                  ocr_engine="tesseract", font_model=None,
-                 font_detect=True): #start,end,is_amendment_pdf,output_dir, pdf_type):
+                 font_detect=True, xml_engine="pdfminer",
+                 layout_cache_size=LayoutCache.DEFAULT_MAX_MB,
+                 page_workers=1, stream_window=0, header_sample=0,
+                 header_series=None,
+                 indic_cache_size=IndicTextCache.DEFAULT_MAX_ENTRIES,
+                 tounicode_save="incremental",
+                 lens_concurrency=LensPageScheduler.DEFAULT_CONCURRENCY,
+                 lens_partial=False): #start,end,is_amendment_pdf,output_dir, pdf_type):
         self.logger = logging.getLogger('source.Main')
         if self.is_url_like(output_dir):
             raise ValueError(
@@ -264,6 +299,12 @@ class Main:
                 f"{', '.join(sorted(TESSERACT_TO_PADDLE_LANG))}. Falling back to 'eng'."
             )
             ocr_language = "eng"
+        if ocr_engine == "tesserocr" and not is_tesserocr_available():
+            self.logger.warning(
+                "[!] ocr_engine='tesserocr' needs the tesserocr package, which is "
+                "not installed. Falling back to 'tesseract'."
+            )
+            ocr_engine = "tesseract"
 
         self.pdf_path = pdfPath
         self.output_dir = output_dir
@@ -273,6 +314,51 @@ class Main:
         self.provider_name = provider_name
         self.attribution = attribution
         self.parserTool = ParserTool()
+        # the pdf opened once for everything that reads it - images, tables,
+        # the ToUnicode repair and OCR - see DocumentSession
+        self.pdf_session = DocumentSession(self.pdf_path)
+        # how the copy with repaired ToUnicode maps is written: 'incremental'
+        # appends the repaired maps to a copy of the pdf, 'full' writes the
+        # repaired document out whole
+        self.tounicode_save = tounicode_save
+        # the maps repaired before, opened on first use - see ToUnicodeCache
+        self.tounicode_cache = None
+        # the pages of a scanned copy sent to Chrome Lens at once, see
+        # LensPageScheduler
+        self.lens_concurrency = lens_concurrency
+        # a page Lens fails every try is left out, and not the document
+        self.lens_partial = lens_partial
+        # 'pdfminer' builds the page xml from pdfminer's layout in process,
+        # 'pdf2txt' runs pdf2txt.py and parses the xml file it writes
+        self.xml_engine = xml_engine
+        self.xml_path = None
+        # the page xml of the pdfs seen before, layout_cache_size MB of it at
+        # most, none when that is 0 - see LayoutCache
+        self.layout_cache = None
+        if layout_cache_size:
+            self.layout_cache = LayoutCache(self.get_path_cache_xml() / "layout",
+                                            int(layout_cache_size) * 1024 * 1024)
+        # processes the layout of the pages is analysed in, 0 for one per cpu
+        self.page_workers = page_workers
+        # pages classified and written out at a time, 0 for the whole document
+        # at once - see stream_pages()
+        self.stream_window = stream_window
+        # pages of a streamed document its headers/footers are learned from,
+        # 0 for all of them - see HeaderFooterTemplates
+        self.header_sample = header_sample
+        self.header_templates = None
+        # (layout cache, stream) of the document being streamed
+        self.stream_source = None
+        # the publication series whose headers/footers are kept across its
+        # documents, 'auto' for one per pdf type and page size - see
+        # HeaderFooterStore
+        self.header_series = header_series
+        self.header_store = None
+        self.header_store_learned = False
+        self.is_streamed = False
+        # the pages whose html is built already, which a streamed document can
+        # no longer change
+        self.emitted_pages = set()
         self.total_pgs = 0
         self.all_pgs = {}
         self.pdf_type = pdf_type  # Store pdf_type for later use
@@ -288,6 +374,9 @@ class Main:
         self.is_footnote_continuation = is_footnote_continuation
         self.fontmapper = DynamicFontMapper(self.pdf_path, out_dir=self.output_dir)
         self.unique_images = {}
+        # content hash -> the file and text of an image, however many names
+        # and pages it is drawn under, see Pictures.add_content()
+        self.image_contents = {}
         self.all_footnote_text = {}
         self.html_builder = None
         self.min_img_pixels = min_img_pixels
@@ -306,6 +395,13 @@ class Main:
         # bottom of one page can be picked up at the top of the next (set per page in the
         # processing loops, reset here so it never leaks across documents/runs).
         self.pending_continuation = None
+        # footnote state carried from one page to the next, see get_footnotes()
+        # and get_all_footnote_text()
+        self.previous_page_footnote_font_size = None
+        self.seen_footnote = set()
+        self.active_footnote = (None, None)
+        # whether the last sentence of the previous page ended, sebi_circulars
+        self.prev_sent_end_status = True
         # Legacy (non unicode) indic font handling, see convert_indic_fonts()
         self.font_conv = self.get_font_conv()
         # mappings given by the caller come first, so that a font can be pointed at
@@ -316,6 +412,10 @@ class Main:
         self.indic_font_keys = {}
         # (font key, text drawn in that font) -> converted unicode text
         self.indic_text_cache = {}
+        # and the same kept on disk across documents, see IndicTextCache,
+        # opened by get_indic_cache() on the first run to convert
+        self.indic_cache = None
+        self.indic_cache_size = int(indic_cache_size or 0)
         # The fonts none of the above can place are identified from the text they
         # draw instead, with the model of machinelearning/, see detect_unknown_fonts()
         self.font_detect = font_detect
@@ -424,6 +524,13 @@ class Main:
         in the order in which the glyphs are drawn, so the text of a repaired
         font is pointed at the converter that only reorders it rather than at
         the one named after the font, which is for an unrepaired pdf.
+
+        The maps repaired are kept under a hash of the font they were repaired
+        for, and so is every font the fixer left alone, so a pdf made of fonts
+        seen before is patched from them without the fixer deriving anything
+        again. The copy is the pdf with the repaired maps appended to it as an
+        incremental update, unless the fixer did more to the fonts than
+        rewrite their maps or -tus full asks for the document written whole.
         """
         if not TOUNICODE_FIX_AVAILABLE:
             self.logger.debug(
@@ -436,12 +543,25 @@ class Main:
             return
 
         try:
-            fixer = ToUnicodeFixer()
-            doc = pymupdf.open(self.pdf_path)
-            num = fixer.fix_document(doc)
-
-            if not num:
-                doc.close()
+            doc = self.pdf_session.get_document()
+            # the fonts seen before are repaired from the cache, and a pdf
+            # whose fonts all were is not given to the fixer at all
+            tounicode_cache = self.get_tounicode_cache()
+            fonts = tounicode_cache.get_fonts(doc)
+            cached = tounicode_cache.lookup(fonts)
+
+            if cached is not None:
+                num = None
+                fixed_fonts, patches = cached
+            else:
+                fixer = ToUnicodeFixer()
+                num = fixer.fix_document(doc)
+                # None if the fixer did more than rewrite maps, which only
+                # a copy of the whole of doc keeps
+                patches = tounicode_cache.learn(doc, fonts, fixer.fixed_fonts)
+                fixed_fonts = fixer.fixed_fonts if num else set()
+
+            if not fixed_fonts:
                 return
 
             # the repaired copy keeps the name of the document, everything
@@ -449,33 +569,55 @@ class Main:
             fixed_dir = os.path.join(self.get_path_cache_pdf(), 'tounicode')
             os.makedirs(fixed_dir, exist_ok = True)
             fixed_path = os.path.join(fixed_dir, os.path.basename(self.pdf_path))
-            doc.save(fixed_path)
-            doc.close()
+
+            if patches is None or self.tounicode_save != 'incremental' or \
+               not tounicode_cache.write_incremental_copy(self.pdf_path, fixed_path, patches):
+                if cached is not None:
+                    tounicode_cache.apply(doc, patches)
+                doc.save(fixed_path)
         except Exception as e:
+            # the session's document may be half repaired, it is read afresh
+            self.pdf_session.close()
             self.logger.warning(
                 "[!] Could not repair the ToUnicode maps of %s, its text is "
                 "extracted as it is: %s", self.pdf_path, e
             )
             return
 
-        self.logger.info(
-            "Repaired %d glyphs of the ToUnicode maps of the font(s) %s, "
-            "parsing %s instead", num, ', '.join(sorted(fixer.fixed_fonts)),
-            fixed_path
-        )
+        if num is None:
+            self.logger.info(
+                "Repaired the ToUnicode maps of the font(s) %s from the maps "
+                "repaired before, parsing %s instead",
+                ', '.join(sorted(fixed_fonts)), fixed_path
+            )
+        else:
+            self.logger.info(
+                "Repaired %d glyphs of the ToUnicode maps of the font(s) %s, "
+                "parsing %s instead", num, ', '.join(sorted(fixed_fonts)),
+                fixed_path
+            )
 
         self.pdf_path = fixed_path
+        self.pdf_session.set_path(fixed_path)
         # the fonts of the repaired pdf are read from the repaired copy too
         if self.fontmapper is not None:
             self.fontmapper.pdf_path = fixed_path
 
         self.indic_font_res = self.font_conv_map_res + \
-                              self.get_repaired_font_res(fixer.fixed_fonts) + \
+                              self.get_repaired_font_res(fixed_fonts) + \
                               self.get_indic_font_res()
         # a font may already have been looked up while the map was broken
         self.indic_font_keys = {}
         self.indic_text_cache = {}
 
+    # --- func to get the cache of repaired ToUnicode maps, opened on first use ---
+    def get_tounicode_cache(self):
+        if self.tounicode_cache is None:
+            self.tounicode_cache = ToUnicodeCache(self.get_path_cache_xml() / "tounicode",
+                                                  get_indic2unicode_version())
+
+        return self.tounicode_cache
+
     # --- func to get the regexps for the fonts whose map was repaired ---
     def get_repaired_font_res(self, fixed_fonts):
         if self.font_conv is None:
@@ -529,17 +671,22 @@ class Main:
 
         return font_res
 
+    # --- the (regex, font key) pairs a pdf font name is matched against, first match wins ---
+    @property
+    def indic_font_res(self):
+        return self.indic_font_resolver.font_res
+
+    @indic_font_res.setter
+    def indic_font_res(self, font_res):
+        # compiled into one regex whenever the pairs change, see FontNameResolver
+        self.indic_font_resolver = FontNameResolver(font_res)
+
     # --- func to get the legacy indic font a pdf font name corresponds to ---
     def get_indic_font_key(self, font_name):
         if font_name in self.indic_font_keys:
             return self.indic_font_keys[font_name]
 
-        font_key = None
-
-        for font_re, key in self.indic_font_res:
-            if font_re.search(font_name):
-                font_key = key
-                break
+        font_key = self.indic_font_resolver.resolve(font_name)
 
         self.indic_font_keys[font_name] = font_key
 
@@ -557,7 +704,9 @@ class Main:
 
         Orange takes a second to import and the model only matters for a pdf
         that has a font nothing else can place, so neither is paid for until
-        one turns up.
+        one turns up. Once loaded it is kept by FontClassifier.load() for the
+        rest of the process, so the documents converted after that one share
+        it rather than each loading their own.
         """
         if self.font_classifier is not None:
             # False is a load that has already failed and been reported, which
@@ -567,7 +716,7 @@ class Main:
         try:
             from machinelearning.predict import FontClassifier
 
-            self.font_classifier = FontClassifier(str(self.font_model))
+            self.font_classifier = FontClassifier.load(self.font_model)
         except Exception as e:
             self.logger.warning(
                 "[!] Could not load the font detection model %s, the fonts whose "
@@ -824,6 +973,58 @@ class Main:
 
         return len(INDIC_SCRIPT_RE.findall(chars)) / len(chars)
 
+    # --- func to get the IndicTextCache, opened on first use ---
+    def get_indic_cache(self):
+        """None if -ics 0 turned it off or it cannot be opened: a document
+        with no legacy indic font neither opens it nor hashes indic2unicode
+        for its version."""
+        if self.indic_cache is None and self.font_conv is not None and self.indic_cache_size:
+            try:
+                version = get_indic2unicode_version()
+            except OSError as e:
+                self.logger.warning("Not using the indic text cache, the version of "
+                                    "indic2unicode could not be read: %s", e)
+                self.indic_cache_size = 0
+                return None
+            self.indic_cache = IndicTextCache(self.get_path_cache_xml() / "indic_text.sqlite",
+                                              version, self.indic_cache_size)
+
+        return self.indic_cache
+
+    # --- func to convert many texts drawn in legacy indic fonts into unicode ---
+    def indic_to_unicode_many(self, keys):
+        """{(font key, text): unicode} for the (font key, text) pairs keys,
+        each looked up in the conversions of this document first, then in the
+        IndicTextCache of the ones before it, and only converted if in
+        neither. What indic2unicode leaves as it is, or fails on, is not kept
+        on disk."""
+        converted = {}
+        missing = []
+        for key in keys:
+            if key in self.indic_text_cache:
+                converted[key] = self.indic_text_cache[key]
+            else:
+                missing.append(key)
+
+        indic_cache = self.get_indic_cache() if missing else None
+        if indic_cache is not None:
+            found = indic_cache.get_many(missing)
+            self.indic_text_cache.update(found)
+            converted.update(found)
+            missing = [key for key in missing if key not in found]
+
+        new = {}
+        for font_key, text in missing:
+            unicode_text = self.indic_to_unicode(font_key, text)
+            converted[(font_key, text)] = unicode_text
+            if unicode_text != text:
+                new[(font_key, text)] = unicode_text
+
+        if new and indic_cache is not None:
+            indic_cache.put_many(new)
+
+        return converted
+
     # --- func to convert text drawn in a legacy indic font into unicode ---
     def indic_to_unicode(self, font_key, text):
         cache_key = (font_key, text)
@@ -875,16 +1076,40 @@ class Main:
                 )
 
     def drop_overlapping_spaces_in_page(self, page):
+        runs = []
         for element in page.iter():
             # a <text> element never has children of its own, so every one of
             # them is grouped under exactly one parent and looked at just once
             chars = [child for child in element if child.tag == 'text']
 
-            for char in self.get_overprinted_spaces(chars):
-                element.remove(char)
+            # only the runs with a space in them have anything to drop, and
+            # only their chars are worth reading into a CharStore
+            if any(char.text and not char.text.strip() for char in chars):
+                runs.append((element, chars))
+
+        store = CharStore.from_lines(runs)
+
+        dropped = False
+        for line, (element, chars) in enumerate(runs):
+            for idx in self.get_overprinted_spaces(store.get_line_chars(line)):
+                element.remove(chars[idx])
+                dropped = True
+
+        if dropped:
+            self.load_page_chars(page)
+
+    # --- func to have the Page made of a <page> read the chars changed in it again ---
+    def load_page_chars(self, page):
+        # pages are made after their xml is final, so this only finds one
+        # for xml that is changed later on
+        for page_obj in self.all_pgs.values():
+            if page_obj.page_in_xml is page:
+                page_obj.load_chars()
 
     # --- func to pick out the spaces drawn over by a neighbouring glyph ---
     def get_overprinted_spaces(self, chars):
+        """The indices of the overprinted spaces among chars, a run of
+        (text, bbox) pairs as CharStore.get_line_chars() gives them."""
         overprinted = []
 
         for idx, char in enumerate(chars):
@@ -905,7 +1130,7 @@ class Main:
             following = self.get_neighbour_x_range(chars, range(idx + 1, len(chars)))
 
             if self.is_overprinted_space(space, previous, following):
-                overprinted.append(char)
+                overprinted.append(idx)
 
         return overprinted
 
@@ -946,19 +1171,17 @@ class Main:
 
     @staticmethod
     def is_space_char(char):
-        return bool(char.text) and not char.text.strip()
+        text = char[0]
+        return bool(text) and not text.strip()
 
     @staticmethod
     def get_char_x_range(char):
-        bbox = char.attrib.get("bbox")
+        bbox = char[1]
 
-        if not bbox:
+        if bbox is None:
             return None
 
-        try:
-            x0, _, x1, _ = map(float, bbox.split(","))
-        except (ValueError, TypeError):
-            return None
+        x0, _, x1, _ = bbox
 
         return (x0, x1) if x1 > x0 else None
 
@@ -994,54 +1217,93 @@ class Main:
                 )
 
     def convert_indic_fonts_in_page(self, page):
+        runs = []
         for element in page.iter():
             # a <text> element never has children of its own, so every one of
             # them is grouped under exactly one parent and converted just once
             texts = [child for child in element if child.tag == 'text']
 
             if texts:
-                self.convert_indic_font_runs(texts, XML_TEXT_ACCESSORS)
+                runs.extend(self.get_indic_font_runs(texts, XML_TEXT_ACCESSORS))
+
+        self.convert_indic_font_run_batch(runs, XML_TEXT_ACCESSORS)
+
+        self.load_page_chars(page)
 
     # --- func to convert chars sitting side by side, one font run at a time ---
     def convert_indic_font_runs(self, chars, accessors):
+        self.convert_indic_font_run_batch(self.get_indic_font_runs(chars, accessors),
+                                          accessors)
+
+    # --- func to split chars sitting side by side into runs of one legacy indic font ---
+    def get_indic_font_runs(self, chars, accessors):
+        """[(font key, [char, ...]), ...], the runs of chars of a legacy
+        indic font, in order."""
         # conversion is contextual - matras get reordered and glyph pairs get
         # composed - so it is applied to the longest run of consecutive chars
         # sharing the same font instead of one char at a time
         get_font = accessors[0]
+        font_keys = self.indic_font_keys
 
+        runs = []
         run = []
         run_font_key = None
+        font_name = None
+        font_key = None
 
         for char in chars:
             # chars without a font (the spaces and newlines pdfminer inserts
-            # itself) end the current run
-            font_name = get_font(char)
-
-            font_key = self.get_indic_font_key(font_name) if font_name else None
+            # itself) end the current run. Consecutive chars are mostly of one
+            # font, which is then looked up once
+            char_font_name = get_font(char)
+            if char_font_name != font_name:
+                font_name = char_font_name
+                if not font_name:
+                    font_key = None
+                elif font_name in font_keys:
+                    font_key = font_keys[font_name]
+                else:
+                    font_key = self.get_indic_font_key(font_name)
 
             if font_key != run_font_key:
-                self.convert_indic_font_run(run, run_font_key, accessors)
+                if run and run_font_key:
+                    runs.append((run_font_key, run))
                 run = []
                 run_font_key = font_key
 
             if font_key:
                 run.append(char)
 
-        self.convert_indic_font_run(run, run_font_key, accessors)
+        if run and run_font_key:
+            runs.append((run_font_key, run))
 
-    # --- func to convert one run of chars sharing the same legacy indic font ---
-    def convert_indic_font_run(self, run, font_key, accessors):
-        _, get_text, set_text = accessors
+        return runs
 
-        if not run or not font_key:
-            return
+    # --- func to convert runs of chars of legacy indic fonts, each distinct text once ---
+    def convert_indic_font_run_batch(self, runs, accessors):
+        """The runs are the get_indic_font_runs() of a page, or of more than
+        one: the ones of the same font and text - the same boilerplate on
+        every page - are converted once, by indic_to_unicode_many()."""
+        _, get_text, _ = accessors
 
-        original = ''.join(get_text(char) or '' for char in run)
+        originals = []
+        for font_key, run in runs:
+            original = ''.join(get_text(char) or '' for char in run)
+            originals.append(original if original.strip() else None)
 
-        if not original.strip():
-            return
+        converted = self.indic_to_unicode_many(
+            {(font_key, original) for (font_key, _), original in zip(runs, originals)
+             if original is not None}
+        )
+
+        for (font_key, run), original in zip(runs, originals):
+            if original is not None:
+                self.spread_indic_text(run, original, converted[(font_key, original)],
+                                       accessors)
 
-        converted = self.indic_to_unicode(font_key, original)
+    # --- func to put the converted text of a run back over its chars ---
+    def spread_indic_text(self, run, original, converted, accessors):
+        _, _, set_text = accessors
 
         if converted == original:
             return
@@ -1113,8 +1375,11 @@ class Main:
         # one textline at a time and never across two of them: a run spanning
         # two cells would move text from one into the other once its converted
         # form is spread back over the chars it came from
+        runs = []
         for textline in list(horizontal_text) + list(vertical_text):
-            self.convert_indic_font_runs(list(textline), LT_CHAR_ACCESSORS)
+            runs.extend(self.get_indic_font_runs(list(textline), LT_CHAR_ACCESSORS))
+
+        self.convert_indic_font_run_batch(runs, LT_CHAR_ACCESSORS)
 
     def get_all_footnote_text(self):
 
@@ -1122,8 +1387,7 @@ class Main:
             r'^\{\{\^\{\{FOOTNOTE\s*(.+?)\}\}\}\}'
         )
 
-        active_footnote_num = None
-        active_footnote_page = None
+        active_footnote_num, active_footnote_page = self.active_footnote
 
         for pg_num in sorted(self.all_pgs.keys()):
 
@@ -1136,74 +1400,9 @@ class Main:
                 if page.all_tbs[tb] != 'footnote':
                     continue
 
-                for textline in tb.tbox.findall(".//textline"):
-
-                    line_parts = []
-
-                    pending_superscript = []
-
-                    for text in textline.findall(".//text"):
-
-                        raw = text.text or ""
-
-                        if not raw:
-                            continue
-
-                        is_super = False
-
-                        if "bbox" in text.attrib:
-
-                            try:
-
-                                bbox = tuple(
-                                    map(
-                                        float,
-                                        text.attrib["bbox"].split(",")
-                                    )
-                                )
-
-                                if bbox in tb.footnotes_superscript:
-
-                                    pending_superscript.append(
-                                        tb.footnotes_superscript[bbox]
-                                    )
-
-                                    is_super = True
-
-                            except Exception:
-                                pass
-
-                        if not is_super:
-
-                            if pending_superscript:
-
-                                marker = "".join(
-                                    pending_superscript
-                                )
-
-                                line_parts.append(
-                                    "{{^{{FOOTNOTE "
-                                    + marker +
-                                    "}}}}"
-                                )
-
-                                pending_superscript = []
-
-                            line_parts.append(raw)
+                for textline in tb.chars.get_line_range(tb.box):
 
-                    if pending_superscript:
-
-                        marker = "".join(
-                            pending_superscript
-                        )
-
-                        line_parts.append(
-                            "{{^{{FOOTNOTE "
-                            + marker +
-                            "}}}}"
-                        )
-
-                    text = "".join(line_parts)
+                    text = tb.get_marked_line_text(textline)
 
                     text = re.sub(
                         r'\s+',
@@ -1268,14 +1467,21 @@ class Main:
                 active_footnote_num = None
                 active_footnote_page = None
 
+        self.active_footnote = (active_footnote_num, active_footnote_page)
+
     def finalize_unique_images(self):
 
         remove_hashes = []
 
         for img_hash, meta in self.unique_images.items():
 
+            # the same pixels drawn more than once, under whichever names
             if meta.get("count", 0) > 1:
 
+                if meta.get("pages", set()) & self.emitted_pages:
+                    # written out on a page already, so it stays on every page
+                    continue
+
                 img_path = meta.get("path")
 
 
@@ -1376,7 +1582,7 @@ class Main:
     def buildHTML(self, start_page, end_page): #, section_page_end):
         if not self.html_builder:
             return
-        if not self.all_pgs:
+        if not self.all_pgs and not self.is_streamed:
             self.html_builder.build(start_page, end_page)
             html_content = self.html_builder.get_html()
             self.write_html(html_content, start_page, end_page)
@@ -1417,7 +1623,6 @@ class Main:
             # page.print_footers()
 
     def process_pages_sebi_circulars(self, pdf_type):
-        prev_sent_end_status = True
         sentence_completion_punctutation = ('.', ';', ':', '—', ':—', '; or',\
                                                 ': or', '; and', ': and', ':––', ';––',\
                                                 '––', '."', '.\'', ';"', ';\'' , \
@@ -1433,7 +1638,7 @@ class Main:
             # print(page.is_single_column_page)
             page.get_bulletins_sebi_circulars(self.section_state)
             page.get_titles(pdf_type)
-            prev_sent_end_status = page.get_title_hierarchy(self.title_state, prev_sent_end_status, sentence_completion_punctutation)   
+            self.prev_sent_end_status = page.get_title_hierarchy(self.title_state, self.prev_sent_end_status, sentence_completion_punctutation)   
             page.sort_all_boxes()
             # page.print_blockquote()
             # page.print_headers()
@@ -1516,26 +1721,10 @@ class Main:
 
     # --- NEW ADAPTIVE HEADER/FOOTER DETECTION ---
     def get_page_header_footer(self, pages, base_name_of_file, output_dir):
+        self.prefetch_tables(pages)
         # Initialize page objects first
         for pg in pages:
-            pdf_dir = self.get_path_cache_pdf()
-            if not self.pdf_path.lower().endswith(".pdf"):
-                base_name = os.path.basename(self.pdf_path) + ".pdf"
-                new_pdf_path = os.path.join(pdf_dir, base_name)
-                shutil.copy(self.pdf_path, new_pdf_path)
-                self.logger.debug(f"Copied input file to cache dir as: {new_pdf_path}")
-                self.pdf_path = new_pdf_path
-
-            page = Page(pg, self.pdf_path, base_name_of_file, output_dir,
-                        self.pdf_type, self.has_side_notes, self.is_amendment_pdf,
-                        self.fontmapper, self.unique_images, self.min_img_pixels,
-                        self.ocr_language,
-                        self.is_scanned_copy, self.figure_text, self.ocr_engine)
-            self.total_pgs += 1
-            self.all_pgs[self.total_pgs] = page
-            page.process_textboxes()#pg)
-            page.get_figures()#pg)
-            page.label_table_tbs()
+            self.add_page(pg, base_name_of_file, output_dir)
 
             # page.line_based_header_footer_detection()
 
@@ -1545,21 +1734,74 @@ class Main:
         if not self.is_scanned_copy:
             self.adaptive_header_footer_detection(pages, self.pdf_type)
 
+        self.label_pages(pages, base_name_of_file, output_dir)
+
+    # --- func to make the Page of a <page> and label its tables ---
+    def add_page(self, pg, base_name_of_file, output_dir):
+        self.use_pdf_suffix()
+
+        page = Page(pg, self.pdf_path, base_name_of_file, output_dir,
+                    self.pdf_type, self.has_side_notes, self.is_amendment_pdf,
+                    self.fontmapper, self.unique_images, self.min_img_pixels,
+                    self.ocr_language,
+                    self.is_scanned_copy, self.figure_text, self.ocr_engine,
+                    self.pdf_session, image_contents=self.image_contents)
+        self.total_pgs += 1
+        self.all_pgs[self.total_pgs] = page
+        page.process_textboxes()#pg)
+        page.get_figures()#pg)
+        page.label_table_tbs()
+        # the images are out, nothing reads the page's layout again
+        self.pdf_session.release_page(page.pg_num)
+
+        return page
+
+    # --- func to point everything that reads the pdf at a copy named .pdf ---
+    def use_pdf_suffix(self):
+        pdf_dir = self.get_path_cache_pdf()
+        if not self.pdf_path.lower().endswith(".pdf"):
+            base_name = os.path.basename(self.pdf_path) + ".pdf"
+            new_pdf_path = os.path.join(pdf_dir, base_name)
+            shutil.copy(self.pdf_path, new_pdf_path)
+            self.logger.debug(f"Copied input file to cache dir as: {new_pdf_path}")
+            self.pdf_path = new_pdf_path
+            self.pdf_session.set_path(new_pdf_path)
+
+    # --- func to look for the ruled tables of the pages about to be made at once ---
+    def prefetch_tables(self, pages):
+        """The pages that can have a ruled table at all, see
+        TableExtraction.may_have_ruled_table(), are handed to camelot in one
+        call, in -pw processes, which the Pages then find their tables in;
+        see DocumentSession.prefetch_tables()."""
+        if self.is_scanned_copy:
+            return
+
+        self.use_pdf_suffix()
+        # a legacy font conversion installed into camelot is installed in this
+        # process only, see camelot_font_conversion()
+        workers = self.page_workers
+        if self.font_conv is not None and self.indic_font_res:
+            workers = 1
+        self.pdf_session.prefetch_tables(
+            [pg.get("id") for pg in pages if TableExtraction.may_have_ruled_table(pg)],
+            workers
+        )
+
+    # --- func to label footnotes, headers/footers, tables and toc of all_pgs ---
+    def label_pages(self, pages, base_name_of_file, output_dir, find_toc = True):
         protected_tbs_by_page = defaultdict(set)
         for group in self.adaptive_headers + self.adaptive_footers:
             for elem in group['elements']:
                 protected_tbs_by_page[elem['page_num']].add(elem['textbox'])
 
-        previous_page_footnote_font_size  = None
-        seen_footnote = set()
         for page_num, page in self.all_pgs.items():
             protected_tbs = protected_tbs_by_page.get(page_num, set())
             page.mark_standalone_footnote_markers(protected_tbs)
             if self.is_footnote_continuation:
-                previous_page_footnote_font_size, seen_footnote = (
+                self.previous_page_footnote_font_size, self.seen_footnote = (
                     page.get_footnotes(
-                        seen_footnote,
-                        previous_page_footnote_font_size,
+                        self.seen_footnote,
+                        self.previous_page_footnote_font_size,
                         protected_tbs
                     )
                 )
@@ -1572,7 +1814,6 @@ class Main:
 
         if self.table_extract and self.pdf_type != 'judgments':
             self.logger.info("Detecting borderless tables...")
-            self.pending_continuation = None
             for page in self.all_pgs.values():
                 page.reclaim_header_footer_for_continuation(self.pending_continuation)
                 self.pending_continuation = page.get_borderless_table(
@@ -1592,7 +1833,8 @@ class Main:
         # elif self.pdf_type in {'sebi'}:
         #     self.detect_sebi_header_pre(pages)
 
-        self.detect_toc(pages)
+        if find_toc:
+            self.detect_toc(pages)
 
         self.finalize_unique_images()
         if not self.unique_images:
@@ -1611,25 +1853,13 @@ class Main:
             except OSError as e:
                 self.logger.debug(f"Could not remove manifest directory {directory}: {e}")
 
-    def adaptive_header_footer_detection(self, pages, pdf_type=None):
+    def adaptive_header_footer_detection(self, pages, pdf_type=None, page_elements=None):
         self.adaptive_headers = []
         self.adaptive_footers = []
-        page_elements = []
+        self.adaptive_bottom_footers = False
         
-        # Simple working configuration
-        if pdf_type not in set(['sebi_circulars']):
-            HEADER_ZONE_THRESHOLD = 0.12#0.15    # Top 15% of page height
-            FOOTER_ZONE_THRESHOLD = 0.12#0.15    # Bottom 15% of page height
-            SIMILARITY_THRESHOLD =  0.8       # 80% similarity
-            MIN_OCCURRENCE_RATE =   0.4     # Must appear on at least 40% of pages
-            LINE_TOLERANCE = 0.02           # 2% of page height tolerance for same line detection
-        
-        else:
-            HEADER_ZONE_THRESHOLD = 0.12#0.15    # Top 15% of page height
-            FOOTER_ZONE_THRESHOLD = 0.12#0.15    # Bottom 15% of page height
-            SIMILARITY_THRESHOLD =  0.9       # 80% similarity
-            MIN_OCCURRENCE_RATE =   0.6     # Must appear on at least 40% of pages
-            LINE_TOLERANCE = 0.02 
+        (HEADER_ZONE_THRESHOLD, FOOTER_ZONE_THRESHOLD, SIMILARITY_THRESHOLD,
+         MIN_OCCURRENCE_RATE, LINE_TOLERANCE) = self.get_header_footer_thresholds(pdf_type)
 
         try:
             total_pages = len(pages)
@@ -1639,57 +1869,16 @@ class Main:
             if total_pages == 1:
                 self.logger.info("Single-page PDF detected - using strict header/footer detection")
                 self._handle_single_page_header_footer_detection(pages, pdf_type, HEADER_ZONE_THRESHOLD, FOOTER_ZONE_THRESHOLD)
+                self.learn_header_series()
                 return
             
-            # Step 1: Extract all textboxes with normalized coordinates
-            for pg_idx, pg in enumerate(pages):
-                page_num = pg_idx + 1
-                if page_num not in self.all_pgs:
-                    continue
-                    
-                page_obj = self.all_pgs[page_num]
-                
-                for tb, label in page_obj.all_tbs.items():
-                    try:
-                        if label is not None:
-                            continue
-                        text = tb.extract_text_from_tb().strip()
-                        if not text or text.isspace():
-                            continue
-                            
-                        # Normalize coordinates as percentages of page dimensions
-                        x0_pct = tb.coords[0] / page_obj.pg_width
-                        y0_pct = tb.coords[1] / page_obj.pg_height
-                        x1_pct = tb.coords[2] / page_obj.pg_width
-                        y1_pct = tb.coords[3] / page_obj.pg_height
-                        
-                        width_pct = x1_pct - x0_pct
-                        height_pct = y1_pct - y0_pct
-                        
-                        # Calculate relative position zones
-                        is_header_zone = y0_pct >= (1 - HEADER_ZONE_THRESHOLD)
-                        is_footer_zone = y0_pct <= FOOTER_ZONE_THRESHOLD
-                        
-                        page_elements.append({
-                            'page_num': page_num,
-                            'text': text,
-                            'textbox': tb,
-                            'x0_pct': x0_pct,
-                            'y0_pct': y0_pct,
-                            'x1_pct': x1_pct,
-                            'y1_pct': y1_pct,
-                            'width_pct': width_pct,
-                            'height_pct': height_pct,
-                            'is_header_zone': is_header_zone,
-                            'is_footer_zone': is_footer_zone,
-                            'is_centered': abs(x0_pct + width_pct/2 - 0.5) < 0.1,
-                            'is_left_aligned': x0_pct < 0.1,
-                            'is_right_aligned': x1_pct > 0.9
-                        })
-                        
-                    except Exception as e:
-                        self.logger.warning("Error processing textbox on page %d: %s", page_num, e)
-                        continue
+            # Step 1: Extract all textboxes with normalized coordinates, unless
+            # a streamed document has had them extracted page by page already
+            if page_elements is None:
+                page_elements = []
+                for page_num, page_obj in self.all_pgs.items():
+                    page_elements.extend(self.get_header_footer_elements(
+                        page_num, page_obj, HEADER_ZONE_THRESHOLD, FOOTER_ZONE_THRESHOLD))
             
             if not page_elements:
                 self.logger.warning("No valid page elements found for header/footer detection")
@@ -1720,113 +1909,33 @@ class Main:
                                        elem['y0_pct'], elem['text'][:40], 
                                        elem['is_header_zone'], elem['is_footer_zone'])
             
-            # Step 2: Simple similarity calculation
-            def calculate_similarity(elem1, elem2):
-                if re.fullmatch(r'\d+', elem1['text'].strip()) and re.fullmatch(r'\d+', elem2['text'].strip()):
-                    return 1.0
-                text_sim = SequenceMatcher(None, elem1['text'], elem2['text']).ratio()
-                x_sim = 1 - abs(elem1['x0_pct'] - elem2['x0_pct'])
-                y_sim = 1 - abs(elem1['y0_pct'] - elem2['y0_pct'])
-                width_sim = 1 - abs(elem1['width_pct'] - elem2['width_pct'])
-                
-                alignment_sim = 1.0 if (elem1['is_centered'] == elem2['is_centered'] and 
-                                      elem1['is_left_aligned'] == elem2['is_left_aligned'] and 
-                                      elem1['is_right_aligned'] == elem2['is_right_aligned']) else 0.8
-                
-                overall_sim = (text_sim * 0.4 + x_sim * 0.2 + y_sim * 0.2 + 
-                             width_sim * 0.1 + alignment_sim * 0.1)
-                
-                return overall_sim
-            
-            # Step 3: Find header candidates (including those marked by uploaded_by detection)
-            header_candidates = [elem for elem in page_elements if elem['is_header_zone']]
-            
-            # Add any headers marked by uploaded_by detection
-            uploaded_by_headers = [elem for elem in page_elements if elem.get('marked_by_uploaded_by') and elem.get('is_header_zone')]
-            for header_elem in uploaded_by_headers:
-                if header_elem not in header_candidates:
-                    header_candidates.append(header_elem)
-            
-            header_groups = self._group_similar_elements(header_candidates, calculate_similarity, 
-                                                       SIMILARITY_THRESHOLD, total_pages, MIN_OCCURRENCE_RATE)
-            
-            # Step 4: Find footer candidates with adaptive detection
-            footer_candidates = [elem for elem in page_elements if elem['is_footer_zone']]
-            
-            # Add special regex-based detection for "uploaded by" patterns in footer area (only for 'acts' pdf type)
-            uploaded_by_candidates = []
-            if pdf_type == 'acts':
-                self.logger.info("Processing 'uploaded by' patterns for PDF type 'acts'")
-                
-                # Group elements by page for easier processing
-                pages_dict = {}
-                for elem in page_elements:
-                    page_num = elem['page_num']
-                    if page_num not in pages_dict:
-                        pages_dict[page_num] = []
-                    pages_dict[page_num].append(elem)
-                
-                for elem in page_elements:
-                    text_lower = elem['text'].lower().strip()
-                    # Check if text matches "uploaded by" pattern and is in footer area (bottom 50% of page)
-                    if re.search(r'^uploaded\s*by\s*\S*\s*', text_lower) and elem['y0_pct'] <= 0.5:
-                        elem['is_footer_zone'] = True  # Mark as footer zone
-                        uploaded_by_candidates.append(elem)
-                        self.logger.info("Found 'uploaded by' pattern in footer area: page=%d, y=%.3f, text='%s'", 
-                                       elem['page_num'], elem['y0_pct'], elem['text'][:40])
-                        
-                        # Find and mark related textboxes on the same page within threshold areas
-                        page_num = elem['page_num']
-                        if page_num in pages_dict:
-                            self._mark_related_header_footer_textboxes(elem, pages_dict[page_num], uploaded_by_candidates, 
-                                                                     HEADER_ZONE_THRESHOLD, FOOTER_ZONE_THRESHOLD)
-            else:
-                self.logger.debug("Skipping 'uploaded by' pattern detection for PDF type '%s' (only works for 'acts')", pdf_type)
+            # Step 2: Simple similarity calculation, see _header_footer_similarity()
+            calculate_similarity = self._header_footer_similarity
             
-            # Add uploaded by candidates to footer candidates
-            footer_candidates.extend(uploaded_by_candidates)
+            # Step 3: Find header and footer candidates (including those marked by uploaded_by detection)
+            header_candidates, footer_candidates, uploaded_by_candidates = \
+                self._get_header_footer_candidates(page_elements, pdf_type,
+                                                   HEADER_ZONE_THRESHOLD, FOOTER_ZONE_THRESHOLD)
+
+            # the ones the earlier documents of the series had are headers without further ado
+            header_groups, header_candidates = self._get_series_groups('header', header_candidates,
+                                                                       total_pages)
+            header_groups += self._group_similar_elements(header_candidates, calculate_similarity, 
+                                                        SIMILARITY_THRESHOLD, total_pages, MIN_OCCURRENCE_RATE)
             
-            # If no footers found with current logic, try finding elements at actual bottom of pages
+            # Step 4: If no footers found with current logic, try finding elements at actual bottom of pages
+            self.adaptive_bottom_footers = not footer_candidates
             if not footer_candidates:
                 self.logger.info("No footers found with standard detection, trying adaptive approach...")
-                
-                # Group elements by page and find the ones at the bottom of each page
-                pages_dict = {}
-                for elem in page_elements:
-                    page_num = elem['page_num']
-                    if page_num not in pages_dict:
-                        pages_dict[page_num] = []
-                    pages_dict[page_num].append(elem)
-                
-                # For each page, find elements that are actually at the bottom
-                adaptive_footer_candidates = []
-                for page_num, page_elems in pages_dict.items():
-                    if len(page_elems) < 2:
-                        continue
-                    
-                    # Sort by Y coordinate to find bottom elements
-                    sorted_elems = sorted(page_elems, key=lambda e: e['y0_pct'])
-                    
-                    # Take elements from the bottom portion of the page
-                    bottom_threshold = 0.25  # Bottom 25% of elements
-                    num_bottom_elements = max(1, int(len(sorted_elems) * bottom_threshold))
-                    bottom_elements = sorted_elems[:num_bottom_elements]
-                    
-                    # Add these as footer candidates
-                    for elem in bottom_elements:
-                        elem['is_footer_zone'] = True  # Mark as footer zone
-                        adaptive_footer_candidates.append(elem)
-                        self.logger.debug("Adaptive footer candidate: page=%d, y=%.3f, text='%s'", 
-                                        page_num, elem['y0_pct'], elem['text'][:40])
-                
-                footer_candidates.extend(adaptive_footer_candidates)
-                self.logger.info("Found %d adaptive footer candidates", len(adaptive_footer_candidates))
+                footer_candidates.extend(self._get_bottom_footer_candidates(page_elements))
             
             # Group footer candidates, but handle "uploaded by" patterns separately
             regular_footer_candidates = [elem for elem in footer_candidates 
                                        if not re.search(r'^uploaded\s*by\s*\S*\s*', elem['text'].lower().strip())]
-            footer_groups = self._group_similar_elements(regular_footer_candidates, calculate_similarity,
-                                                       SIMILARITY_THRESHOLD, total_pages, MIN_OCCURRENCE_RATE)
+            footer_groups, regular_footer_candidates = self._get_series_groups(
+                'footer', regular_footer_candidates, total_pages)
+            footer_groups += self._group_similar_elements(regular_footer_candidates, calculate_similarity,
+                                                        SIMILARITY_THRESHOLD, total_pages, MIN_OCCURRENCE_RATE)
             
             # Add special groups for "uploaded by" patterns with relaxed criteria
             uploaded_by_groups = self._group_uploaded_by_patterns(uploaded_by_candidates, total_pages)
@@ -1841,6 +1950,7 @@ class Main:
 
             self.logger.info("Adaptive detection complete: %d header groups, %d footer groups",
                            len(self.adaptive_headers), len(self.adaptive_footers))
+            self.learn_header_series()
 
             self._pending_page_elements = page_elements
             self._pending_line_tolerance = LINE_TOLERANCE
@@ -1848,6 +1958,204 @@ class Main:
         except Exception as e:
             self.logger.exception("Error during adaptive header/footer detection: %s", e)
 
+    # --- func to get the header/footer templates of the series the pdf is of ---
+    def get_header_store(self):
+        if self.header_store is not None or not self.header_series:
+            return self.header_store
+
+        series = self.header_series
+        if series == 'auto':
+            # the issues of a series share a page size, and it is known
+            # without the layout of a single page
+            try:
+                rect = self.pdf_session.get_document()[0].rect
+                series = f"{self.pdf_type}-{rect.width:.0f}x{rect.height:.0f}"
+            except Exception as e:
+                self.logger.warning("Could not tell the page size of %s, not using "
+                                    "the header/footer store: %s", self.pdf_path, e)
+                return None
+
+        similarity = self.get_header_footer_thresholds(self.pdf_type)[2]
+        self.header_store = HeaderFooterStore(self.get_path_cache_xml() / "header_footer",
+                                              series, self.pdf_type,
+                                              self._header_footer_similarity, similarity)
+        return self.header_store
+
+    # --- func to group the candidates alike to the headers/footers of the series ---
+    def _get_series_groups(self, kind, candidates, total_pages):
+        """(groups, the other candidates), see HeaderFooterStore.classify();
+        no groups without a series."""
+        store = self.get_header_store()
+        if store is None:
+            return [], candidates
+
+        return store.classify(kind, candidates, total_pages)
+
+    # --- func to add the headers/footers of the document to those of its series, once ---
+    def learn_header_series(self):
+        store = self.get_header_store()
+        if store is None or self.header_store_learned:
+            return
+
+        store.learn(self.adaptive_headers, self.adaptive_footers)
+        self.header_store_learned = True
+
+    # --- func to pick the elements that could be headers and footers ---
+    def _get_header_footer_candidates(self, page_elements, pdf_type, header_zone_threshold,
+                                      footer_zone_threshold):
+        """(header candidates, footer candidates, 'uploaded by' candidates) of
+        page_elements: the ones in the header and footer zones and, for acts,
+        the 'uploaded by' lines in the bottom half of a page together with
+        what _mark_related_header_footer_textboxes() marks along with them.
+        The 'uploaded by' candidates are among the footer candidates too."""
+        header_candidates = [elem for elem in page_elements if elem['is_header_zone']]
+        
+        # Add any headers marked by uploaded_by detection
+        uploaded_by_headers = [elem for elem in page_elements if elem.get('marked_by_uploaded_by') and elem.get('is_header_zone')]
+        for header_elem in uploaded_by_headers:
+            if header_elem not in header_candidates:
+                header_candidates.append(header_elem)
+
+        footer_candidates = [elem for elem in page_elements if elem['is_footer_zone']]
+        
+        # Add special regex-based detection for "uploaded by" patterns in footer area (only for 'acts' pdf type)
+        uploaded_by_candidates = []
+        if pdf_type == 'acts':
+            self.logger.info("Processing 'uploaded by' patterns for PDF type 'acts'")
+            
+            # Group elements by page for easier processing
+            pages_dict = {}
+            for elem in page_elements:
+                page_num = elem['page_num']
+                if page_num not in pages_dict:
+                    pages_dict[page_num] = []
+                pages_dict[page_num].append(elem)
+            
+            for elem in page_elements:
+                text_lower = elem['text'].lower().strip()
+                # Check if text matches "uploaded by" pattern and is in footer area (bottom 50% of page)
+                if re.search(r'^uploaded\s*by\s*\S*\s*', text_lower) and elem['y0_pct'] <= 0.5:
+                    elem['is_footer_zone'] = True  # Mark as footer zone
+                    uploaded_by_candidates.append(elem)
+                    self.logger.info("Found 'uploaded by' pattern in footer area: page=%d, y=%.3f, text='%s'", 
+                                   elem['page_num'], elem['y0_pct'], elem['text'][:40])
+                    
+                    # Find and mark related textboxes on the same page within threshold areas
+                    page_num = elem['page_num']
+                    if page_num in pages_dict:
+                        self._mark_related_header_footer_textboxes(elem, pages_dict[page_num], uploaded_by_candidates, 
+                                                                 header_zone_threshold, footer_zone_threshold)
+        else:
+            self.logger.debug("Skipping 'uploaded by' pattern detection for PDF type '%s' (only works for 'acts')", pdf_type)
+        
+        # Add uploaded by candidates to footer candidates
+        footer_candidates.extend(uploaded_by_candidates)
+
+        return header_candidates, footer_candidates, uploaded_by_candidates
+
+    # --- func to take the elements at the bottom of every page as footer candidates ---
+    def _get_bottom_footer_candidates(self, page_elements):
+        # Group elements by page and find the ones at the bottom of each page
+        pages_dict = {}
+        for elem in page_elements:
+            page_num = elem['page_num']
+            if page_num not in pages_dict:
+                pages_dict[page_num] = []
+            pages_dict[page_num].append(elem)
+        
+        # For each page, find elements that are actually at the bottom
+        adaptive_footer_candidates = []
+        for page_num, page_elems in pages_dict.items():
+            if len(page_elems) < 2:
+                continue
+            
+            # Sort by Y coordinate to find bottom elements
+            sorted_elems = sorted(page_elems, key=lambda e: e['y0_pct'])
+            
+            # Take elements from the bottom portion of the page
+            bottom_threshold = 0.25  # Bottom 25% of elements
+            num_bottom_elements = max(1, int(len(sorted_elems) * bottom_threshold))
+            bottom_elements = sorted_elems[:num_bottom_elements]
+            
+            # Add these as footer candidates
+            for elem in bottom_elements:
+                elem['is_footer_zone'] = True  # Mark as footer zone
+                adaptive_footer_candidates.append(elem)
+                self.logger.debug("Adaptive footer candidate: page=%d, y=%.3f, text='%s'", 
+                                page_num, elem['y0_pct'], elem['text'][:40])
+        
+        self.logger.info("Found %d adaptive footer candidates", len(adaptive_footer_candidates))
+
+        return adaptive_footer_candidates
+
+    def get_header_footer_thresholds(self, pdf_type):
+        # Simple working configuration
+        if pdf_type not in set(['sebi_circulars']):
+            HEADER_ZONE_THRESHOLD = 0.12#0.15    # Top 15% of page height
+            FOOTER_ZONE_THRESHOLD = 0.12#0.15    # Bottom 15% of page height
+            SIMILARITY_THRESHOLD =  0.8       # 80% similarity
+            MIN_OCCURRENCE_RATE =   0.4     # Must appear on at least 40% of pages
+            LINE_TOLERANCE = 0.02           # 2% of page height tolerance for same line detection
+        
+        else:
+            HEADER_ZONE_THRESHOLD = 0.12#0.15    # Top 15% of page height
+            FOOTER_ZONE_THRESHOLD = 0.12#0.15    # Bottom 15% of page height
+            SIMILARITY_THRESHOLD =  0.9       # 80% similarity
+            MIN_OCCURRENCE_RATE =   0.6     # Must appear on at least 40% of pages
+            LINE_TOLERANCE = 0.02 
+
+        return (HEADER_ZONE_THRESHOLD, FOOTER_ZONE_THRESHOLD, SIMILARITY_THRESHOLD,
+                MIN_OCCURRENCE_RATE, LINE_TOLERANCE)
+
+    # --- func to get the unlabelled textboxes of a page with normalized coordinates ---
+    def get_header_footer_elements(self, page_num, page_obj, header_zone_threshold,
+                                   footer_zone_threshold):
+        page_elements = []
+
+        for tb, label in page_obj.all_tbs.items():
+            try:
+                if label is not None:
+                    continue
+                text = tb.extract_text_from_tb().strip()
+                if not text or text.isspace():
+                    continue
+                    
+                # Normalize coordinates as percentages of page dimensions
+                x0_pct = tb.coords[0] / page_obj.pg_width
+                y0_pct = tb.coords[1] / page_obj.pg_height
+                x1_pct = tb.coords[2] / page_obj.pg_width
+                y1_pct = tb.coords[3] / page_obj.pg_height
+                
+                width_pct = x1_pct - x0_pct
+                height_pct = y1_pct - y0_pct
+                
+                # Calculate relative position zones
+                is_header_zone = y0_pct >= (1 - header_zone_threshold)
+                is_footer_zone = y0_pct <= footer_zone_threshold
+                
+                page_elements.append({
+                    'page_num': page_num,
+                    'text': text,
+                    'textbox': tb,
+                    'x0_pct': x0_pct,
+                    'y0_pct': y0_pct,
+                    'x1_pct': x1_pct,
+                    'y1_pct': y1_pct,
+                    'width_pct': width_pct,
+                    'height_pct': height_pct,
+                    'is_header_zone': is_header_zone,
+                    'is_footer_zone': is_footer_zone,
+                    'is_centered': abs(x0_pct + width_pct/2 - 0.5) < 0.1,
+                    'is_left_aligned': x0_pct < 0.1,
+                    'is_right_aligned': x1_pct > 0.9
+                })
+                
+            except Exception as e:
+                self.logger.warning("Error processing textbox on page %d: %s", page_num, e)
+                continue
+
+        return page_elements
+
     def finalize_adaptive_header_footer_detection(self):
         page_elements = getattr(self, '_pending_page_elements', None)
         line_tolerance = getattr(self, '_pending_line_tolerance', 0.02)
@@ -2059,6 +2367,15 @@ class Main:
                     self.logger.info("Single-page footer candidate: y=%.3f, text='%s'", 
                                    elem['y0_pct'], elem['text'][:40])
             
+            # Elements in the zones that the earlier documents of the series had as headers/footers
+            for kind, candidates in (('header', header_candidates), ('footer', footer_candidates)):
+                zone_elements = [elem for elem in page_elements
+                                 if elem['is_%s_zone' % kind] and elem not in candidates]
+                for group in self._get_series_groups(kind, zone_elements, 1)[0]:
+                    candidates.extend(group['elements'])
+                    self.logger.info("Single-page %s candidates of the series: %s", kind,
+                                   [elem['text'][:40] for elem in group['elements']])
+            
             # Handle special "uploaded by" patterns for acts PDFs (only if in appropriate zones)
             if pdf_type == 'acts':
                 for elem in page_elements:
@@ -2150,11 +2467,114 @@ class Main:
         except Exception as e:
             self.logger.exception("Error marking related textboxes for 'uploaded by' pattern: %s", e)
     
+    # --- weights of what _header_footer_similarity() makes of two elements ---
+    SIMILARITY_TEXT_WEIGHT = 0.4
+    SIMILARITY_POSITION_WEIGHTS = (0.2, 0.2, 0.1, 0.1) # x, y, width, alignment
+
+    # --- func to tell how alike two header/footer candidates are ---
+    def _header_footer_similarity(self, elem1, elem2, threshold=None, matcher=None):
+        """The weighted similarity of the text, position, width and alignment
+        of two elements, page numbers always being alike.
+
+        Given a threshold, a pair that cannot reach it is told apart without
+        running SequenceMatcher.ratio(), the one expensive part: what the
+        position and alignment add is known up front, so it is known how alike
+        the texts would have to be, and the length of the texts and then
+        real_quick_ratio()/quick_ratio() (bounds on ratio() from above) tell
+        most pairs that are not apart. Such a pair gets 0.0, the same verdict
+        against the threshold that its full similarity would have got.
+
+        A SequenceMatcher already set to elem2's text can be passed in as
+        matcher, which saves indexing that text again for every elem1 it is
+        compared with.
+        """
+        if re.fullmatch(r'\d+', elem1['text'].strip()) and re.fullmatch(r'\d+', elem2['text'].strip()):
+            return 1.0
+        x_sim = 1 - abs(elem1['x0_pct'] - elem2['x0_pct'])
+        y_sim = 1 - abs(elem1['y0_pct'] - elem2['y0_pct'])
+        width_sim = 1 - abs(elem1['width_pct'] - elem2['width_pct'])
+        
+        alignment_sim = 1.0 if (elem1['is_centered'] == elem2['is_centered'] and 
+                              elem1['is_left_aligned'] == elem2['is_left_aligned'] and 
+                              elem1['is_right_aligned'] == elem2['is_right_aligned']) else 0.8
+
+        if matcher is None:
+            matcher = SequenceMatcher(None, elem1['text'], elem2['text'])
+        else:
+            matcher.set_seq1(elem1['text'])
+
+        if threshold is not None:
+            x_weight, y_weight, width_weight, alignment_weight = self.SIMILARITY_POSITION_WEIGHTS
+            position_sim = (x_sim * x_weight + y_sim * y_weight +
+                            width_sim * width_weight + alignment_sim * alignment_weight)
+            # the margin keeps a pair whose similarity is rounded onto the
+            # threshold from being told apart by a bound rounded the other way
+            needed = (threshold - position_sim) / self.SIMILARITY_TEXT_WEIGHT - 1e-9
+            if needed > 1 or (needed > 0 and (
+                    matcher.real_quick_ratio() < needed or matcher.quick_ratio() < needed)):
+                return 0.0
+
+        text_sim = matcher.ratio()
+        
+        overall_sim = (text_sim * 0.4 + x_sim * 0.2 + y_sim * 0.2 + 
+                     width_sim * 0.1 + alignment_sim * 0.1)
+        
+        return overall_sim
+
+    # --- func to index header/footer candidates by what could make them alike ---
+    def _get_similarity_blocks(self, candidates, threshold):
+        """For every candidate, the positions of the candidates after it that
+        _header_footer_similarity() can put at threshold or above, in order.
+
+        With every term but the text at its best, two elements are still
+        told apart by their distance in y beyond what the y weight allows,
+        and by texts so different in length that ratio() cannot reach what is
+        left for it. Candidates are sorted on both, so that only the ones in
+        the band of each are looked at. Page numbers are alike wherever they
+        are, and are all in one block of their own.
+        """
+        count = len(candidates)
+        x_weight, y_weight, width_weight, alignment_weight = self.SIMILARITY_POSITION_WEIGHTS
+        best_position_sim = x_weight + y_weight + width_weight + alignment_weight
+
+        max_dy = (1 - threshold) / y_weight + 1e-9
+        min_text_sim = (threshold - best_position_sim) / self.SIMILARITY_TEXT_WEIGHT - 1e-9
+        # ratio() is at most 2 * shorter / (shorter + longer)
+        min_len_ratio = min_text_sim / (2 - min_text_sim) if min_text_sim > 0 else 0.0
+
+        is_number = [bool(re.fullmatch(r'\d+', elem['text'].strip())) for elem in candidates]
+        numbers = [idx for idx in range(count) if is_number[idx]]
+
+        by_length = sorted(range(count), key=lambda idx: len(candidates[idx]['text']))
+        lengths = [len(candidates[idx]['text']) for idx in by_length]
+
+        blocks = []
+        for idx, elem in enumerate(candidates):
+            length = len(elem['text'])
+            if min_len_ratio > 0:
+                lo = bisect.bisect_left(lengths, length * min_len_ratio - 1e-9)
+                hi = bisect.bisect_right(lengths, length / min_len_ratio + 1e-9)
+            else:
+                lo, hi = 0, count
+
+            block = {
+                other for other in by_length[lo:hi]
+                if other > idx and abs(candidates[other]['y0_pct'] - elem['y0_pct']) <= max_dy
+            }
+            if is_number[idx]:
+                block.update(other for other in numbers if other > idx)
+
+            blocks.append(sorted(block))
+
+        return blocks
+
     def _group_similar_elements(self, candidates, similarity_func, threshold, total_pages, min_occurrence_rate):
         groups = []
         used_elements = set()
+        blocks = self._get_similarity_blocks(candidates, threshold)
+        matchers = {}
 
-        for candidate in candidates:
+        for idx, candidate in enumerate(candidates):
             if id(candidate) in used_elements:
                 continue
                 
@@ -2162,11 +2582,18 @@ class Main:
             similar_elements = [candidate]
             used_elements.add(id(candidate))
             
-            for other in candidates:
+            # the ones before it were all grouped already, or it would have
+            # been grouped with them
+            for other_idx in blocks[idx]:
+                other = candidates[other_idx]
                 if id(other) in used_elements:
                     continue
                     
-                if similarity_func(candidate, other) >= threshold:
+                matcher = matchers.get(other_idx)
+                if matcher is None:
+                    matcher = matchers[other_idx] = SequenceMatcher(None, '', other['text'])
+
+                if similarity_func(candidate, other, threshold, matcher) >= threshold:
                     similar_elements.append(other)
                     used_elements.add(id(other))
             
@@ -2327,16 +2754,26 @@ class Main:
     def process_scanned_copy(self, pdf_type, base_name_of_file, start_page,
                              end_page):
         if pdf_type in {'egazette', 'acts', 'sebi_circulars'}:
-            pages = ChromeLensParserTool(self.pdf_path)\
+            pages = ChromeLensParserTool(self.pdf_path, self.pdf_session,
+                                         concurrency=self.lens_concurrency,
+                                         allow_partial=self.lens_partial)\
                                 .build_xml(start_page, end_page)
         else:
-            pages = TesseractParserTool(self.pdf_path, self.ocr_language)\
+            pages = TesseractParserTool(self.pdf_path, self.ocr_language,
+                                        self.pdf_session,
+                                        workers=self.page_workers,
+                                        engine=self.ocr_engine)\
                                             .build_xml(start_page, end_page)
         self.print_page_xml(pages)
         self.set_htmlbuilder()
         self.logger.debug("Extracting header and footer info...")
         self.get_page_header_footer(pages, base_name_of_file, self.output_dir)
         self.logger.debug("Processing content from pages...")
+        self.process_pdf_pages(pdf_type)
+        self.logger.info("Finished Processing of pages for: %s", self.pdf_path)
+
+    # --- func to classify the textboxes of all_pgs the way the pdf type needs ---
+    def process_pdf_pages(self, pdf_type):
         if pdf_type == 'acts':
             self.process_pages_acts(pdf_type)
         elif pdf_type == 'sebi_circulars':
@@ -2347,7 +2784,6 @@ class Main:
             self.process_pages_judgments(pdf_type)
         else:
             self.process_pages(pdf_type)
-        self.logger.info("Finished Processing of pages for: %s", self.pdf_path)
     
     # --- parse pdf using pdfminer to convert to XML ---       
     def parsePDF(self, pdf_type, char_margin, word_margin, line_margin, \
@@ -2391,49 +2827,30 @@ class Main:
                                           end_page)
                 return True
             
-            cache_xml_path = self.get_path_cache_xml()
-            self.xml_path =  cache_xml_path / f"{base_name_of_file}.xml"
-            self.logger.debug("Converting PDF to XML...")
-            self.parserTool.convert_to_xml(self.pdf_path,self.xml_path, self.pdf_type, \
-                                           char_margin, word_margin, line_margin)
-
-            
-            if not os.path.exists(self.xml_path):
-                self.logger.error("XML file was not created: %s", self.xml_path)
-                return False
-
-            self.logger.debug("Parsing pages from XML: %s", self.xml_path)
-            pages = self.parserTool.get_pages_from_xml(self.xml_path, start_page, end_page)
-            if pages:
-                self.logger.debug("Removing spaces overprinted by the next glyph...")
-                self.drop_overlapping_spaces(pages)
-                self.logger.debug("Detecting what the fonts that name no encoding draw...")
-                self.detect_unknown_fonts(pages)
-                self.logger.debug("Converting text in legacy indic fonts to unicode...")
-                self.convert_indic_fonts(pages)
-                self.set_htmlbuilder()
-                self.logger.debug("Extracting header and footer info...")
-                self.get_page_header_footer(pages, base_name_of_file, self.output_dir)
-                self.logger.debug("Processing content from pages...")
-                if pdf_type == 'acts':
-                    self.process_pages_acts(pdf_type)
-                elif pdf_type == 'sebi_circulars':
-                    self.process_pages_sebi_circulars(pdf_type)
-                elif pdf_type == 'sebi':
-                    self.process_pages_sebi(pdf_type)
-                elif pdf_type == 'judgments':
-                    self.process_pages_judgments(pdf_type)
-                else:
-                    self.process_pages(pdf_type)
-                self.logger.info("Finished Processing of pages for: %s", self.pdf_path)
+            if self.xml_engine == 'pdf2txt':
+                pages = self.get_pages_from_pdf2txt(base_name_of_file,
+                                                    char_margin, word_margin,
+                                                    line_margin, start_page,
+                                                    end_page)
+                if pages is False:
+                    return False
+                self.process_text_pages(pages, pdf_type, base_name_of_file,
+                                        start_page, end_page)
+            elif self.stream_window > 0:
+                self.stream_pages(pdf_type, base_name_of_file, char_margin,
+                                  word_margin, line_margin, start_page, end_page)
             else:
-                # if pdf_type in {'egazette'}:
-                #     self.logger.info('using chrome lens for the scanned copy')
-                #     self.html_builder = HTMLBuilderChromeLens(self.pdf_path)
-                # else:
-                    self.is_scanned_copy = True
-                    self.process_scanned_copy(pdf_type, base_name_of_file,
-                                              start_page, end_page)
+                self.logger.debug("Analysing the layout of the PDF pages...")
+                pages = self.parserTool.get_pages_from_pdf(self.pdf_session,
+                                                           self.pdf_type,
+                                                           char_margin,
+                                                           word_margin,
+                                                           line_margin,
+                                                           start_page, end_page,
+                                                           self.layout_cache,
+                                                           self.page_workers)
+                self.process_text_pages(pages, pdf_type, base_name_of_file,
+                                        start_page, end_page)
 
             if pdf_type in {'egazette', 'sebi'}:
                 self.write_manifest()
@@ -2443,6 +2860,370 @@ class Main:
             self.logger.exception("Exception occurred while parsing PDF: %s", e)
             return False
 
+    # --- func to classify the pages of a text pdf, or OCR it if it has no text ---
+    def process_text_pages(self, pages, pdf_type, base_name_of_file, start_page,
+                           end_page):
+        if pages:
+            self.logger.debug("Removing spaces overprinted by the next glyph...")
+            self.drop_overlapping_spaces(pages)
+            self.logger.debug("Detecting what the fonts that name no encoding draw...")
+            self.detect_unknown_fonts(pages)
+            self.logger.debug("Converting text in legacy indic fonts to unicode...")
+            self.convert_indic_fonts(pages)
+            self.set_htmlbuilder()
+            self.logger.debug("Extracting header and footer info...")
+            self.get_page_header_footer(pages, base_name_of_file, self.output_dir)
+            self.logger.debug("Processing content from pages...")
+            self.process_pdf_pages(pdf_type)
+            self.logger.info("Finished Processing of pages for: %s", self.pdf_path)
+        else:
+            # if pdf_type in {'egazette'}:
+            #     self.logger.info('using chrome lens for the scanned copy')
+            #     self.html_builder = HTMLBuilderChromeLens(self.pdf_path)
+            # else:
+                self.is_scanned_copy = True
+                self.process_scanned_copy(pdf_type, base_name_of_file,
+                                          start_page, end_page)
+
+    # --- func to classify and build the pages a window at a time ---
+    def stream_pages(self, pdf_type, base_name_of_file, char_margin, word_margin,
+                     line_margin, start_page, end_page):
+        """process_text_pages() for a document too big to hold whole.
+
+        Every page of a document is held from the moment its xml is parsed
+        until its html is built: its xml, its Page, and through them every
+        textbox, image and table of it. For a gazette of a thousand pages that
+        is most of the memory a run takes, and it grows with the page count.
+        Here no more than two windows of stream_window pages are held at once.
+
+        What does need the whole document is the header/footer statistics
+        (a header is a header because it is on most pages) and the fonts left
+        unidentified. So the pages are laid out into the layout cache first -
+        a temporary one if the cache is off - and read from it page by page,
+        three times: to detect the unknown fonts, to gather the textbox
+        positions the header/footer groups are made of from a PageOutline of
+        each page, and once more, in windows, to be made Pages, labelled with
+        the groups that fall on them, classified and built. A window is built
+        only once the next one is labelled, since a footnote continued on the
+        next page and an image found again there are only known then.
+
+        A document that fits in one window is processed whole, as before. A
+        streamed one differs only where a decision would need pages that are
+        gone: an image is dropped as a duplicate only if none of its pages
+        is built yet, a footnote continued past the window after its own is
+        not added to it, and a table of contents is looked for in the first
+        window only. The header/footer statistics include the tables, which
+        are not looked for until the pages are made; a table textbox grouped
+        as a header is dropped from the group again on its page.
+
+        With header_sample, the header/footer groups are learned from a
+        sample of the pages only and the pages are laid out as their window
+        is reached rather than all up front, so that the first windows are
+        written out before the last pages are even analysed - unless the
+        unknown fonts are to be detected, which reads every page first. See
+        HeaderFooterTemplates.
+        """
+        cache = self.layout_cache
+        tmp_dir = None
+        if cache is None:
+            tmp_dir = tempfile.mkdtemp(prefix="stream-", dir=self.get_path_cache_xml())
+            cache = LayoutCache(tmp_dir, float('inf'))
+
+        try:
+            self.logger.debug("Analysing the layout of the PDF pages...")
+            stream = self.parserTool.cache_pages_from_pdf(self.pdf_session,
+                                                          self.pdf_type,
+                                                          char_margin,
+                                                          word_margin,
+                                                          line_margin,
+                                                          start_page, end_page,
+                                                          cache,
+                                                          self.page_workers,
+                                                          lazy=self.header_sample > 0)
+            if stream is None or len(stream[2]) <= self.stream_window:
+                if stream is None:
+                    pages = self.parserTool.get_pages_from_pdf(
+                        self.pdf_session, self.pdf_type, char_margin,
+                        word_margin, line_margin, start_page, end_page, None,
+                        self.page_workers)
+                else:
+                    self.parserTool.cache_pages(self.pdf_session, cache, *stream,
+                                                self.page_workers)
+                    pages = self.parserTool.select_pages(
+                        list(self.parserTool.iter_cached_pages(self.pdf_session,
+                                                               cache, *stream)),
+                        start_page, end_page, self.pdf_session.pdf_path)
+                self.process_text_pages(pages, pdf_type, base_name_of_file,
+                                        start_page, end_page)
+                return
+
+            self.stream_source = (cache, stream)
+
+            self.logger.debug("Detecting what the fonts that name no encoding draw...")
+            self.detect_unknown_fonts(self.read_stream_pages(cache, stream))
+
+            page_count = len(stream[2])
+            sample = None
+            if self.header_sample > 0:
+                sample = HeaderFooterTemplates.get_sample(page_count, self.header_sample)
+                self.logger.debug("Gathering the header and footer statistics of %d "
+                                  "sample pages...", len(sample))
+                page_elements, text_pages = self.get_stream_header_footer_elements(
+                    self.read_stream_pages(cache, stream,
+                                           [stream[2][pos - 1] for pos in sample]),
+                    pdf_type, sample)
+                if self.parserTool.is_scanned_count(text_pages, len(sample)):
+                    self.process_text_pages(None, pdf_type, base_name_of_file,
+                                            start_page, end_page)
+                    return
+            else:
+                self.logger.debug("Gathering the header and footer statistics...")
+                page_elements, text_pages = self.get_stream_header_footer_elements(
+                    self.read_stream_pages(cache, stream), pdf_type)
+                if self.parserTool.is_scanned_count(text_pages, page_count):
+                    self.process_text_pages(None, pdf_type, base_name_of_file,
+                                            start_page, end_page)
+                    return
+
+            self.set_htmlbuilder()
+            self.adaptive_header_footer_detection(sample or stream[2], pdf_type,
+                                                  page_elements)
+            self.stream_headers = self.adaptive_headers
+            self.stream_footers = self.adaptive_footers
+            if sample:
+                _, _, similarity, min_occurrence_rate, _ = \
+                    self.get_header_footer_thresholds(pdf_type)
+                self.header_templates = HeaderFooterTemplates(
+                    self.adaptive_headers, self.adaptive_footers, len(sample),
+                    self._header_footer_similarity, self._group_similar_elements,
+                    similarity, min_occurrence_rate, self.adaptive_bottom_footers)
+            self.is_streamed = True
+
+            self.logger.debug("Processing content from pages...")
+            labelled = None
+            window_pages = []
+            for pg in self.read_stream_pages(cache, stream):
+                self.convert_indic_fonts([pg])
+                window_pages.append(pg)
+
+                if len(window_pages) == self.stream_window:
+                    window = self.add_window(window_pages, base_name_of_file,
+                                             labelled is None)
+                    if labelled:
+                        self.emit_window(labelled, pdf_type)
+                    labelled = window
+                    window_pages = []
+
+            window = {}
+            if window_pages:
+                window = self.add_window(window_pages, base_name_of_file,
+                                         labelled is None)
+            for pages in (labelled, window):
+                if pages:
+                    self.emit_window(pages, pdf_type)
+
+            self.all_pgs = {}
+            if not self.unique_images:
+                self.remove_empty_manifest_dir(base_name_of_file, self.output_dir)
+            if self.header_sample > 0:
+                # the pages were laid out as they were read
+                self.parserTool.warn_illegal_chars(self.pdf_session.pdf_path)
+            self.logger.info("Finished Processing of pages for: %s", self.pdf_path)
+        finally:
+            self.stream_source = None
+            self.header_templates = None
+            if tmp_dir:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    # --- func to read streamed pages from the layout cache, laying out the missing ones ---
+    def read_stream_pages(self, cache, stream, page_nums=None):
+        """The pages page_nums - all of the stream by default - in order, as
+        drop_overlapping_spaces() leaves them. A run of pages not laid out yet
+        is laid out a window at a time, in page_workers processes."""
+        laparams, key, all_page_nums = stream
+        if page_nums is None:
+            page_nums = all_page_nums
+
+        for i in range(0, len(page_nums), self.stream_window):
+            run = page_nums[i:i + self.stream_window]
+            self.parserTool.cache_pages(self.pdf_session, cache, laparams, key, run,
+                                        self.page_workers)
+            for pg in self.parserTool.iter_cached_pages(self.pdf_session, cache,
+                                                        laparams, key, run):
+                self.drop_overlapping_spaces([pg])
+                yield pg
+
+    # --- func to get the header/footer elements of streamed pages, by textbox key ---
+    def get_stream_header_footer_elements(self, pages, pdf_type, page_nums=None):
+        """The elements adaptive_header_footer_detection() groups, for every
+        page, with the textbox of each replaced by its get_textbox_keys() key
+        so that nothing of the page is held once its elements are; and the
+        number of pages with text, for ParserTool.is_scanned_count(). The
+        pages are numbered from 1, or by page_nums for a sample of them."""
+        header_zone, footer_zone = self.get_header_footer_thresholds(pdf_type)[:2]
+
+        if page_nums is None:
+            page_nums = itertools.count(1)
+
+        page_elements = []
+        text_pages = 0
+        for page_num, pg in zip(page_nums, pages):
+            self.convert_indic_fonts([pg])
+            if self.parserTool.has_text(pg):
+                text_pages += 1
+
+            outline = PageOutline(pg, self.pdf_type, self.fontmapper)
+            outline.process_textboxes()
+            keys = self.get_textbox_keys(pg)
+            for elem in self.get_header_footer_elements(page_num, outline,
+                                                        header_zone, footer_zone):
+                elem['textbox'] = keys[id(elem['textbox'].tbox)]
+                page_elements.append(elem)
+
+        return page_elements, text_pages
+
+    # --- func to key the textboxes of a <page> by their position in it ---
+    def get_textbox_keys(self, pg):
+        return {id(tbox): i for i, tbox in enumerate(pg.iter('textbox'))}
+
+    # --- func to make and label the Pages of a window of streamed pages ---
+    def add_window(self, pages, base_name_of_file, find_toc):
+        """The Pages of pages, {page num: Page}, labelled by label_pages()
+        with the header/footer groups made of the whole document narrowed
+        down to them and their textbox keys resolved to the textboxes of the
+        Pages - or, with header_sample, with the groups their candidates make
+        by the templates of the sample."""
+        header_zone, footer_zone, _, _, line_tolerance = \
+            self.get_header_footer_thresholds(self.pdf_type)
+
+        window = {}
+        self.all_pgs = window
+        self.prefetch_tables(pages)
+        for pg in pages:
+            self.add_page(pg, base_name_of_file, self.output_dir)
+
+        page_elements = []
+        textboxes = {}
+        for page_num, page in window.items():
+            keys = self.get_textbox_keys(page.page_in_xml)
+            for elem in self.get_header_footer_elements(page_num, page,
+                                                        header_zone, footer_zone):
+                textboxes[(page_num, keys[id(elem['textbox'].tbox)])] = elem['textbox']
+                page_elements.append(elem)
+
+        def in_window(groups):
+            window_groups = []
+            for group in groups:
+                elements = [
+                    dict(elem, textbox=textboxes[(elem['page_num'], elem['textbox'])])
+                    for elem in group['elements']
+                    if (elem['page_num'], elem['textbox']) in textboxes
+                ]
+                window_groups.append(dict(group, elements=elements))
+            return window_groups
+
+        groups = None
+        if self.header_templates is not None:
+            groups = self.classify_window_header_footer(page_elements, list(window))
+        if groups is None:
+            groups = in_window(self.stream_headers), in_window(self.stream_footers)
+        self.adaptive_headers, self.adaptive_footers = groups
+        self._pending_page_elements = page_elements
+        self._pending_line_tolerance = line_tolerance
+
+        self.label_pages(pages, base_name_of_file, self.output_dir, find_toc)
+
+        return window
+
+    # --- func to group the header/footer candidates of a window by the templates ---
+    def classify_window_header_footer(self, page_elements, page_nums):
+        """(header groups, footer groups) of the pages page_nums of a window
+        from the HeaderFooterTemplates of the sample, the 'uploaded by' ones
+        of acts being found on the window itself. None once the pages read so
+        far no longer agree with the templates, the groups of the whole
+        document having been made instead (rescan_stream_header_footer())."""
+        header_zone, footer_zone = self.get_header_footer_thresholds(self.pdf_type)[:2]
+
+        header_candidates, footer_candidates, uploaded_by_candidates = \
+            self._get_header_footer_candidates(page_elements, self.pdf_type,
+                                               header_zone, footer_zone)
+        if self.header_templates.bottom_footers and not footer_candidates:
+            footer_candidates.extend(self._get_bottom_footer_candidates(page_elements))
+        regular_footer_candidates = [elem for elem in footer_candidates 
+                                   if not re.search(r'^uploaded\s*by\s*\S*\s*', elem['text'].lower().strip())]
+
+        header_groups, footer_groups = self.header_templates.classify(
+            header_candidates, regular_footer_candidates, page_nums)
+        if not self.header_templates.is_confident():
+            self.rescan_stream_header_footer()
+            return None
+
+        footer_groups.extend(self._group_uploaded_by_patterns(uploaded_by_candidates,
+                                                              len(page_nums)))
+
+        return header_groups, footer_groups
+
+    # --- func to group the headers/footers of every page of a streamed document after all ---
+    def rescan_stream_header_footer(self):
+        self.logger.info("The header/footer templates no longer fit, gathering the "
+                         "header and footer statistics of every page")
+        self.header_templates = None
+
+        cache, stream = self.stream_source
+        page_elements, _ = self.get_stream_header_footer_elements(
+            self.read_stream_pages(cache, stream), self.pdf_type)
+        self.adaptive_header_footer_detection(stream[2], self.pdf_type, page_elements)
+        self.stream_headers = self.adaptive_headers
+        self.stream_footers = self.adaptive_footers
+
+    # --- func to classify, build and let go of a window of streamed pages ---
+    def emit_window(self, window, pdf_type):
+        self.all_pgs = window
+        self.process_pdf_pages(pdf_type)
+
+        for page in window.values():
+            self.logger.info(f"HTML build starts for page num-{page.pg_num}")
+            self.html_builder.build(page, self.has_side_notes)
+            self.emitted_pages.add(page.pg_num)
+            self.pdf_session.release_page(page.pg_num)
+            self.pdf_session.release_tables(page.pg_num)
+
+        window.clear()
+        self.all_pgs = {}
+
+    # --- func to get the pages from the xml pdf2txt.py writes ---
+    def get_pages_from_pdf2txt(self, base_name_of_file, char_margin,
+                               word_margin, line_margin, start_page, end_page):
+        cache_xml_path = self.get_path_cache_xml()
+        # named after what is in the pdf and the margins as well, so that two
+        # pdfs of one name do not share an xml, and one kept with -x is read
+        # again by the next run rather than made again
+        laparams = self.parserTool.get_laparams(self.pdf_type, char_margin,
+                                                word_margin, line_margin)
+        key = LayoutCache.get_key(LayoutCache.get_key_fields(self.pdf_path,
+                                                             laparams))
+        self.xml_path =  cache_xml_path / f"{base_name_of_file}-{key[:16]}.xml"
+
+        if os.path.exists(self.xml_path):
+            try:
+                self.logger.debug("Parsing pages from XML kept before: %s", self.xml_path)
+                return self.parserTool.get_pages_from_xml(self.xml_path, start_page, end_page)
+            except ET.ParseError:
+                self.logger.warning("XML kept before is not valid, making it again: %s",
+                                    self.xml_path)
+
+        self.logger.debug("Converting PDF to XML...")
+        self.parserTool.convert_to_xml(self.pdf_path,self.xml_path, self.pdf_type, \
+                                       char_margin, word_margin, line_margin)
+
+        
+        if not os.path.exists(self.xml_path):
+            self.logger.error("XML file was not created: %s", self.xml_path)
+            return False
+
+        self.logger.debug("Parsing pages from XML: %s", self.xml_path)
+        return self.parserTool.get_pages_from_xml(self.xml_path, start_page, end_page)
+
     def print_page_xml(self, pages):
         import xml.etree.ElementTree as ET
         from xml.dom import minidom
@@ -2635,7 +3416,7 @@ class Main:
             self.logger.exception("Failed to write  content: %s", e)
     
     def clear_xml_cache(self):
-        if self.is_scanned_copy:
+        if self.is_scanned_copy or self.xml_engine != 'pdf2txt':
             return
         if not hasattr(self, "xml_path") or not self.xml_path:
             self.logger.warning("No xml_path attribute set for this instance")
@@ -2659,6 +3440,8 @@ class Main:
         return cache_xml_dir
 
     def clear_cache_pdf(self):
+        # the session holds the cached copy open, and is done with by now
+        self.pdf_session.close()
         cache_dir = self.get_path_cache_pdf()
         if not os.path.exists(self.pdf_path):
             self.logger.warning("File was not created or already deleted: %s", self.pdf_path)
@@ -2672,30 +3455,23 @@ class Main:
             else:
                 self.logger.debug("Skipping delete, file not in cache_pdf: %s", self.pdf_path)
 
+    def close_indic_cache(self):
+        if self.indic_cache is not None:
+            self.indic_cache.close()
+
     def clear_ocr_engines(self):
         if self.ocr_engine == "paddleocr":
             clear_paddle_ocr_engines()
             self.logger.info("Released paddleocr model(s) held by this run")
+        elif self.ocr_engine == "tesserocr":
+            clear_tesserocr_apis()
 
 
     def detect_header_pre(self, pages):
 
-        def parse_bbox(elem):
-            try:
-                return tuple(map(float, elem.attrib["bbox"].split(",")))
-            except:
-                return None
-
         def norm(txt):
             return re.sub(r"[\s_]+", " ", txt or "").strip()
 
-        def tl_text(tl):
-            vals = []
-            for t in tl.findall(".//text"):
-                if t.text:
-                    vals.append(t.text)
-            return norm("".join(vals))
-
         def spaced(word):
             chars = []
             for ch in word:
@@ -3120,27 +3896,20 @@ class Main:
 
         rows = []
 
-        for pg_idx, pg in enumerate(pages):
-
-            page_num = pg_idx + 1
-
-            if page_num not in self.all_pgs:
-                continue
-
-            page_obj = self.all_pgs[page_num]
+        for page_num, page_obj in self.all_pgs.items():
 
             for tb, label in page_obj.all_tbs.items():
 
                 if label is not None:
                     continue
 
-                for tl in tb.tbox.findall(".//textline"):
+                for tl in tb.chars.get_line_range(tb.box):
 
-                    bb = parse_bbox(tl)
+                    bb = tb.chars.get_line_bbox(tl)
                     if not bb:
                         continue
 
-                    txt = tl_text(tl)
+                    txt = norm(tb.chars.get_line_text(tl))
                     if not txt:
                         continue
 
@@ -3264,11 +4033,7 @@ class Main:
         )
 
         rows = []
-        for pg_idx, pg in enumerate(pages):
-            page_num = pg_idx + 1
-            if page_num not in self.all_pgs:
-                continue
-            page_obj = self.all_pgs[page_num]
+        for page_num, page_obj in self.all_pgs.items():
             for tb, label in page_obj.all_tbs.items():
                 if label is not None:
                     continue
@@ -3338,11 +4103,7 @@ class Main:
             return None
 
         rows = []
-        for pg_idx, pg in enumerate(pages):
-            page_num = pg_idx + 1
-            if page_num not in self.all_pgs:
-                continue
-            page_obj = self.all_pgs[page_num]
+        for page_num, page_obj in self.all_pgs.items():
             for tb, label in page_obj.all_tbs.items():
                 if label is not None:
                     continue
@@ -3508,7 +4269,63 @@ def get_arg_parser():
     parser.add_argument('-o','--output-directory',dest = "output_dir",action="store",\
                         required=True,help = "Directory to store output file")
     parser.add_argument('-x','--keep-xml',dest="keep_xml",action = "store_true",\
-                        required = False, default = False, help = "saves the intermediate xml in cache_xml folder")
+                        required = False, default = False, help = "saves the intermediate xml in cache_xml folder (implies -xe pdf2txt)")
+    parser.add_argument('-lcs', '--layout-cache-size', dest='layout_cache_size', action='store', \
+                        type=int, required=False, default=LayoutCache.DEFAULT_MAX_MB, metavar='MB',
+                        help='size cap in MB of the cache of page xml in cache_xml/layout, which is keyed by '
+                             'the content of the pdf, the margins and the pdfminer version so that a pdf '
+                             'converted before is not analysed again (default: '
+                             f'{LayoutCache.DEFAULT_MAX_MB}). The least recently used pdfs are evicted '
+                             'beyond it; 0 turns the cache off.')
+    parser.add_argument('-ics', '--indic-cache-size', dest='indic_cache_size', action='store', \
+                        type=int, required=False, default=IndicTextCache.DEFAULT_MAX_ENTRIES, metavar='N',
+                        help='number of runs of text in legacy indic fonts whose unicode is kept in '
+                             'cache_xml/indic_text.sqlite, shared by the documents and the processes '
+                             'converting them, so that the boilerplate of a gazette is converted once '
+                             f'(default: {IndicTextCache.DEFAULT_MAX_ENTRIES}). The least recently used are dropped '
+                             'beyond it; 0 turns the cache off.')
+    parser.add_argument('-pw', '--page-workers', dest='page_workers', action='store', \
+                        type=int, required=False, default=1, metavar='N',
+                        help='number of processes the layout of the pages is analysed in, each taking '
+                             'runs of consecutive pages, that camelot looks for ruled tables in and that '
+                             'tesseract reads scanned pages in (default: 1, i.e. in this process). 0 uses '
+                             'one per CPU. The pages are the '
+                             'same whatever the number; the layout analysis is only done in processes '
+                             'with -xe pdfminer.')
+    parser.add_argument('-sw', '--stream-window', dest='stream_window', action='store', \
+                        type=int, required=False, default=0, metavar='N',
+                        help='classify and write out the pages N at a time instead of holding the whole '
+                             'document, for large pdfs (default: 0, i.e. the whole document at once). '
+                             'Header/footer detection still sees every page; duplicate images, footnotes '
+                             'continued across pages and the table of contents are resolved within about '
+                             'two windows. Only -xe pdfminer uses it.')
+    parser.add_argument('-hs', '--header-sample', dest='header_sample', action='store', \
+                        type=int, required=False, default=0, metavar='N',
+                        help='with -sw, learn the headers and footers from the first N pages and about '
+                             'N more spread over the rest instead of from every page, and classify the '
+                             'other pages against them as they are read, so that the first pages are '
+                             'written out before the last ones are laid out (default: 0, i.e. from '
+                             'every page). The whole document is looked at after all if the later '
+                             'pages stop agreeing with the sample.')
+    parser.add_argument('-hfs', '--header-footer-series', dest='header_series', action='store', \
+                        required=False, default=None, metavar='SERIES',
+                        help='name of the publication series the pdf is of (e.g. a state\'s extraordinary '
+                             'gazette), whose headers and footers are kept in cache_xml/header_footer '
+                             'across its documents: the ones seen in two documents of it are taken as '
+                             'headers/footers of every later one, however few its pages. "auto" makes '
+                             'one series of every pdf type and page size (default: none kept).')
+    parser.add_argument('-tus', '--tounicode-save', dest='tounicode_save', action='store', \
+                        required=False, default='incremental', choices=('incremental', 'full'),
+                        help='how the copy of a pdf whose ToUnicode maps were repaired is written to '
+                             'cache_pdf/tounicode: incremental appends the repaired maps to a copy of '
+                             'the pdf (default), full writes the repaired document out whole. The maps '
+                             'are kept in cache_xml/tounicode under the font they were repaired for '
+                             'either way, and a font seen before is not repaired again.')
+    parser.add_argument('-xe', '--xml-engine', dest='xml_engine', action='store', \
+                        required=False, default='pdfminer', choices=('pdfminer', 'pdf2txt'),
+                        help='how the page xml is made: pdfminer builds it in process from the '
+                             'layout analysis (default), pdf2txt runs pdf2txt.py and parses the '
+                             'xml file it writes. Both give the same pages.')
     parser.add_argument('-t','--type', dest= 'pdf_type', action = 'store', \
                         required = False, help= 'which helps to process and convert html type = (sebi | acts)' )
     parser.add_argument('-lm', '--line-margin', dest='line_margin', action='store', \
@@ -3528,9 +4345,22 @@ def get_arg_parser():
                       help=f'tesseract language code for OCR (default: eng). One of: {", ".join(TESSERACT_LANGUAGES)}')
     parser.add_argument('-oe', '--ocr-engine', dest='ocr_engine', action='store', \
                       required=False, default='tesseract', choices=OCR_ENGINES_AVAILABLE,
-                      help=f'OCR engine to use for figure text extraction (default: tesseract). One of: {", ".join(OCR_ENGINES_AVAILABLE)}')
+                      help=f'OCR engine to use for figure text extraction (default: tesseract). One of: {", ".join(OCR_ENGINES_AVAILABLE)}. '
+                           'tesserocr keeps one tesseract loaded per language instead of starting the command for every '
+                           'image, and also reads the -sc pages tesseract reads')
     parser.add_argument('-sc', '--scanned-copy', dest = 'scanned_copy', action = 'store_true',
                         required = False, default = False, help = 'mention if the pdf copy is scanned')
+    parser.add_argument('-lco', '--lens-concurrency', dest='lens_concurrency', action='store', \
+                        type=int, required=False, default=LensPageScheduler.DEFAULT_CONCURRENCY, metavar='N',
+                        help='with -sc, the pages rendered and sent to Chrome Lens at once: the next pages '
+                             'are rendered while earlier ones are being read, and a page that fails is tried '
+                             'again after an exponential backoff (default: '
+                             f'{LensPageScheduler.DEFAULT_CONCURRENCY}). 1 reads the pages one at a time.')
+    parser.add_argument('-lpa', '--lens-partial', dest='lens_partial', action='store_true', \
+                        required=False, default=False,
+                        help='with -sc, leave out a page Chrome Lens fails every try and keep the rest, '
+                             'instead of failing the document. Lens failing '
+                             f'{LensPageScheduler.DEFAULT_BREAKER} requests in a row fails it either way.')
     parser.add_argument('-te', '--table-extract', dest = 'table_extract', action = 'store_true',
                         required = False, default = False, help = 'mention if the pdf has borderless table or pdf is scanned copy to extract table content')
     parser.add_argument('-ftx', '--figure-text', dest = 'figure_text', action = 'store_true',
@@ -3672,7 +4502,13 @@ if __name__ == "__main__":
                 is_scanned_copy, table_extract, public_base_url, server_root,
                 rights, provider_id, provider_name, attribution,
                 figure_text, args.font_conv_map, ocr_engine,
-                args.font_model, args.font_detect)
+                args.font_model, args.font_detect,
+                'pdf2txt' if args.keep_xml else args.xml_engine,
+                args.layout_cache_size, args.page_workers,
+                args.stream_window, args.header_sample,
+                args.header_series, args.indic_cache_size,
+                args.tounicode_save, args.lens_concurrency,
+                args.lens_partial)
     # margins = compute_optimal_char_margin(pdf_path)
     char_margin = args.char_margin # str(margins)
     word_margin = args.word_margin # str(margins['word_margin'])
@@ -3688,3 +4524,4 @@ if __name__ == "__main__":
         if not args.keep_xml:
             main.clear_xml_cache()
         main.clear_ocr_engines()
+        main.close_indic_cache()
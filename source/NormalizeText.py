@@ -1,3 +1,5 @@
+import re
+
 NORMALIZE_MAP = {
     # Bullets & list markers
     "": "•",    # U+F0B7 (PUA) → Bullet
@@ -90,6 +92,33 @@ NORMALIZE_MAP = {
     "": "", "": "", "": "", "": "",  # PUA junk from OCR fonts
 }
 
+
+# --- func to compile a map like NORMALIZE_MAP into (regex, replacements) that
+# --- rewrite a text in one pass. The map is meant as one str.replace() after
+# --- the other, so what a char is replaced with is its value with every later
+# --- entry applied to it in turn. That is only the same as one pass while
+# --- every key is a single char (a longer one could be made or broken up by
+# --- an earlier replacement), and None is returned for a map that is not
+def compile_normalize_map(normalize_map):
+    if not normalize_map or any(len(bad) != 1 for bad in normalize_map):
+        return None
+
+    entries = list(normalize_map.items())
+
+    replacements = {}
+    for idx, (bad, good) in enumerate(entries):
+        for later_bad, later_good in entries[idx + 1:]:
+            good = good.replace(later_bad, later_good)
+        replacements[bad] = good
+
+    pattern = "[" + "".join(re.escape(bad) for bad in replacements) + "]"
+
+    return re.compile(pattern), replacements
+
+
+NORMALIZER = compile_normalize_map(NORMALIZE_MAP)
+
+
 class NormalizeText():
     def __init__(self):
         pass
@@ -97,6 +126,12 @@ class NormalizeText():
     def normalize_text(self, text):
       if not isinstance(text, str):
           return text
-      for bad, good in NORMALIZE_MAP.items():
-          text = text.replace(bad, good)
-      return text
\ No newline at end of file
+      if NORMALIZER is None:
+          for bad, good in NORMALIZE_MAP.items():
+              text = text.replace(bad, good)
+          return text
+      normalize_re, replacements = NORMALIZER
+      # most text has nothing to normalise, and is then returned as it is
+      if not normalize_re.search(text):
+          return text
+      return normalize_re.sub(lambda m: replacements[m.group()], text)
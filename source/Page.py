@@ -8,6 +8,7 @@ import pandas as pd
 
 
 from .TextBox import TextBox
+from .CharStore import CharStore
 from .TableExtraction import TableExtraction, BorderlessTableExtraction
 from .CompareLevel import CompareLevel, CompareLevelSebi
 from .NormalizeText import NormalizeText
@@ -34,7 +35,8 @@ class Page:
     def __init__(self,pg,pdfPath, base_name_of_file, output_dir,
                  pdf_type, has_side_notes, is_amendment_pdf,
                  font_mapper, unique_images, min_img_size, ocr_language,
-                 scanned_copy, figure_text=False, ocr_engine="tesseract"):
+                 scanned_copy, figure_text=False, ocr_engine="tesseract",
+                 session=None, image_contents=None):
         self.logger = logging.getLogger(__name__)
         self.pdf_path = pdfPath
         self.page_in_xml = pg
@@ -54,9 +56,10 @@ class Page:
         self.figures = Pictures(self.pdf_path, self.pg_num, base_name_of_file,
                                 output_dir, unique_images, min_img_size,
                                 ocr_language, scanned_copy, figure_text,
-                                pdf_type=pdf_type, ocr_engine=ocr_engine)
+                                pdf_type=pdf_type, ocr_engine=ocr_engine,
+                                session=session, image_contents=image_contents)
         self.tabular_datas = TableExtraction(self.pdf_path,self.pg_num, pdf_type,
-                                            scanned_copy)
+                                            scanned_copy, session, pg)
         self.borderless_tabular_datas = None
         self.side_notes_datas ={}
         self.is_multicolumn = False
@@ -114,9 +117,11 @@ class Page:
         try:
             tbs = self.remove_out_of_page_tb(pg.findall(".//textbox"))
             textBoxes = get_sorted_textboxes(tbs)
+            # the chars of every textbox of the page, parsed once for all of them
+            self.chars = CharStore(textBoxes)
             for tb in textBoxes:
                 try:
-                    tb_obj = TextBox(tb, self.pdf_type, self.font_mapper)
+                    tb_obj = TextBox(tb, self.pdf_type, self.font_mapper, self.chars)
                     text = tb_obj.extract_text_from_tb()
                     if text and text.strip():
                         self.all_tbs[tb_obj] = None
@@ -126,6 +131,12 @@ class Page:
         except Exception as e:
             self.logger.exception("Failed to process textboxes for page %s: %s", getattr(pg, 'pg_num', 'unknown'), e)
         
+    # --- func to read the chars of the textboxes again, after the xml was changed ---
+    def load_chars(self):
+        self.chars = CharStore([tb.tbox for tb in self.all_tbs])
+        for tb in self.all_tbs:
+            tb.load_chars(self.chars)
+
     def get_figures(self): #, pg):
         pg = self.page_in_xml
         try:
@@ -133,6 +144,7 @@ class Page:
             for figbox in figBoxes:
                 try:
                     img_obj = Figure(figbox)
+                    img_obj.figname = self.figures.get_key(img_obj.figname)
                     if img_obj.has_fig:
                         self.all_figbox[img_obj] = "figure"
                 except Exception as e:
@@ -1882,23 +1894,16 @@ class Page:
             if not raised_inline:
                 continue
 
-            for ch in tb.tbox.findall('.//text'):
-                raw = ch.text or ""
-                if not raw or "bbox" not in ch.attrib:
-                    continue
-
-                bbox = tuple(map(float, ch.attrib["bbox"].split(",")))
-                tb.footnotes_superscript[bbox] = raw
+            for idx in tb.get_placed_chars():
+                tb.add_footnote_mark(tb.chars.get_bbox(idx), tb.chars.get_text(idx))
 
     def _mark_footnote_markers_in_tb(self, tb, referenced_nums, leading_marker_re, dotted_clause_re):
         if tb.footnotes_superscript:
             return
 
         try:
-            for textline in tb.tbox.findall('.//textline'):
-                chars = textline.findall('.//text')
-
-                line_text = "".join(ch.text or "" for ch in chars).replace('\n', ' ').strip()
+            for textline in tb.chars.get_line_range(tb.box):
+                line_text = tb.chars.get_line_text(textline).replace('\n', ' ').strip()
 
                 if dotted_clause_re.match(line_text):
                     continue
@@ -1908,22 +1913,20 @@ class Page:
                     continue
 
                 remaining = match.group(1)
-                for ch in chars:
+                for raw, bbox in tb.chars.get_line_chars(textline):
                     if not remaining:
                         break
 
-                    raw = ch.text or ""
                     if not raw:
                         continue
 
                     if not remaining.startswith(raw):
                         break
 
-                    if "bbox" not in ch.attrib:
+                    if bbox is None:
                         break
 
-                    bbox = tuple(map(float, ch.attrib["bbox"].split(",")))
-                    tb.footnotes_superscript[bbox] = raw
+                    tb.add_footnote_mark(bbox, raw)
                     remaining = remaining[len(raw):]
 
         except Exception as e:
@@ -2062,14 +2065,12 @@ class Page:
         for tb, label in self.all_tbs.items():
             if label is not None:
                 continue
-            for textline in tb.tbox.findall(".//textline"):
-                bbox = textline.attrib.get("bbox")
+            chars = tb.chars
+            for textline in chars.get_line_range(tb.box):
+                bbox = chars.get_line_bbox(textline)
                 if not bbox:
                     continue
-                try:
-                    y0, y1 = map(float, bbox.split(",")[1::2])
-                except ValueError:
-                    continue
+                y0, y1 = bbox[1::2]
 
                 run_chars = []
                 run_x0 = None
@@ -2085,15 +2086,10 @@ class Page:
                             "text": text, "line_id": bbox,
                         })
 
-                for ch in textline.findall(".//text"):
-                    ch_bbox = ch.attrib.get("bbox")
-                    raw = ch.text or ""
+                for raw, ch_bbox in chars.get_line_chars(textline):
                     if not ch_bbox or not raw:
                         continue
-                    try:
-                        cx0, _, cx1, _ = map(float, ch_bbox.split(","))
-                    except ValueError:
-                        continue
+                    cx0, _, cx1, _ = ch_bbox
 
                     if raw.strip():
                         if prev_x1 is not None and (cx0 - prev_x1) > split_gap_abs:
@@ -2219,3 +2215,26 @@ class Page:
                             self.all_tbs[it["tb"]] = "pre"
             i = j
 
+
+
+class PageOutline:
+    """The textboxes of a page and nothing else.
+
+    A streamed document has statistics gathered over all of its pages before
+    any one of them is classified (see Main.stream_pages()), and all those
+    need of a page is where its text is. A Page would export the images of
+    the page and look for its tables the moment it is made, which is most of
+    what making one costs, so the pass that gathers them makes these instead.
+    """
+    def __init__(self, pg, pdf_type, font_mapper):
+        self.logger = logging.getLogger(__name__)
+        self.page_in_xml = pg
+        self.pg_width, self.pg_height = self.get_pg_coords(pg)
+        self.pg_num = pg.attrib["id"]
+        self.all_tbs = {}
+        self.pdf_type = pdf_type
+        self.font_mapper = font_mapper
+
+    get_pg_coords = Page.get_pg_coords
+    remove_out_of_page_tb = Page.remove_out_of_page_tb
+    process_textboxes = Page.process_textboxes
@@ -1,18 +1,31 @@
 import xml.etree.ElementTree as ET
+import os
 import subprocess
 import logging
 import re
 import asyncio
 import io
-import tempfile
+import time
 from html import escape
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
+import numpy as np
 import pymupdf
+from pdfminer.layout import (
+    LAParams, LTPage, LTLine, LTRect, LTCurve, LTFigure, LTTextLine,
+    LTTextBox, LTTextBoxVertical, LTTextGroup, LTChar, LTText, LTImage,
+)
+from pdfminer.utils import bbox2str
 from PIL import Image, ImageOps
 from chrome_lens_py import LensAPI
 from statistics import median
 import pytesseract
 
+from .DocumentSession import DocumentSession
+from .LensScheduler import LensPageScheduler
+from .Utils import get_tesserocr_tsv, write_atomic
+
 TESSERACT_LANG_MAP = {
     "en": "eng",
     "hi": "hin",
@@ -48,24 +61,48 @@ ILLEGAL_XML_CHARS_RE = re.compile(
     '\U00010000-\U0010FFFF]'
 )
 
+# anything an XML parser would not hand back as written: the characters above
+# and the line breaks and tabs it normalises. What is built in process is made
+# to read exactly as it would had pdf2txt.py written it out and it been parsed
+# back, and the rare value with one of these is the only one that pays for it.
+XML_UNSAFE_CHARS_RE = re.compile(
+    '[^\u0020-\uD7FF\uE000-\uFFFD\U00010000-\U0010FFFF]'
+)
+
+# --- func to split pages among worker processes, as runs of consecutive pages ---
+def split_into_runs(page_nums, num_runs):
+    """page_nums in num_runs runs of as many pages each, the last one shorter,
+    and fewer runs if there are fewer pages."""
+    size = -(-len(page_nums) // num_runs)
+    return [page_nums[i:i + size] for i in range(0, len(page_nums), size)]
+
+# --- func run in a worker process to build the <page> of a run of pages ---
+def build_pages_xml(pdf_path, laparams, page_nums):
+    parser_tool = ParserTool()
+    pages = []
+
+    with DocumentSession(pdf_path) as session:
+        for page_num in page_nums:
+            layout = session.get_page_layout(page_num, laparams)
+            page = parser_tool.build_page_xml(layout)
+            session.release_page(page_num)
+            pages.append((page_num, ET.tostring(page, encoding='utf-8')))
+
+    return pages, parser_tool.illegal_chars
+
 class ParserTool:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
+        # characters illegal in XML dropped from the pages built in process
+        self.illegal_chars = 0
         
     def add_opt(self, cmd, flag, value):
         if value is not None:
             cmd.extend([flag, str(value)])
         
 
-    def convert_to_xml(self,pdf_path, xml_path, pdf_type, \
-                       char_margin, word_margin, line_margin):
-        cmd = [
-            "pdf2txt.py",
-            "-A",
-            "-t", "xml",
-            "-o", xml_path,
-        ]
-
+    # --- func to fill in the margins the pdf type reads best with ---
+    def get_margins(self, pdf_type, char_margin, word_margin, line_margin):
         if char_margin is None:
             if pdf_type not in {"acts"}:
                 char_margin = "25.0"
@@ -74,14 +111,47 @@ class ParserTool:
             if pdf_type not in {"sebi", "sebi_circulars", "acts"}:
                 line_margin = "0.3"
 
+        return char_margin, word_margin, line_margin
+
+    # --- func to get the LAParams pdf2txt.py -A would run with ---
+    def get_laparams(self, pdf_type, char_margin, word_margin, line_margin):
+        char_margin, word_margin, line_margin = self.get_margins(
+            pdf_type, char_margin, word_margin, line_margin)
+
+        # pdf2txt.py takes its defaults from LAParams() too, so a margin left
+        # unset is the same here and there
+        laparams = LAParams(all_texts = True)
+        if char_margin is not None:
+            laparams.char_margin = float(char_margin)
+        if word_margin is not None:
+            laparams.word_margin = float(word_margin)
+        if line_margin is not None:
+            laparams.line_margin = float(line_margin)
+
+        return laparams
+
+    def convert_to_xml(self,pdf_path, xml_path, pdf_type, \
+                       char_margin, word_margin, line_margin):
+        cmd = [
+            "pdf2txt.py",
+            "-A",
+            "-t", "xml",
+        ]
+
+        char_margin, word_margin, line_margin = self.get_margins(
+            pdf_type, char_margin, word_margin, line_margin)
         
         self.add_opt(cmd, '--char-margin', char_margin)
         self.add_opt(cmd, '--word-margin', word_margin)
         self.add_opt(cmd, '--line-margin', line_margin)
         cmd.append(pdf_path)
             
+        # written to stdout under a temporary name and renamed into place,
+        # so that a run reading the xml of another never sees half of it
         try:
-            subprocess.run(cmd, check=True)
+            write_atomic(xml_path,
+                         lambda f: subprocess.run(cmd, stdout=f, check=True),
+                         suffix=".xml")
             self.logger.info(f"[✔] Parse completed: {xml_path}")
         except subprocess.CalledProcessError as e:
             self.logger.error(f"[✖] Parse failed: {e}")
@@ -120,35 +190,8 @@ class ParserTool:
             if not pages:
                 self.logger.warning(f"No <page> elements found: {xml_path}")
                 return []
-            
-            filtered = []
-            if start_page and end_page and start_page > end_page:
-                self.logger.warning(f"start_page ({start_page}) > end_page ({end_page}), swapping.")
-                start_page, end_page = end_page, start_page
-
-            for p in pages:
-                num_attr = p.get("id")
-                if num_attr is None:
-                    continue  
-
-                try:
-                    num = int(num_attr)
-                except ValueError:
-                    continue 
-
-                if (start_page is None or num >= start_page) and \
-                            (end_page is None or num <= end_page):
-                    filtered.append(p)
-
-            self.logger.debug(
-                f"Collected {len(filtered)} page(s) from XML: {xml_path} "
-                f"(start={start_page}, end={end_page})"
-            )
 
-            if not self.is_scanned_pdf(filtered):
-                return filtered
-            else:
-                return None
+            return self.select_pages(pages, start_page, end_page, xml_path)
         except ET.ParseError as e:
             self.logger.error(f"XML parsing error in file {xml_path}: {e}")
             raise
@@ -159,28 +202,394 @@ class ParserTool:
             self.logger.exception(f"Unexpected error while parsing XML: {xml_path} -- {e}")
             raise
     
-    def is_scanned_pdf(self, pages, threshold=0.95):
-        total_pages = len(pages)
+    # --- func to keep the pages in range, None if they are a scanned copy ---
+    def select_pages(self, pages, start_page, end_page, source):
+        filtered = []
+        start_page, end_page = self.get_page_range(start_page, end_page)
 
-        if total_pages == 0:
-            return True
+        for p in pages:
+            num_attr = p.get("id")
+            if num_attr is None:
+                continue  
 
-        text_pages = 0
+            try:
+                num = int(num_attr)
+            except ValueError:
+                continue 
 
-        for page in pages:
-            has_text = False
+            if (start_page is None or num >= start_page) and \
+                        (end_page is None or num <= end_page):
+                filtered.append(p)
 
-            for textbox in page.findall(".//textbox"):
-                for t in textbox.findall(".//text"):
-                    if t.text and t.text.strip():
-                        has_text = True
-                        break
+        self.logger.debug(
+            f"Collected {len(filtered)} page(s) from XML: {source} "
+            f"(start={start_page}, end={end_page})"
+        )
 
-                if has_text:
-                    break
+        if not self.is_scanned_pdf(filtered):
+            return filtered
+        else:
+            return None
+
+    def get_page_range(self, start_page, end_page):
+        if start_page and end_page and start_page > end_page:
+            self.logger.warning(f"start_page ({start_page}) > end_page ({end_page}), swapping.")
+            start_page, end_page = end_page, start_page
+
+        return start_page, end_page
+
+    # --- func to get the pages pdf2txt.py would, without running it ---
+    def get_pages_from_pdf(self, session, pdf_type, char_margin, word_margin,
+                           line_margin, start_page, end_page, cache=None,
+                           workers=1):
+        """The <page> elements get_pages_from_xml() returns for the xml
+        convert_to_xml() writes, built from pdfminer's layout in process.
+
+        pdf2txt.py runs the same layout analysis, serialises every object of it
+        into text and the xml is then read back into the very elements built
+        here. Doing it in process saves starting an interpreter and importing
+        pdfminer, writing and re-parsing an xml several times the size of the
+        pdf, and it analyses only the pages asked for instead of all of them.
+        The layouts come from the session, whose font cache the image pass
+        shares, and are let go as soon as their page is built. With a
+        LayoutCache, a page built before for the same pdf and LAParams is read
+        from it instead and one that is built is written to it. With more than
+        one worker the pages left to build are built in that many processes,
+        see build_pages().
+        """
+        laparams = self.get_laparams(pdf_type, char_margin, word_margin,
+                                     line_margin)
+        start_page, end_page = self.get_page_range(start_page, end_page)
+
+        cache, key, page_count = self.open_layout_cache(session, laparams, cache)
+        page_nums = self.get_page_nums(page_count, start_page, end_page)
+
+        self.illegal_chars = 0
+        built = {}
+        if cache is not None:
+            for page_num in page_nums:
+                page = cache.get_page(key, page_num)
+                if page is not None:
+                    built[page_num] = page
+        cached = len(built)
+
+        missing = [page_num for page_num in page_nums if page_num not in built]
+        for page_num, page in self.build_pages(session, laparams, missing,
+                                               workers).items():
+            built[page_num] = page
+            if cache is not None:
+                cache.put_page(key, page_num, page)
+
+        pages = [built[page_num] for page_num in page_nums]
+
+        if cache is not None:
+            self.logger.info(f"Read {cached} of {len(pages)} page(s) of "
+                             f"{session.pdf_path} from the layout cache")
+            cache.evict(keep=key)
+
+        self.warn_illegal_chars(session.pdf_path)
+
+        if not pages:
+            self.logger.warning(f"No pages in range: {session.pdf_path}")
+            return []
 
-            if has_text:
-                text_pages += 1
+        return self.select_pages(pages, start_page, end_page, session.pdf_path)
+
+    # --- func to get the entry of a pdf in the layout cache ---
+    def open_layout_cache(self, session, laparams, cache):
+        """(cache, key, page count) - the cache None if there is none or it
+        cannot be used, in which case the pdf is opened for its page count."""
+        key = None
+        page_count = None
+        if cache is not None:
+            try:
+                fields = cache.get_key_fields(session.pdf_path, laparams)
+                key = cache.get_key(fields)
+                index = cache.get_index(key)
+                if index is not None:
+                    page_count = index["page_count"]
+                    cache.touch(key)
+                else:
+                    page_count = len(session.get_miner_pages())
+                    cache.put_index(key, fields, page_count)
+            except OSError as e:
+                self.logger.warning(f"Layout cache not used for "
+                                    f"{session.pdf_path}: {e}")
+                cache = None
+
+        if page_count is None:
+            page_count = len(session.get_miner_pages())
+
+        return cache, key, page_count
+
+    def get_page_nums(self, page_count, start_page, end_page):
+        first = max(start_page or 1, 1)
+        last = min(end_page or page_count, page_count)
+
+        return list(range(first, last + 1))
+
+    def warn_illegal_chars(self, pdf_path):
+        if self.illegal_chars:
+            self.logger.warning(
+                f"Dropped {self.illegal_chars} character(s) illegal in XML from "
+                f"{pdf_path}. These are glyphs the pdf font's ToUnicode "
+                f"map does not resolve; the text they stood for is lost."
+            )
+
+    # --- func to lay out the pages of a pdf into the cache, for streaming ---
+    def cache_pages_from_pdf(self, session, pdf_type, char_margin, word_margin,
+                             line_margin, start_page, end_page, cache,
+                             workers=1, batch_size=64, lazy=False):
+        """What get_pages_from_pdf() does, except that the pages are only
+        written to the cache and not returned: a document streamed through
+        Main.stream_pages() is read more than once, a page at a time, and
+        holding every page of it here is what streaming is for not doing.
+        The pages missing from the cache are built batch_size at a time, so
+        that no more than that many are held even while building. If lazy,
+        none is built here, and it is up to the reader to cache_pages() them
+        before reading them.
+
+        (laparams, key, page numbers), what iter_cached_pages() takes after the
+        session and the cache, or None if the cache cannot be used.
+        """
+        laparams = self.get_laparams(pdf_type, char_margin, word_margin,
+                                     line_margin)
+        start_page, end_page = self.get_page_range(start_page, end_page)
+
+        cache, key, page_count = self.open_layout_cache(session, laparams, cache)
+        if cache is None:
+            return None
+
+        page_nums = self.get_page_nums(page_count, start_page, end_page)
+
+        self.illegal_chars = 0
+        if lazy:
+            return laparams, key, page_nums
+
+        missing = self.cache_pages(session, cache, laparams, key, page_nums,
+                                   workers, batch_size)
+
+        self.logger.info(f"Read {len(page_nums) - missing} of "
+                         f"{len(page_nums)} page(s) of {session.pdf_path} "
+                         f"from the layout cache")
+        cache.evict(keep=key)
+
+        self.warn_illegal_chars(session.pdf_path)
+
+        return laparams, key, page_nums
+
+    # --- func to lay out the pages missing from the cache, returns how many were ---
+    def cache_pages(self, session, cache, laparams, key, page_nums, workers=1,
+                    batch_size=64):
+        missing = [page_num for page_num in page_nums
+                   if not os.path.exists(cache.get_page_path(key, page_num))]
+        for i in range(0, len(missing), batch_size):
+            built = self.build_pages(session, laparams,
+                                     missing[i:i + batch_size], workers)
+            for page_num, page in built.items():
+                cache.put_page(key, page_num, page)
+
+        return len(missing)
+
+    # --- func to read the pages cache_pages_from_pdf() laid out, in order ---
+    def iter_cached_pages(self, session, cache, laparams, key, page_nums):
+        for page_num in page_nums:
+            page = cache.get_page(key, page_num)
+            if page is None:
+                # not written, or dropped as invalid since
+                page = self.build_pages(session, laparams, [page_num])[page_num]
+            yield page
+
+    # --- func to build the <page> of each of the pages, {page: element} ---
+    def build_pages(self, session, laparams, page_nums, workers=1):
+        """Layout analysis is pure CPU and every page is analysed on its own,
+        so the pages can be split among processes. Each is given runs of
+        consecutive pages - a couple per worker, so that one slow run does not
+        keep the others waiting - opens the pdf itself and sends its pages back
+        serialised, to be parsed back here and put in page order. A page is
+        built from the same bytes with the same LAParams in whichever process,
+        so the pages are the ones built here serially.
+        """
+        if workers == 0:
+            workers = os.cpu_count() or 1
+        workers = min(workers, len(page_nums))
+
+        if workers > 1:
+            try:
+                return self.build_pages_parallel(session.pdf_path, laparams,
+                                                 page_nums, workers)
+            except (OSError, BrokenProcessPool) as e:
+                self.logger.warning(f"Could not analyse {session.pdf_path} in "
+                                    f"{workers} processes, analysing it in this "
+                                    f"one: {e}")
+
+        built = {}
+        for page_num in page_nums:
+            layout = session.get_page_layout(page_num, laparams)
+            built[page_num] = self.build_page_xml(layout)
+            session.release_layouts(page_num)
+
+        return built
+
+    def build_pages_parallel(self, pdf_path, laparams, page_nums, workers):
+        runs = split_into_runs(page_nums, workers * 2)
+
+        built = {}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(build_pages_xml, pdf_path, laparams, run)
+                       for run in runs]
+            for future in futures:
+                pages, illegal_chars = future.result()
+                self.illegal_chars += illegal_chars
+                for page_num, data in pages:
+                    built[page_num] = ET.fromstring(data)
+
+        self.logger.debug(f"Analysed {len(page_nums)} page(s) of {pdf_path} in "
+                          f"{workers} processes, {len(runs)} runs of {len(runs[0])}")
+
+        return built
+
+    # --- func to turn an analysed page into the <page> pdf2txt.py writes ---
+    def build_page_xml(self, ltpage):
+        """Mirrors pdfminer's XMLConverter.receive_layout() element for element
+        and attribute for attribute, values formatted the same way."""
+        return self.render_layout_item(None, ltpage)
+
+    def render_layout_item(self, parent, item):
+        # the chars and the spaces between them are nearly every item of a
+        # page, so they are looked for first and their lines render them inline
+        if isinstance(item, LTTextLine):
+            elem = ET.SubElement(parent, "textline", {"bbox": bbox2str(item.bbox)})
+            for child in item:
+                if isinstance(child, LTChar):
+                    self.render_char(elem, child)
+                else:
+                    self.render_layout_item(elem, child)
+
+        elif isinstance(item, LTChar):
+            elem = self.render_char(parent, item)
+
+        elif isinstance(item, LTTextBox):
+            attrib = {"id": f"{item.index}", "bbox": bbox2str(item.bbox)}
+            if isinstance(item, LTTextBoxVertical):
+                attrib["wmode"] = "vertical"
+            elem = self.add_xml_elem(parent, "textbox", attrib)
+            for child in item:
+                self.render_layout_item(elem, child)
+
+        elif isinstance(item, LTText):
+            # LTAnno, the lines, chars and boxes being LTText too
+            elem = ET.SubElement(parent, "text", {})
+            self.set_xml_text(elem, item.get_text())
+
+        elif isinstance(item, (LTLine, LTRect)):
+            elem = self.add_xml_elem(
+                parent, "line" if isinstance(item, LTLine) else "rect", {
+                    "linewidth": f"{item.linewidth}",
+                    "bbox": bbox2str(item.bbox),
+                })
+
+        elif isinstance(item, LTCurve):
+            elem = self.add_xml_elem(parent, "curve", {
+                "linewidth": f"{item.linewidth}",
+                "bbox": bbox2str(item.bbox),
+                "pts": item.get_pts(),
+            })
+
+        elif isinstance(item, LTFigure):
+            elem = self.add_xml_elem(parent, "figure", {
+                "name": self.clean_xml_attr(f"{item.name}"),
+                "bbox": bbox2str(item.bbox),
+            })
+            for child in item:
+                self.render_layout_item(elem, child)
+
+        elif isinstance(item, LTPage):
+            elem = self.add_xml_elem(parent, "page", {
+                "id": f"{item.pageid}",
+                "bbox": bbox2str(item.bbox),
+                "rotate": f"{item.rotate}",
+            })
+            for child in item:
+                self.render_layout_item(elem, child)
+            if item.groups is not None:
+                layout = self.add_xml_elem(elem, "layout", {})
+                for group in item.groups:
+                    self.render_layout_group(layout, group)
+
+        elif isinstance(item, LTImage):
+            elem = self.add_xml_elem(parent, "image", {
+                "width": f"{item.width}",
+                "height": f"{item.height}",
+            })
+
+        else:
+            raise AssertionError(str(("Unhandled", item)))
+
+        return elem
+
+    def render_char(self, parent, item):
+        fontname = item.fontname if isinstance(item.fontname, str) else ""
+        elem = ET.SubElement(parent, "text", {
+            "font": self.clean_xml_attr(fontname),
+            "bbox": bbox2str(item.bbox),
+            "colourspace": self.clean_xml_attr(f"{item.ncs.name}"),
+            "ncolour": f"{item.graphicstate.ncolor}",
+            "size": f"{item.size:.3f}",
+        })
+        self.set_xml_text(elem, item.get_text())
+
+        return elem
+
+    def render_layout_group(self, parent, item):
+        if isinstance(item, LTTextBox):
+            self.add_xml_elem(parent, "textbox", {
+                "id": f"{item.index}",
+                "bbox": bbox2str(item.bbox),
+            })
+        elif isinstance(item, LTTextGroup):
+            group = self.add_xml_elem(parent, "textgroup", {
+                "bbox": bbox2str(item.bbox),
+            })
+            for child in item:
+                self.render_layout_group(group, child)
+
+    @staticmethod
+    def add_xml_elem(parent, tag, attrib):
+        if parent is None:
+            return ET.Element(tag, attrib)
+
+        return ET.SubElement(parent, tag, attrib)
+
+    def set_xml_text(self, elem, text):
+        if XML_UNSAFE_CHARS_RE.search(text):
+            text = self.clean_xml_value(text)
+        if text:
+            elem.text = text
+
+    # --- func to get an attribute value as the parser would have read it ---
+    def clean_xml_attr(self, value):
+        if not XML_UNSAFE_CHARS_RE.search(value):
+            return value
+
+        return self.clean_xml_value(value).replace('\t', ' ').replace('\n', ' ')
+
+    def clean_xml_value(self, value):
+        value, removed = ILLEGAL_XML_CHARS_RE.subn('', value)
+        if removed:
+            self.illegal_chars += removed
+
+        return value.replace('\r\n', '\n').replace('\r', '\n')
+
+    def is_scanned_pdf(self, pages, threshold=0.95):
+        text_pages = sum(1 for page in pages if self.has_text(page))
+
+        return self.is_scanned_count(text_pages, len(pages), threshold)
+
+    # --- func to say whether a few text pages out of many make it scanned ---
+    def is_scanned_count(self, text_pages, total_pages, threshold=0.95):
+        if total_pages == 0:
+            return True
 
         ratio = text_pages / total_pages
 
@@ -190,6 +599,14 @@ class ParserTool:
 
         return ratio < threshold
 
+    def has_text(self, page):
+        for textbox in page.findall(".//textbox"):
+            for t in textbox.findall(".//text"):
+                if t.text and t.text.strip():
+                    return True
+
+        return False
+
 # class ChromeLensParserTool:
 
 #     def __init__(self, pdf_path):
@@ -513,18 +930,43 @@ class ChromeLensParserTool:
 
     GAP_EPSILON = 0.5
 
-    def __init__(self, pdf_path):
+    def __init__(self, pdf_path, session=None, lens=None,
+                 concurrency=LensPageScheduler.DEFAULT_CONCURRENCY,
+                 allow_partial=False):
         self.logger = logging.getLogger(__name__)
-        self.lens = LensAPI()
+        # any client with LensAPI's process_image(), e.g. a local stub
+        self.lens = lens if lens is not None else LensAPI()
+        # pages rendered and sent to Lens at once
+        self.concurrency = concurrency
+        # leave out a page Lens failed every try, instead of failing
+        self.allow_partial = allow_partial
         self.pdf_path = pdf_path
+        # the DocumentSession of the conversion, whose document and rendered
+        # pages are used instead of opening the pdf again
+        self.session = session
         self.xml = []
         self.total_pages = 0
 
+    def open_document(self):
+        if self.session is not None:
+            return self.session.get_document()
+        return pymupdf.open(self.pdf_path)
+
+    def close_document(self, doc):
+        # the session's document is the session's to close
+        if self.session is None:
+            doc.close()
+
+    def get_pixmap(self, page, dpi=300):
+        if self.session is not None:
+            return self.session.get_pixmap(page.number + 1, dpi)
+        return page.get_pixmap(dpi=dpi, alpha=False)
+
     def build_xml(self, start_page=None, end_page=None):
 
         self.xml.clear()
 
-        doc = pymupdf.open(self.pdf_path)
+        doc = self.open_document()
 
         try:
 
@@ -546,48 +988,23 @@ class ChromeLensParserTool:
             return self.xml
 
         finally:
-            doc.close()
-
-    async def process_page(self, page):
-
-        pix = page.get_pixmap(dpi=300, alpha=False)
-
-        image = Image.open(io.BytesIO(pix.tobytes("png")))
-
-        result = await self.lens.process_image(
-            image_path=image,
-            output_format="detailed"
-        )
-
-        return result.get("detailed_blocks", [])
-
-    async def _process_page_with_retry(self, page, retries=5):
-
-        last_exception = None
-
-        for attempt in range(retries):
-
-            try:
-                return await self.process_page(page)
-
-            except Exception as e:
-
-                last_exception = e
-
-                self.logger.warning(
-                    f"Page {page.number + 1} OCR failed "
-                    f"(Attempt {attempt + 1}/{retries}): {e}"
-                )
-
-        raise last_exception
+            self.close_document(doc)
 
     async def _build_async(self, doc, start_page, end_page):
 
-        for page_num in range(start_page, end_page + 1):
+        pages = [doc[page_num - 1]
+                 for page_num in range(start_page, end_page + 1)]
 
-            page = doc[page_num - 1]
+        # the pages are rendered and read by Lens a few at a time, and come
+        # back in page order - see LensPageScheduler
+        results = await self.get_scheduler().process_pages(pages)
+
+        for page_num, page, detailed_blocks in zip(
+                range(start_page, end_page + 1), pages, results):
 
-            detailed_blocks = await self._process_page_with_retry(page)
+            if detailed_blocks is None:
+                # Lens failed it every try, and allow_partial was given
+                continue
 
             page_xml = self.build_page_xml(
                 detailed_blocks=detailed_blocks,
@@ -598,6 +1015,14 @@ class ChromeLensParserTool:
 
             self.xml.append(page_xml)
 
+    def get_scheduler(self):
+        return LensPageScheduler(
+            self.lens,
+            lambda page: self.get_pixmap(page, dpi=300),
+            concurrency=self.concurrency,
+            allow_partial=self.allow_partial
+        )
+
     @staticmethod
     def _bbox(geometry, scale_x=1.0, scale_y=1.0):
 
@@ -833,22 +1258,104 @@ class ChromeLensParserTool:
         return page_el
 
 
+# --- func run in a worker process to OCR a run of pages ---
+def ocr_pages(pdf_path, ocr_language, page_nums, dpi=300, engine="tesseract"):
+    # the workers already use every core between them, tesseract's own
+    # threads would only be fighting each other for them
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+    tool = TesseractParserTool(pdf_path, ocr_language, engine=engine)
+    pages = []
+
+    with DocumentSession(pdf_path) as session:
+        tool.session = session
+        doc = session.get_document()
+        for page_num in page_nums:
+            page = doc[page_num - 1]
+            pages.append((page_num, tool._ocr_page(page, dpi=dpi)))
+
+    return pages, tool.strategy_stats
+
+
 class TesseractParserTool:
 
     GAP_EPSILON = 0.5
 
-    def __init__(self, pdf_path, ocr_language="en"):
+    # tesseract's tsv columns that hold numbers, the rest is the text
+    TSV_INT_COLUMNS = {
+        "level", "page_num", "block_num", "par_num", "line_num", "word_num",
+        "left", "top", "width", "height",
+    }
+    # and the one that holds a fraction, 0-100 and -1 for a row of no word
+    TSV_FLOAT_COLUMNS = {"conf"}
+
+    # the ways a page is read, in the order they are tried when nothing says
+    # otherwise: the render as it is, the render binarized, and ghostscript's
+    # render of the page binarized
+    STRATEGIES = ("colour", "binarized", "ghostscript")
+    # the words a reading has to find, each with a confidence of at least
+    # MIN_CONFIDENCE, to be taken without trying the others. What tesseract
+    # makes of a smudge or a photo are words it is not sure of, so a
+    # reading that only found those goes on to the next strategy
+    MIN_WORDS = 3
+    MIN_CONFIDENCE = 60
+    # the pages in a row a strategy has to read first for the rest of the
+    # document to be read with it first
+    LEARN_AFTER = 3
+    # a render whose ink is less than this darker than its paper, or that is
+    # darker than INK_LEVEL over more than MAX_INK of it, is read binarized
+    # first; one with no pixel darker than BLANK_LEVEL is read as it is first
+    LOW_CONTRAST = 96
+    MAX_INK = 0.35
+    INK_LEVEL = 128
+    BLANK_LEVEL = 250
+    # the render is sampled every this many pixels each way for the above
+    SAMPLE_STEP = 4
+
+    def __init__(self, pdf_path, ocr_language="en", session=None, workers=1,
+                 engine="tesseract"):
         self.logger = logging.getLogger(__name__)
         self.pdf_path = pdf_path
+        # the DocumentSession of the conversion, see ChromeLensParserTool
+        self.session = session
+        self.ocr_language = ocr_language
         self.tesseract_lang = resolve_tesseract_lang(ocr_language)
+        # processes the pages are OCRed in, 0 for one per core
+        self.workers = workers
+        # "tesserocr" reads every page with the one libtesseract API of the
+        # process (see Utils._get_tesserocr_api), anything else runs the
+        # tesseract command for every image
+        self.engine = engine
+        # strategy -> {tries, wins, seconds} over the pages read here
+        self.strategy_stats = {strategy: {"tries": 0, "wins": 0, "seconds": 0.0}
+                               for strategy in self.STRATEGIES}
+        # the strategy that read the last pages and how many in a row, and
+        # the one tried first since it has read LEARN_AFTER of them
+        self.last_winner = None
+        self.streak = 0
+        self.learned = None
         self.xml = []
         self.total_pages = 0
 
+    def open_document(self):
+        if self.session is not None:
+            return self.session.get_document()
+        return pymupdf.open(self.pdf_path)
+
+    def close_document(self, doc):
+        if self.session is None:
+            doc.close()
+
+    def get_pixmap(self, page, dpi=300):
+        if self.session is not None:
+            return self.session.get_pixmap(page.number + 1, dpi)
+        return page.get_pixmap(dpi=dpi, alpha=False)
+
     def build_xml(self, start_page=None, end_page=None):
 
         self.xml.clear()
 
-        doc = pymupdf.open(self.pdf_path)
+        doc = self.open_document()
 
         try:
             self.total_pages = len(doc)
@@ -862,14 +1369,15 @@ class TesseractParserTool:
             start_page = max(1, start_page)
             end_page = min(self.total_pages, end_page)
 
-            for page_num in range(start_page, end_page + 1):
+            page_nums = list(range(start_page, end_page + 1))
+            page_words = self.ocr_pages(doc, page_nums)
 
-                page = doc[page_num - 1]
+            for page_num in page_nums:
 
-                words = self._ocr_page(page)
+                page = doc[page_num - 1]
 
                 page_xml = self.build_page_xml(
-                    words=words,
+                    words=page_words[page_num],
                     page_number=page_num,
                     page_width=page.rect.width,
                     page_height=page.rect.height,
@@ -877,77 +1385,294 @@ class TesseractParserTool:
 
                 self.xml.append(page_xml)
 
+            self.log_strategy_stats()
+
             return self.xml
 
         finally:
-            doc.close()
+            self.close_document(doc)
+
+    # --- func to OCR each of the pages, {page: words} ---
+    def ocr_pages(self, doc, page_nums, dpi=300):
+        """A page is seconds of tesseract and every page is read on its own,
+        so the pages can be split among processes like the pages of
+        ParserTool.build_pages(). Each worker is given runs of consecutive
+        pages - smaller ones than there, the pages of a scan taking very
+        different times to read - renders them from its own copy of the pdf
+        and sends back only the words, which are put in page order here. The
+        xml is built here from them as it is for the pages read serially.
+        """
+        workers = self.workers
+        if workers == 0:
+            workers = os.cpu_count() or 1
+        workers = min(workers, len(page_nums))
 
-    def _ocr_page(self, page, dpi=300):
+        if workers > 1:
+            try:
+                return self.ocr_pages_parallel(page_nums, workers, dpi)
+            except (OSError, BrokenProcessPool) as e:
+                self.logger.warning(f"Could not OCR {self.pdf_path} in "
+                                    f"{workers} processes, OCRing it in this "
+                                    f"one: {e}")
+
+        return {page_num: self._ocr_page(doc[page_num - 1], dpi=dpi)
+                for page_num in page_nums}
+
+    def ocr_pages_parallel(self, page_nums, workers, dpi):
+        runs = split_into_runs(page_nums, workers * 4)
+
+        page_words = {}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(ocr_pages, self.pdf_path, self.ocr_language,
+                                   run, dpi, self.engine)
+                       for run in runs]
+            for future in futures:
+                pages, strategy_stats = future.result()
+                for page_num, words in pages:
+                    page_words[page_num] = words
+                for strategy, stats in strategy_stats.items():
+                    for key, value in stats.items():
+                        self.strategy_stats[strategy][key] += value
+
+        self.logger.debug(f"OCRed {len(page_nums)} page(s) of {self.pdf_path} "
+                          f"in {workers} processes, {len(runs)} runs of {len(runs[0])}")
+
+        return page_words
 
-        pix = page.get_pixmap(dpi=dpi, alpha=False)
+    def _ocr_page(self, page, dpi=300):
+        """Reads the page with the strategies in the order get_strategy_order()
+        puts them in, and takes the first reading with MIN_WORDS words of
+        MIN_CONFIDENCE. A page no strategy reads that well gets the reading
+        get_reading_score() scores highest, and only a page every strategy,
+        ghostscript's render included, reads nothing of is left empty."""
+        pix = self.get_pixmap(page, dpi=dpi)
 
         scale = 72.0 / dpi
         page_number = page.number + 1
 
-        words = self._words_from_png_bytes(pix.tobytes("png"), scale, page_number)
-
-        if len(words) < 3:
-            image = Image.open(io.BytesIO(pix.tobytes("png")))
-            binarized = self._binarize(image)
-            buf = io.BytesIO()
-            binarized.save(buf, format="PNG")
-            words = self._words_from_png_bytes(buf.getvalue(), scale, page_number)
-
-        if len(words) < 3:
-            words = self._words_from_ghostscript(page_number, dpi)
+        best = []
+
+        for strategy in self.get_strategy_order(pix):
+            started = time.perf_counter()
+            words = self._ocr_with(strategy, pix, scale, page_number, dpi)
+
+            stats = self.strategy_stats[strategy]
+            stats["tries"] += 1
+            stats["seconds"] += time.perf_counter() - started
+
+            confident = sum(1 for word in words if word["conf"] >= self.MIN_CONFIDENCE)
+            if confident >= self.MIN_WORDS:
+                stats["wins"] += 1
+                self.learn(strategy)
+                return words
+
+            if strategy == self.learned:
+                self.logger.debug(f"OCR of page {page_number} with {strategy} found "
+                                  f"{confident} confident word(s) of {len(words)}, "
+                                  f"no longer trying it first")
+                self.learned = None
+
+            if self.get_reading_score(words) > self.get_reading_score(best):
+                best = words
+
+        return best
+
+    def _ocr_with(self, strategy, pix, scale, page_number, dpi):
+        if strategy == "colour":
+            # tesseract is handed the raw pixels as a pnm on its stdin, nothing
+            # is compressed only to be decompressed again or put on disk
+            return self._words_from_image_bytes(pix.tobytes("pnm"), scale, page_number)
+
+        if strategy == "binarized":
+            binarized = self._binarize(pix.pil_image())
+            return self._words_from_image_bytes(self._to_pnm(binarized), scale, page_number)
+
+        return self._words_from_ghostscript(page_number, dpi)
+
+    # --- func to get the order to try the strategies in on a page ---
+    def get_strategy_order(self, pix):
+        """The strategy that read the last LEARN_AFTER pages of the document
+        first - the pages of a scan are mostly alike, so what reads one reads
+        the next. Until there is one, a faint, greyed or dark render is
+        binarized first, which is what reads it when the render as it is
+        does not. That is judged from a sample of the render, in milliseconds
+        against the seconds of a reading. A render that looks blank is read
+        as it is first, the cheapest, but the sample can miss a few thin
+        strokes and ghostscript can draw what pymupdf did not, so every
+        strategy is still tried before the page is taken to be blank."""
+        order = list(self.STRATEGIES)
+        paper, ink, darkest, dark_share = self.get_render_stats(pix)
+
+        if darkest >= self.BLANK_LEVEL:
+            first = "colour"
+        elif self.learned is not None:
+            first = self.learned
+        elif paper - ink < self.LOW_CONTRAST or dark_share > self.MAX_INK:
+            first = "binarized"
+        else:
+            return order
+
+        order.remove(first)
+        return [first] + order
+
+    # --- func to get the grey of the paper and the ink of a render, from a sample of it ---
+    def get_render_stats(self, pix):
+        """(the median grey, the grey 1 in 200 pixels is darker than, the
+        darkest grey, the share of pixels darker than INK_LEVEL). The pixels
+        are sampled and not averaged, which would grey the ink: every
+        SAMPLE_STEP-th of every SAMPLE_STEP-th row, read through a strided
+        view of the pixmap's own samples, so that only the sample is ever
+        copied out of a render of tens of MB."""
+        step = self.SAMPLE_STEP
+        samples = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+        rows = samples.reshape(pix.height, pix.stride)[::step, :pix.width * pix.n]
+        sample = rows.reshape(len(rows), pix.width, pix.n)[:, ::step]
+
+        if pix.n - pix.alpha >= 3:
+            # the grey PIL's convert("L") makes of rgb
+            grey = (sample[..., :3] @ np.array([299, 587, 114], dtype=np.uint32) + 500) // 1000
+        else:
+            grey = sample[..., 0]
+
+        histogram = np.bincount(grey.ravel(), minlength=256)
+        cumulative = np.cumsum(histogram)
+        total = cumulative[-1]
+
+        def percentile(share):
+            return int(np.searchsorted(cumulative, share * total))
+
+        darkest = int(np.flatnonzero(histogram)[0])
+        dark_share = cumulative[self.INK_LEVEL - 1] / total
+
+        return percentile(0.5), percentile(0.005), darkest, float(dark_share)
+
+    # --- func to score a reading that no strategy bettered, to keep the best one ---
+    @staticmethod
+    def get_reading_score(words):
+        """The confidences of its words added up: more words for more of
+        the page read, and the words tesseract is surer of for less noise."""
+        return sum(max(word["conf"], 0.0) for word in words)
+
+    def learn(self, strategy):
+        if strategy == self.last_winner:
+            self.streak += 1
+        else:
+            self.last_winner = strategy
+            self.streak = 1
+
+        if self.streak >= self.LEARN_AFTER and self.learned != strategy:
+            self.logger.debug(f"Reading the pages of {self.pdf_path} with {strategy} first")
+            self.learned = strategy
+
+    # --- func to log what each strategy cost and read over the document ---
+    def log_strategy_stats(self):
+        parts = []
+        for strategy in self.STRATEGIES:
+            stats = self.strategy_stats[strategy]
+            if not stats["tries"]:
+                continue
+            parts.append(f"{strategy} {stats['wins']}/{stats['tries']} pages in "
+                         f"{stats['seconds']:.1f}s "
+                         f"({stats['seconds'] / stats['tries']:.2f}s a try)")
 
-        return words
+        if parts:
+            self.logger.info(f"OCR strategies for {self.pdf_path}: " + ", ".join(parts))
 
     def _words_from_ghostscript(self, page_number, dpi):
 
         scale = 72.0 / dpi
 
-        with tempfile.NamedTemporaryFile(suffix=".png", delete=True) as f:
-            command = [
-                "gs", "-q", "-dNOPAUSE", "-dBATCH", "-dSAFER",
-                f"-dFirstPage={page_number}", f"-dLastPage={page_number}",
-                f"-r{dpi}", "-sDEVICE=pnggray", "-dTextAlphaBits=4",
-                f"-sOutputFile={f.name}",
-                "-c", "save", "pop", "-f", self.pdf_path,
-            ]
+        command = [
+            "gs", "-q", "-dNOPAUSE", "-dBATCH", "-dSAFER",
+            f"-dFirstPage={page_number}", f"-dLastPage={page_number}",
+            f"-r{dpi}", "-sDEVICE=pgmraw", "-dTextAlphaBits=4",
+            "-sOutputFile=-",
+            "-c", "save", "pop", "-f", self.pdf_path,
+        ]
 
-            try:
-                subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-            except Exception as e:
-                self.logger.warning(f"Ghostscript rendering failed on page {page_number}: {e}")
-                return []
+        try:
+            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+            image = Image.open(io.BytesIO(result.stdout))
+        except Exception as e:
+            self.logger.warning(f"Ghostscript rendering failed on page {page_number}: {e}")
+            return []
+
+        binarized = self._binarize(image)
 
-            binarized = self._binarize(Image.open(f.name))
-            buf = io.BytesIO()
-            binarized.save(buf, format="PNG")
+        return self._words_from_image_bytes(self._to_pnm(binarized), scale, page_number)
 
-        return self._words_from_png_bytes(buf.getvalue(), scale, page_number)
+    @staticmethod
+    def _to_pnm(image):
+        buf = io.BytesIO()
+        # PIL writes an "L" image as a binary pgm
+        image.save(buf, format="PPM")
+        return buf.getvalue()
 
-    def _words_from_png_bytes(self, png_bytes, scale, page_number):
+    def _words_from_image_bytes(self, image_bytes, scale, page_number):
 
-        with tempfile.NamedTemporaryFile(suffix=".png", delete=True) as f:
-            f.write(png_bytes)
-            f.flush()
-            return self._words_from_path(f.name, scale, page_number)
+        if self.engine == "tesserocr":
+            return self._words_from_image(Image.open(io.BytesIO(image_bytes)),
+                                          scale, page_number)
 
-    def _words_from_path(self, path, scale, page_number):
+        command = [
+            pytesseract.pytesseract.tesseract_cmd, "stdin", "stdout",
+            "-l", self.tesseract_lang, "tsv",
+        ]
 
         try:
-            data = pytesseract.image_to_data(
-                path, lang=self.tesseract_lang, output_type=pytesseract.Output.DICT
-            )
+            result = subprocess.run(command, input=image_bytes, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE, check=True)
+        except subprocess.CalledProcessError as e:
+            error = e.stderr.decode("utf-8", "replace").strip() or e
+            self.logger.warning(f"Tesseract OCR failed on page {page_number}: {error}")
+            return []
         except Exception as e:
             self.logger.warning(f"Tesseract OCR failed on page {page_number}: {e}")
             return []
 
+        data = self._parse_tsv(result.stdout.decode("utf-8", "replace"))
+
+        return self._words_from_data(data, scale)
+
+    # --- func to read tesseract's tsv into the dict pytesseract.image_to_data() gives ---
+    @classmethod
+    def _parse_tsv(cls, tsv):
+        rows = [row.split("\t") for row in tsv.strip("\n").split("\n") if row]
+        header = rows.pop(0) if rows else []
+        data = {column: [] for column in header}
+
+        for row in rows:
+            # a row of no text can come without its last tab
+            row = row + [""] * (len(header) - len(row))
+            for column, value in zip(header, row):
+                if column in cls.TSV_INT_COLUMNS:
+                    value = int(value) if value.lstrip("-").isdigit() else -1
+                elif column in cls.TSV_FLOAT_COLUMNS:
+                    try:
+                        value = float(value)
+                    except ValueError:
+                        value = -1.0
+                data[column].append(value)
+
+        return data
+
+    # --- func to read an image with the tesseract API kept loaded in this process ---
+    def _words_from_image(self, image, scale, page_number):
+
+        try:
+            tsv = get_tesserocr_tsv(image, self.tesseract_lang)
+        except Exception as e:
+            self.logger.warning(f"Tesseract OCR failed on page {page_number}: {e}")
+            return []
+
+        return self._words_from_data(self._parse_tsv(tsv), scale)
+
+    @staticmethod
+    def _words_from_data(data, scale):
+
         words = []
 
-        for i in range(len(data["text"])):
+        for i in range(len(data.get("text", []))):
 
             text = data["text"][i].strip()
 
@@ -961,6 +1686,8 @@ class TesseractParserTool:
 
             words.append({
                 "text": text,
+                # pytesseract's dict has it as a number or as a string
+                "conf": float(data["conf"][i]) if "conf" in data else -1.0,
                 "left": left,
                 "top": top,
                 "right": left + width,
@@ -1,15 +1,48 @@
 import camelot
 import logging
+from collections import defaultdict
 import re
 import statistics
 import numpy as np
 import pandas as pd
 
 class TableExtraction:
-    def __init__(self,pdf_path,pg_num, pdf_type, scanned_copy):
+    # camelot's default line_scale for lattice: a ruling line shorter than the
+    # page's width (or height) over this is too short for it to see at all
+    LINE_SCALE = 15
+
+    # the characters a table can be ruled with in text instead of paths -
+    # underscores, dashes, bars and box drawing - which lattice sees in the
+    # render like any other line
+    RULING_GLYPHS_RE = re.compile(r'^[_\-=+|\u00a6\u2010-\u2015\u2017\u203e\u2500-\u257f]$')
+
+    def __init__(self,pdf_path,pg_num, pdf_type, scanned_copy, session=None,
+                 page_xml=None):
         self.logger = logging.getLogger(__name__)
         self.pdf_type = pdf_type
-        self.tables, self.table_bbox = self.get_table_and_bbox(pdf_path,pg_num, scanned_copy)
+        self.session = session
+        self.pdf_path = pdf_path
+        self.pg_num = pg_num
+        self.scanned_copy = scanned_copy
+        self.page_xml = page_xml
+        self._tables = None
+        self._table_bbox = None
+
+    # --- the tables and their coordinates, looked for when first asked for ---
+    @property
+    def tables(self):
+        self.load_tables()
+        return self._tables
+
+    @property
+    def table_bbox(self):
+        self.load_tables()
+        return self._table_bbox
+
+    def load_tables(self):
+        if self._tables is None:
+            self._tables, self._table_bbox = self.get_table_and_bbox(
+                self.pdf_path, self.pg_num, self.scanned_copy)
     
     # --- func to find the table contents and their coordinates ---
     def get_table_and_bbox(self,pdf_path,page_num, scanned_copy):
@@ -17,7 +50,14 @@ class TableExtraction:
         bbox = {}
         if scanned_copy:
             return table, bbox
+        if self.page_xml is not None and not self.may_have_ruled_table(self.page_xml):
+            self.logger.debug(f"Page {page_num}: no ruling lines, not looking for tables")
+            return table, bbox
         try:
+            if self.session is not None:
+                # the session keeps what camelot found, so a page is looked
+                # at once whoever asks for its tables
+                return self.session.get_page_tables(page_num)
             tables_and_bbox = camelot.read_pdf(pdf_path, pages=page_num, flavor='lattice')
             for idx,tab in enumerate(tables_and_bbox):
                 table[idx] = tab.df
@@ -27,6 +67,56 @@ class TableExtraction:
 
         return table,bbox
 
+    # --- func to tell from the page xml whether lattice can find a table ---
+    @classmethod
+    def may_have_ruled_table(cls, pg):
+        """camelot's lattice renders the page and looks for ruling lines in
+        the image, a table being where horizontal and vertical ones cross, so
+        on a page with nothing long enough drawn in either direction it can
+        find nothing - and most pages of an act are just text. What is drawn
+        on the page is in its xml already: the lines, rects and curves of its
+        vector paths, its images, which may be of a ruled table too, and its
+        chars, some of which - runs of underscores, dashes, bars, box drawing
+        - rule a table in text. A ruling is often drawn as a run of short
+        pieces, one per cell or char, so the edges of all of them are summed
+        up by the x (or y) they are at, and a page is taken as ruled in a
+        direction once some x (or y) has half the length lattice needs. That
+        overestimates any line with gaps in it. What it cannot see are
+        rulings drawn with glyphs other than those of RULING_GLYPHS_RE, or
+        with a font whose chars do not say what they draw, and a table of
+        those is missed on a page with no other ruling.
+        """
+        try:
+            x0, y0, x1, y1 = map(float, pg.attrib["bbox"].split(","))
+        except (KeyError, ValueError):
+            return True
+
+        min_width = abs(x1 - x0) / (cls.LINE_SCALE * 2)
+        min_height = abs(y1 - y0) / (cls.LINE_SCALE * 2)
+
+        # rounded y -> width of what is drawn along it, and x -> height
+        horizontal = defaultdict(float)
+        vertical = defaultdict(float)
+        for elem in pg.iter():
+            if elem.tag not in ('line', 'rect', 'curve') and not (
+                    elem.tag == 'figure' and elem.find('image') is not None) and not (
+                    elem.tag == 'text' and elem.text and
+                    cls.RULING_GLYPHS_RE.match(elem.text)):
+                continue
+
+            try:
+                x0, y0, x1, y1 = map(float, elem.attrib["bbox"].split(","))
+            except (KeyError, ValueError):
+                return True
+
+            for y in {round(y0), round(y1)}:
+                horizontal[y] += abs(x1 - x0)
+            for x in {round(x0), round(x1)}:
+                vertical[x] += abs(y1 - y0)
+
+        return any(width >= min_width for width in horizontal.values()) and \
+               any(height >= min_height for height in vertical.values())
+
     def get_table_width(self, idx):
         if idx not in self.table_bbox:
             return None
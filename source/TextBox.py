@@ -1,11 +1,54 @@
 import re
 import string
 import logging
+import functools
+
+import numpy as np
+
+from .CharStore import CharStore
+from .NormalizeText import NormalizeText
+
+normalize_text = NormalizeText().normalize_text
+
+
+# --- decorator that keeps what a TextBox method returns in the box's cache ---
+def memoised(func):
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        try:
+            return self.cache[key]
+        except KeyError:
+            value = self.cache[key] = func(self, *args, **kwargs)
+            return value
+
+    return wrapper
 
 
 class TextBox:
+    """A <textbox> of a page and what is asked of it.
+
+    The text of a box, and whether it is bold, upper case and so on, is asked
+    for over and over - by the header/footer detection, by every pass of Page
+    classifying it, by HTMLBuilder for the box itself and again as the next
+    box of the one before it - and never changes once the page is read, so
+    all of it is computed once per box and kept in cache (see memoised).
+
+    What goes stale is dropped with it: a footnote mark found in the box
+    after it is made has to be added with add_footnote_mark(), which drops
+    the cached text, and a box whose chars are changed in the xml itself -
+    Main.drop_overlapping_spaces() and convert_indic_fonts() do that - is
+    read again with load_chars().
+    """
 
-    def __init__(self, tb, pdf_type, font_mapper):
+    __slots__ = ("logger", "tbox", "coords", "height", "width", "font_mapper",
+                 "chars", "box", "avg_font_size", "footnotes_superscript",
+                 "cache")
+
+    # the cached methods whose result depends on the footnote marks
+    TEXT_METHODS = ("extract_text_from_tb", "get_normalized_text")
+
+    def __init__(self, tb, pdf_type, font_mapper, chars = None):
         self.logger = logging.getLogger(__name__)
 
         self.tbox = tb
@@ -16,6 +59,19 @@ class TextBox:
 
         self.font_mapper = font_mapper
 
+        self.load_chars(chars)
+
+    # --- func to (re)read the chars of the box, dropping all derived from the old ones ---
+    def load_chars(self, chars = None):
+        # the chars of the textbox, read from the CharStore of its page when
+        # the page has one, else from one made of the textbox alone
+        if chars is None or chars.get_box(self.tbox) is None:
+            chars = CharStore([self.tbox])
+        self.chars = chars
+        self.box = chars.get_box(self.tbox)
+
+        self.cache = {}
+
         self.avg_font_size = self.get_avg_font_size()
 
         # {(x0,y0,x1,y1): "3"}
@@ -23,120 +79,95 @@ class TextBox:
 
         self.get_footnotes_superscript()
 
+    # --- func to mark a char of the box as a footnote mark ---
+    def add_footnote_mark(self, bbox, mark):
+        self.footnotes_superscript[bbox] = mark
 
-    def get_avg_font_size(self):
-
-        total_size = 0.0
-
-        count = 0
-
-        for txt in self.tbox.findall(".//text"):
+        for key in [key for key in self.cache if key[0] in self.TEXT_METHODS]:
+            del self.cache[key]
 
-            try:
 
-                size = float(
-                    txt.attrib.get("size")
-                )
-
-                total_size += size
-
-                count += 1
+    def get_avg_font_size(self):
 
-            except:
-                continue
+        sizes = self.chars.size[self.chars.get_box_chars(self.box)]
+        sizes = sizes[~np.isnan(sizes)]
 
-        if count == 0:
+        if not len(sizes):
             return 0
 
-        return total_size / count
+        # summed in order, as adding them up one by one would
+        return float(np.cumsum(sizes)[-1]) / len(sizes)
     
     def get_footnotes_superscript(self):
 
+        chars = self.chars
+
         try:
-            for textline in self.tbox.findall(".//textline"):
+            for line in chars.get_line_range(self.box):
 
-                chars = textline.findall(".//text")
+                span = chars.get_char_range(line)
 
-                if not chars:
+                if not span:
                     continue
 
                 # collect sizes
-                sizes = []
-                bottoms = []
-
-                for ch in chars:
-                    try:
-                        if "size" in ch.attrib:
-                            sizes.append(float(ch.attrib["size"]))
-
-                        if "bbox" in ch.attrib:
-                            x0, y0, x1, y1 = map(
-                                float,
-                                ch.attrib["bbox"].split(",")
-                            )
-                            bottoms.append(y0)
-
-                    except Exception:
-                        continue
+                sizes = chars.size[span.start:span.stop]
+                sizes = sizes[~np.isnan(sizes)]
 
-                if not sizes:
+                bottoms = chars.y0[span.start:span.stop]
+                bottoms = bottoms[~np.isnan(bottoms)]
+
+                if not len(sizes):
                     continue
 
                 # normal text assumptions
-                base_size = max(sizes)
-                base_bottom = min(bottoms) if bottoms else 0
+                base_size = float(sizes.max())
+                base_bottom = float(bottoms.min()) if len(bottoms) else 0
 
-                for ch in chars:
+                char_sizes = chars.size[span.start:span.stop].tolist()
 
-                    txt = ch.text or ""
+                for (txt, bbox), size in zip(chars.get_line_chars(line),
+                                             char_sizes):
 
-                    if not txt.strip():
+                    if not txt.strip() or bbox is None:
                         continue
 
-                    try:
-                        size = float(ch.attrib.get("size", base_size))
-
-                        x0, y0, x1, y1 = map(
-                            float,
-                            ch.attrib["bbox"].split(",")
-                        )
+                    if size != size:
+                        size = base_size
 
+                    x0, y0, x1, y1 = bbox
 
-                        smaller_font = size < (base_size * 0.85)
+                    smaller_font = size < (base_size * 0.85)
 
-                        raised = y0 > (base_bottom + (base_size * 0.15))
+                    raised = y0 > (base_bottom + (base_size * 0.15))
 
-                        # mostly digits/symbol markers
-                        valid_mark = bool(
-                            re.fullmatch(r"[0-9*†‡]+", txt.strip())
-                        )
-
-                        if smaller_font and raised and valid_mark:
-                            self.footnotes_superscript[
-                                (x0, y0, x1, y1)
-                            ] = txt.strip()
+                    # mostly digits/symbol markers
+                    valid_mark = bool(
+                        re.fullmatch(r"[0-9*†‡]+", txt.strip())
+                    )
 
-                    except Exception:
-                        continue
+                    if smaller_font and raised and valid_mark:
+                        self.footnotes_superscript[
+                            (x0, y0, x1, y1)
+                        ] = txt.strip()
 
         except Exception as e:
             self.logger.error(
                 f"Failed superscript detection: {e}"
             )
 
+    # --- func to get the texts of the textlines, as they are in the xml ---
+    def get_line_texts(self):
+        return [self.chars.get_line_text(line)
+                for line in self.chars.get_line_range(self.box)]
+
     def extract_plain_text(self):
         all_text = []
 
         try:
-            for textline in self.tbox.findall(".//textline"):
-
-                chars = []
+            for line in self.get_line_texts():
 
-                for text in textline.findall(".//text"):
-                    if text.text:
-                        chars.append(text.text)
-
-                line = "".join(chars).replace("\n", " ").strip()
+                line = line.replace("\n", " ").strip()
 
                 if line:
                     all_text.append(line)
@@ -146,65 +177,57 @@ class TextBox:
         except Exception as e:
             self.logger.error(f"Plain text extraction failed: {e}")
             return ""
-    
-    def extract_text_from_tb(self):
-        if not self.footnotes_superscript:
-            return self.extract_plain_text()
-
-        all_text = []
-
-        try:
-            for textline in self.tbox.findall(".//textline"):
 
-                line_texts = []
-                pending_superscript = []
-
-                for text in textline.findall(".//text"):
+    # --- func to get the text of a textline, its footnote marks written out as such ---
+    def get_marked_line_text(self, line):
+        if not self.footnotes_superscript:
+            return self.chars.get_line_text(line)
 
-                    raw = text.text or ""
+        line_texts = []
+        pending_superscript = []
 
-                    if not raw:
-                        continue
+        for raw, bbox in self.chars.get_line_chars(line):
 
-                    is_super = False
+            if not raw:
+                continue
 
-                    if "bbox" in text.attrib:
-                        try:
-                            bbox = tuple(
-                                map(float,
-                                    text.attrib["bbox"].split(","))
-                            )
+            if bbox is not None and bbox in self.footnotes_superscript:
+                pending_superscript.append(
+                    self.footnotes_superscript[bbox]
+                )
+                continue
 
-                            if bbox in self.footnotes_superscript:
-                                pending_superscript.append(
-                                    self.footnotes_superscript[bbox]
-                                )
-                                is_super = True
+            if pending_superscript:
+                marker = "".join(pending_superscript)
 
-                        except Exception:
-                            pass
+                line_texts.append(
+                    "{{^{{FOOTNOTE " + marker + "}}}}"
+                )
 
-                    if not is_super:
+                pending_superscript = []
 
-                        if pending_superscript:
-                            marker = "".join(pending_superscript)
+            line_texts.append(raw)
 
-                            line_texts.append(
-                                "{{^{{FOOTNOTE " + marker + "}}}}"
-                            )
+        if pending_superscript:
+            marker = "".join(pending_superscript)
 
-                            pending_superscript = []
+            line_texts.append(
+                "{{^{{FOOTNOTE " + marker + "}}}}"
+            )
 
-                        line_texts.append(raw)
+        return "".join(line_texts)
+    
+    @memoised
+    def extract_text_from_tb(self):
+        if not self.footnotes_superscript:
+            return self.extract_plain_text()
 
-                if pending_superscript:
-                    marker = "".join(pending_superscript)
+        all_text = []
 
-                    line_texts.append(
-                        "{{^{{FOOTNOTE " + marker + "}}}}"
-                    )
+        try:
+            for line in self.chars.get_line_range(self.box):
 
-                line = "".join(line_texts).replace("\n", " ").strip()
+                line = self.get_marked_line_text(line).replace("\n", " ").strip()
 
                 if line:
                     all_text.append(line)
@@ -214,33 +237,44 @@ class TextBox:
         except Exception as e:
             self.logger.error(f"Failed to extract text: {e}")
             return ""
+
+    # --- func to get the text of the box as NormalizeText normalises it ---
+    @memoised
+    def get_normalized_text(self):
+        return normalize_text(self.extract_text_from_tb())
+
+    # --- func to get the share of the chars with text whose font name matches a pattern ---
+    def get_font_share(self, font_re):
+        chars = self.chars.get_box_chars(self.box)
+        has_text = self.chars.get_text_lengths(chars) > 0
+
+        no_of_chars = int(has_text.sum())
+        if no_of_chars == 0:
+            return None
+
+        matches = self.chars.get_font_mask(font_re)[self.chars.font_ids[chars]]
+
+        return int((matches & has_text).sum()) / no_of_chars
     
     # --- func to detect the textbox having texts font in bold for heading/title detection ---
+    @memoised
     def textFont_is_bold(self, pdf_type = None):
         bold_font_re = re.compile(r'bold', re.IGNORECASE)
-        no_of_chars = 0
-        no_of_bold_chars = 0
 
         try:
-            for textline in self.tbox.findall(".//textline"):
-                for text in textline.findall(".//text"):
-                    if text.text :
-                        no_of_chars += 1
-                        font_name = text.attrib.get("font", "")
-                        if bold_font_re.search(font_name):
-                            no_of_bold_chars += 1
-
-            if no_of_chars == 0:
+            bold_share = self.get_font_share(bold_font_re)
+
+            if bold_share is None:
                 return False  # Avoid division by zero
             
             if pdf_type == 'sebi':
-                return (no_of_bold_chars / no_of_chars) > 0.50
+                return bold_share > 0.50
             elif pdf_type == 'sebi_circulars':
-                return (no_of_bold_chars / no_of_chars) > 0.80
+                return bold_share > 0.80
             elif pdf_type == 'acts':
-                return (no_of_bold_chars / no_of_chars) > 0.50#0.1
+                return bold_share > 0.50#0.1
             else:
-                return (no_of_bold_chars / no_of_chars) > 0.75
+                return bold_share > 0.75
             
         except Exception as e:
             self.logger.error(f"Error detecting is_bold text in textbox [{self.extract_text_from_tb()}]: {e}")
@@ -248,36 +282,30 @@ class TextBox:
 
 
     # --- func to detect the textbox having texts font in italic for heading/title detection ---
+    @memoised
     def textFont_is_italic(self, pdf_type = None):
         italic_font_re = re.compile(r'italic', re.IGNORECASE)
-        no_of_chars = 0
-        no_of_italic_chars = 0
         try:
-            for textline in self.tbox.findall(".//textline"):
-                for text in textline.findall(".//text"):
-                    if text.text:
-                        no_of_chars += 1
-                        font_name = text.attrib.get("font", "")
-                        if italic_font_re.search(font_name):
-                            no_of_italic_chars += 1
-
-            if no_of_chars == 0:
+            italic_share = self.get_font_share(italic_font_re)
+
+            if italic_share is None:
                 return False  # Avoid division by zero
 
             if pdf_type == 'sebi':
-                return (no_of_italic_chars / no_of_chars) > 0.7
+                return italic_share > 0.7
             if pdf_type == 'sebi_circulars':
                 return False
             elif pdf_type == 'acts':
-                return (no_of_italic_chars / no_of_chars) > 0.50 #0.1
+                return italic_share > 0.50 #0.1
             else:
-                return (no_of_italic_chars / no_of_chars) > 0.75
+                return italic_share > 0.75
         except Exception as e:
             self.logger.error(f"Error detecting is_italic text in textbox [{self.extract_text_from_tb()}]: {e}")
             return False
 
         
     # --- func to detect the textbox having texts font in Upper Case for heading/title detection ---
+    @memoised
     def is_uppercase(self, pdf_type = None):
         total_letters = 0
         total_uppercase = 0
@@ -285,14 +313,11 @@ class TextBox:
         if pdf_type == 'sebi' or pdf_type == 'sebi_circulars':
             return False
         try:
-            for textline in self.tbox.findall(".//textline"):
-                for text in textline.findall(".//text"):
-                    if text.text:
-                        for char in text.text:
-                            if char.isalpha():
-                                total_letters += 1
-                                if char.isupper():
-                                    total_uppercase += 1
+            for char in self.chars.get_box_text(self.box):
+                if char.isalpha():
+                    total_letters += 1
+                    if char.isupper():
+                        total_uppercase += 1
 
             if total_letters == 0:
                 return False  # Avoid division by zero
@@ -314,6 +339,7 @@ class TextBox:
 
     
     # --- func to detect the textbox having texts font in Title Case for heading/title detection ---
+    @memoised
     def is_titlecase(self, pdf_type=None):
         words = []
 
@@ -321,12 +347,11 @@ class TextBox:
             return False
 
         try:
-            for textline in self.tbox.findall(".//textline"):
-                for text in textline.findall(".//text"):
-                    if text.text and isinstance(text.text, str):
-                        # Optional: strip brackets around the text
-                        cleaned_text = re.sub(r'^[\[\(\{]+|[\]\)\}]+$', '', text.text.strip())
-                        words.extend(cleaned_text.split())
+            for text in self.chars.get_texts(self.chars.get_box_chars(self.box)):
+                if text:
+                    # Optional: strip brackets around the text
+                    cleaned_text = re.sub(r'^[\[\(\{]+|[\]\)\}]+$', '', text.strip())
+                    words.extend(cleaned_text.split())
 
             if not words:
                 return False
@@ -369,18 +394,21 @@ class TextBox:
             self.logger.error(f"Error detecting is_titlecase text in textbox [{self.extract_text_from_tb()}]: {e}")
             return False
     
+    # --- func to get the indices of the chars that have both text and a bbox ---
+    def get_placed_chars(self):
+        chars = self.chars.get_box_chars(self.box)
+        placed = ((self.chars.get_text_lengths(chars) > 0)
+                  & ~np.isnan(self.chars.x0[chars]))
+
+        return np.flatnonzero(placed) + chars.start
+
     # --- func to get the first char coords of the textbox ---
+    @memoised
     def get_first_char_coordX0(self):
         try:
-            for textline in self.tbox.findall('.//textline'):
-                for text in textline.findall('.//text'):
-                    if text.text and 'bbox' in text.attrib:
-                        parts = text.attrib['bbox'].split(',')
-                        if len(parts) >= 1:
-                            x0 = float(parts[0])
-                            return x0
-                        else:
-                            self.logger.warning("Malformed bbox attribute: '%s'", text.attrib['bbox'])
+            placed = self.get_placed_chars()
+            if len(placed):
+                return float(self.chars.x0[placed[0]])
             self.logger.debug("No valid bbox found for first character X0 in textbox.",self.extract_text_from_tb())
             return None
         except Exception as e:
@@ -393,25 +421,20 @@ class TextBox:
         sentence_start_coords = None
         recording = False
         try:
-            for textline in self.tbox.findall('.//textline'):
-                line_texts = []
-                for text in textline.findall('.//text'):
-                    if text.text:
-                        line_texts.append(text.text)
-
-                line = ''.join(line_texts).replace("\n", " ").strip()
+            for textline in self.chars.get_line_range(self.box):
+                line = self.chars.get_line_text(textline).replace("\n", " ").strip()
                 if not line:
                     continue
 
                 if not recording:
-                    sentence_start_coords = textline.attrib
+                    sentence_start_coords = textline
                     recording = True
 
                 current_sentence.append(line)
 
                 if line.endswith('.'): # if '.' in line
                     sentence = ' '.join(current_sentence).strip()
-                    coord_key = tuple(map(float,sentence_start_coords.get('bbox').split(",")))
+                    coord_key = self.chars.get_line_bbox(sentence_start_coords)
                     if sentence and sentence not in set(side_note_datas.values()):
                         side_note_datas[coord_key] = sentence
 
@@ -424,20 +447,12 @@ class TextBox:
 
     
 
+    @memoised
     def get_first_char_coords(self):
         try:
-            for textline in self.tbox.findall('.//textline'):
-                for text in textline.findall('.//text'):
-                    if text.text and 'bbox' in text.attrib:
-                        parts = text.attrib['bbox'].split(',')
-                        if len(parts) == 4:
-                            try:
-                                coords = tuple(map(float, parts))
-                                return coords
-                            except ValueError:
-                                self.logger.warning("Non-numeric bbox attribute: '%s'", text.attrib['bbox'])
-                        else:
-                            self.logger.warning("Malformed bbox attribute: '%s'", text.attrib['bbox'])
+            placed = self.get_placed_chars()
+            if len(placed):
+                return self.chars.get_bbox(placed[0])
             self.logger.debug("No valid bbox found for first character in textbox: %s", self.extract_text_from_tb())
             return None
         except Exception as e:
@@ -445,25 +460,14 @@ class TextBox:
             return None
 
 
+    @memoised
     def get_last_char_coords(self):
         try:
-            last_coords = None
-            for textline in self.tbox.findall('.//textline'):
-                for text in textline.findall('.//text'):
-                    if text.text and 'bbox' in text.attrib:
-                        parts = text.attrib['bbox'].split(',')
-                        if len(parts) == 4:
-                            try:
-                                coords = tuple(map(float, parts))
-                                last_coords = coords  # keep overwriting → last char at end
-                            except ValueError:
-                                self.logger.warning("Non-numeric bbox attribute: '%s'", text.attrib['bbox'])
-                        else:
-                            self.logger.warning("Malformed bbox attribute: '%s'", text.attrib['bbox'])
-            if last_coords is None:
-                self.logger.debug("No valid bbox found for last character in textbox: %s", self.extract_text_from_tb())
-            return last_coords
+            placed = self.get_placed_chars()
+            if len(placed):
+                return self.chars.get_bbox(placed[-1])
+            self.logger.debug("No valid bbox found for last character in textbox: %s", self.extract_text_from_tb())
+            return None
         except Exception as e:
             self.logger.error("Error in get_last_char_coords: %s", str(e))
             return None
-
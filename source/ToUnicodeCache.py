@@ -0,0 +1,256 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import logging
+
+import pymupdf
+
+from .Utils import write_atomic
+
+
+class ToUnicodeCache:
+    """The ToUnicode maps ToUnicodeFixer repaired before, kept on disk across
+    runs under the font they were repaired for.
+
+    The gazettes of a department are made with the same tools from the same
+    fonts, and a Nirmala UI or Arial Unicode MS subset is embedded byte for
+    byte the same in thousands of them. What the fixer makes of a font's map
+    depends on nothing but the font - its program, the map it came with and
+    its encoding - and the fixer doing it, so the map it writes is kept here
+    under a hash of just those, and so is the fact that it left a font alone.
+    A pdf whose every font is found here is patched from the cache without
+    the fixer being run at all, which is every pdf of the common kind whose
+    fonts need no repair.
+
+    A font the fixer changed in any other way than by rewriting the stream of
+    its ToUnicode map - a map it added, a font dict it edited - is not kept,
+    and the pdf it is in is repaired by the fixer and saved whole as before.
+
+    An entry is a json file and, for a font that was repaired, the map it was
+    repaired to next to it, both written under a temporary name and renamed
+    into place so that the processes of a batch can share the cache.
+    """
+
+    # bumped whenever what an entry is keyed by or holds changes
+    FORMAT_VERSION = 1
+
+    SUBSET_PREFIX_RE = re.compile(r'^[A-Z]{6}\+')
+    REF_RE = re.compile(r'(\d+) 0 R')
+    CHARPROC_RE = re.compile(r'/([^\s/<>\[\]()]+)\s*(\d+) 0 R')
+
+    def __init__(self, cache_dir, version):
+        self.logger = logging.getLogger(__name__)
+        self.cache_dir = str(cache_dir)
+        self.version = version
+        os.makedirs(self.cache_dir, exist_ok = True)
+
+    # --- func to get the fonts of a document with what they are cached under ---
+    def get_fonts(self, doc):
+        """[{xref, name, key, object, tounicode_xref, tounicode}] of every font
+        the pages of doc use, each once."""
+        fonts = {}
+
+        for page in doc:
+            for font_xref, _, _, basefont, _, _, *_ in page.get_fonts(full = True):
+                if font_xref in fonts or font_xref <= 0:
+                    continue
+
+                tounicode_xref = self.get_ref(doc, font_xref, 'ToUnicode')
+                tounicode = doc.xref_stream(tounicode_xref) if tounicode_xref else None
+
+                fonts[font_xref] = {
+                    'xref': font_xref,
+                    'name': basefont,
+                    'key': self.get_font_key(doc, font_xref, basefont, tounicode),
+                    'object': doc.xref_object(font_xref, compressed = True),
+                    'tounicode_xref': tounicode_xref,
+                    'tounicode': tounicode,
+                }
+
+        return list(fonts.values())
+
+    # --- func to get the xref a key of an object points at, 0 if it is not a reference ---
+    @staticmethod
+    def get_ref(doc, xref, key):
+        kind, value = doc.xref_get_key(xref, key)
+        if kind != 'xref':
+            return 0
+
+        return int(value.split()[0])
+
+    # --- func to get the hash of what a font's repair depends on ---
+    def get_font_key(self, doc, font_xref, basefont, tounicode):
+        sha = hashlib.sha256()
+
+        def add(data):
+            if isinstance(data, str):
+                data = data.encode('utf-8', 'surrogatepass')
+            sha.update(b'%d:' % len(data))
+            sha.update(data)
+
+        add(str(self.FORMAT_VERSION))
+        add(self.version)
+        # the subset prefix is made up anew for every pdf the font is put into
+        add(self.SUBSET_PREFIX_RE.sub('', basefont))
+        add(doc.xref_get_key(font_xref, 'Subtype')[1])
+        add(self.get_value(doc, font_xref, 'Encoding'))
+        add(tounicode if tounicode is not None else b'')
+
+        # the font program, or the glyph procedures of a Type3 font
+        program = doc.extract_font(font_xref)[3]
+        if program:
+            add(program)
+        else:
+            for glyph_name, proc_xref in sorted(self.CHARPROC_RE.findall(
+                    self.get_value(doc, font_xref, 'CharProcs'))):
+                add(glyph_name)
+                add(doc.xref_stream(int(proc_xref)) or b'')
+
+        # and how the cids of a Type0 font are mapped to its glyphs
+        descendants = self.REF_RE.findall(self.get_value(doc, font_xref, 'DescendantFonts'))
+        if descendants:
+            descendant = int(descendants[0])
+            cid_to_gid = self.get_ref(doc, descendant, 'CIDToGIDMap')
+            if cid_to_gid:
+                add(doc.xref_stream(cid_to_gid) or b'')
+            else:
+                add(doc.xref_get_key(descendant, 'CIDToGIDMap')[1])
+
+        return sha.hexdigest()
+
+    # --- func to get the value of a key of an object, resolved if it is a reference ---
+    def get_value(self, doc, xref, key):
+        kind, value = doc.xref_get_key(xref, key)
+        if kind == 'xref':
+            # the number of the object differs from pdf to pdf, what it holds does not
+            return doc.xref_object(int(value.split()[0]), compressed = True)
+
+        return value
+
+    def get_entry_path(self, key, ext):
+        return os.path.join(self.cache_dir, key + ext)
+
+    # --- func to get the repairs of the fonts of a document, None if a font is not cached ---
+    def lookup(self, fonts):
+        """(the names of the repaired fonts, {ToUnicode xref: repaired map}),
+        or None if any of the fonts has not been seen by the fixer before."""
+        fixed_fonts = set()
+        patches = {}
+
+        for font in fonts:
+            try:
+                with open(self.get_entry_path(font['key'], '.json'), encoding = 'utf-8') as f:
+                    entry = json.load(f)
+                if entry.get('format') != self.FORMAT_VERSION:
+                    return None
+                if not entry['repaired']:
+                    continue
+                with open(self.get_entry_path(font['key'], '.cmap'), 'rb') as f:
+                    tounicode = f.read()
+            except (OSError, ValueError, KeyError):
+                return None
+
+            if not font['tounicode_xref']:
+                return None
+
+            fixed_fonts.add(self.get_fixed_name(font, entry['fixed_name']))
+            patches[font['tounicode_xref']] = tounicode
+
+        return fixed_fonts, patches
+
+    # --- func to keep what the fixer did to the fonts of a document ---
+    def learn(self, doc, fonts, fixed_names):
+        """Compares the fonts of doc with what they were before the fixer ran
+        and keeps the ones it left alone or only rewrote the map of. Returns
+        {ToUnicode xref: repaired map}, or None if the fixer changed a font in
+        any other way, and doc has to be saved whole."""
+        patches = {}
+        replayable = True
+
+        for font in fonts:
+            xref = font['xref']
+            tounicode_xref = self.get_ref(doc, xref, 'ToUnicode')
+            tounicode = doc.xref_stream(tounicode_xref) if tounicode_xref else None
+
+            if doc.xref_object(xref, compressed = True) != font['object'] or \
+               tounicode_xref != font['tounicode_xref']:
+                replayable = False
+                continue
+
+            if tounicode == font['tounicode']:
+                self.put(font, None, None)
+                continue
+
+            fixed_name = self.get_fixed_name_in(font, fixed_names)
+            self.put(font, fixed_name, tounicode)
+            patches[tounicode_xref] = tounicode
+
+        return patches if replayable else None
+
+    # --- func to get the name the fixer gave a font, without the pdf's subset prefix ---
+    def get_fixed_name_in(self, font, fixed_names):
+        names = [name for name in fixed_names if name and name in font['name']]
+        name = max(names, key = len) if names else font['name']
+
+        return self.SUBSET_PREFIX_RE.sub('', name)
+
+    # --- func to put a cached name back in the form the font has in this pdf ---
+    def get_fixed_name(self, font, fixed_name):
+        prefix = self.SUBSET_PREFIX_RE.match(font['name'])
+        if prefix and font['name'] == prefix.group() + fixed_name:
+            return font['name']
+
+        return fixed_name
+
+    # --- func to write the entry of a font ---
+    def put(self, font, fixed_name, tounicode):
+        entry = {
+            'format': self.FORMAT_VERSION,
+            'font': font['name'],
+            'repaired': tounicode is not None,
+            'fixed_name': fixed_name,
+        }
+
+        try:
+            # the map first, so that an entry that says repaired has one
+            if tounicode is not None:
+                write_atomic(self.get_entry_path(font['key'], '.cmap'), tounicode)
+            write_atomic(self.get_entry_path(font['key'], '.json'),
+                         json.dumps(entry, ensure_ascii = False).encode('utf-8'))
+        except OSError as e:
+            # a cache that cannot be written to only costs the next run time
+            self.logger.warning("Could not keep the repaired map of %s: %s",
+                                font['name'], e)
+
+    # --- func to write repaired maps into a document ---
+    @staticmethod
+    def apply(doc, patches):
+        for tounicode_xref, tounicode in patches.items():
+            doc.update_stream(tounicode_xref, tounicode)
+
+    # --- func to write a copy of a pdf with repaired maps appended to it ---
+    def write_incremental_copy(self, pdf_path, copy_path, patches):
+        """Copies pdf_path to copy_path and appends the repaired maps to the
+        copy as an incremental update: the rest of the pdf is not written out
+        again object by object, only the streams that changed are. Returns
+        False if the pdf cannot be updated incrementally (a pdf pymupdf had to
+        repair to open, or an encrypted one), leaving nothing at copy_path."""
+        shutil.copyfile(pdf_path, copy_path)
+
+        try:
+            with pymupdf.open(copy_path) as copy:
+                if not copy.can_save_incrementally():
+                    raise ValueError("pdf cannot be updated incrementally")
+                self.apply(copy, patches)
+                copy.saveIncr()
+        except Exception as e:
+            self.logger.debug("Saving the repaired copy of %s whole: %s", pdf_path, e)
+            try:
+                os.remove(copy_path)
+            except OSError:
+                pass
+            return False
+
+        return True
@@ -1,8 +1,12 @@
 import re
 import io
 import os
+import hashlib
 import contextlib
 import logging
+import importlib.metadata
+import tempfile
+import threading
 from pathlib import Path
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
@@ -27,7 +31,7 @@ TESSERACT_LANGUAGES = [
     "urd",  # Urdu
 ]
 
-OCR_ENGINES_AVAILABLE = ["tesseract", "paddleocr"]
+OCR_ENGINES_AVAILABLE = ["tesseract", "tesserocr", "paddleocr"]
 
 TESSERACT_TO_PADDLE_LANG = {
     "eng": "en",
@@ -41,7 +45,20 @@ TESSERACT_TO_PADDLE_LANG = {
 
 _LANG_MODEL = None
 _PADDLE_OCR_ENGINES = {}
+# (lang, psm) -> (tesserocr.PyTessBaseAPI, lock), one per process
+_TESSEROCR_APIS = {}
+_TESSEROCR_APIS_LOCK = threading.Lock()
+# tesseract's page segmentation modes: whole page, one block of text
+TESSERACT_PSM_AUTO = 3
+TESSERACT_PSM_SINGLE_BLOCK = 6
+# the header the tsv renderer of the command writes and the API does not
+TESSERACT_TSV_HEADER = "\t".join([
+    "level", "page_num", "block_num", "par_num", "line_num", "word_num",
+    "left", "top", "width", "height", "conf", "text",
+])
 LOGGER = logging.getLogger(__name__)
+# the permissions a new file is given, see _get_new_file_mode()
+_NEW_FILE_MODE = None
 
 def _get_lang_model():
     global _LANG_MODEL
@@ -79,6 +96,47 @@ def _extract_text_tesseract(image_path, lang):
         str(image_path), lang=lang, config="--oem 3 --psm 6"
     ).strip()
 
+def is_tesserocr_available():
+    import importlib.util
+    return importlib.util.find_spec("tesserocr") is not None
+
+# --- func to get the tesseract API of a language, loaded once per process ---
+def _get_tesserocr_api(lang, psm):
+    """The tesseract command loads the traineddata of the language anew for
+    every image it reads, which for hin, san or ben is most of the time a
+    small figure takes. An API of libtesseract keeps it loaded, so one is made
+    per language and mode the first time it is needed and kept for every
+    image after, by every thread of the process in turn - an API reads one
+    image at a time. Worker processes each make their own."""
+    key = (lang, psm)
+    with _TESSEROCR_APIS_LOCK:
+        if key not in _TESSEROCR_APIS:
+            import tesserocr
+            api = tesserocr.PyTessBaseAPI(lang=lang, psm=psm,
+                                          oem=tesserocr.OEM.DEFAULT)
+            _TESSEROCR_APIS[key] = (api, threading.Lock())
+    return _TESSEROCR_APIS[key]
+
+def _extract_text_tesserocr(image_path, lang):
+    api, lock = _get_tesserocr_api(lang, TESSERACT_PSM_SINGLE_BLOCK)
+    with lock:
+        api.SetImageFile(str(image_path))
+        return api.GetUTF8Text().strip()
+
+# --- func to get the tsv `tesseract image stdout tsv` writes, from a loaded API ---
+def get_tesserocr_tsv(image, lang, psm=TESSERACT_PSM_AUTO):
+    api, lock = _get_tesserocr_api(lang, psm)
+    with lock:
+        api.SetImage(image)
+        api.Recognize()
+        return TESSERACT_TSV_HEADER + "\n" + api.GetTSVText(0)
+
+def clear_tesserocr_apis():
+    with _TESSEROCR_APIS_LOCK:
+        for api, _ in _TESSEROCR_APIS.values():
+            api.End()
+        _TESSEROCR_APIS.clear()
+
 def _extract_text_paddleocr(image_path, lang):
     paddle_lang = TESSERACT_TO_PADDLE_LANG.get(lang)
     if paddle_lang is None:
@@ -103,6 +161,8 @@ def extract_text(image_path, lang, engine="tesseract"):
     try:
         if engine == "paddleocr":
             return _extract_text_paddleocr(image_path, lang)
+        if engine == "tesserocr":
+            return _extract_text_tesserocr(image_path, lang)
         return _extract_text_tesseract(image_path, lang)
     except Exception:
         return None
@@ -126,6 +186,87 @@ def detect_language(text):
 
 ROMAN_RE  = r"(?:M{0,4}(?:CM|CD|D?C{0,3})(?:XC|XL|L?X{0,3})(?:IX|IV|V?I{0,3}))"
 
+# --- func to write a file under a temporary name and rename it into place ---
+def write_atomic(path, data_or_writer, suffix=""):
+    """Write path so that a reader, another run or another process, never
+    sees half of it: the content goes to a temporary file beside path, which
+    is renamed over it once complete and removed if anything fails.
+
+    data_or_writer is bytes, a str written as utf-8, or a function called
+    with the temporary file opened for binary writing. The file keeps the
+    permissions of the one it replaces, and a new one gets those open()
+    would have given it, and not the 0600 of mkstemp."""
+    path = os.fspath(path)
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except OSError:
+        mode = _get_new_file_mode()
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                    prefix=".tmp-", suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if callable(data_or_writer):
+                data_or_writer(f)
+            elif isinstance(data_or_writer, str):
+                f.write(data_or_writer.encode('utf-8'))
+            else:
+                f.write(data_or_writer)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+# --- func to get the permissions open() gives a new file, from the umask ---
+def _get_new_file_mode():
+    """os.umask() can only be read by setting it, which other threads
+    creating files at that moment would get, so it is read from /proc where
+    there is one, and taken to be the usual 022 where there is not."""
+    global _NEW_FILE_MODE
+    if _NEW_FILE_MODE is None:
+        umask = 0o022
+        try:
+            with open("/proc/self/status", encoding="ascii") as f:
+                for line in f:
+                    if line.startswith("Umask:"):
+                        umask = int(line.split()[1], 8)
+                        break
+        except (OSError, ValueError):
+            pass
+        _NEW_FILE_MODE = 0o666 & ~umask
+    return _NEW_FILE_MODE
+
+# --- func to get a version of an installed package that changes with its code ---
+def get_package_version(module):
+    """The version of the distribution module comes from, followed by a hash
+    of the files of its package. A source checkout or an editable install
+    has no version, or one that stays the same as its code changes, and
+    anything kept on disk under the version has to be dropped when the code
+    making it does."""
+    package = module.__name__.partition(".")[0]
+    try:
+        version = importlib.metadata.version(package)
+    except importlib.metadata.PackageNotFoundError:
+        # a distribution named other than its package, or none at all
+        dists = importlib.metadata.packages_distributions().get(package)
+        version = importlib.metadata.version(dists[0]) if dists else "unknown"
+
+    package_dir = Path(module.__file__).resolve().parent
+    while (package_dir.parent / "__init__.py").exists():
+        package_dir = package_dir.parent
+
+    sha = hashlib.sha256()
+    for path in sorted(package_dir.rglob("*")):
+        if not path.is_file() or "__pycache__" in path.parts:
+            continue
+        sha.update(path.relative_to(package_dir).as_posix().encode("utf-8") + b"\0")
+        sha.update(path.read_bytes())
+
+    return f"{version}+{sha.hexdigest()[:16]}"
+
 def is_chapter(text):
         pattern = rf"""
             ^\s*
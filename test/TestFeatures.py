@@ -0,0 +1,183 @@
+import csv
+import sys
+import random
+import shutil
+import logging
+import tempfile
+import unittest
+from pathlib import Path
+from collections import Counter
+
+# so that this file works when run as a script too, and not just through
+# 'python -m unittest' from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from machinelearning import features
+from machinelearning.features import (PhraseIndex, PhraseHasher, iter_phrases,
+                                      tokenize, vectorize)
+
+# a few lines of each class, the legacy indic one drawn as latin gibberish
+CORPUS = {
+    "krutidev": [
+        "Hkkjr dk jkti= vlk/kkj.k",
+        "izkf/kdkj ls izdkf'kr",
+        "Hkkx II [k.M 3 mi[k.M ii",
+        "ubZ fnYyh] 'kqØokj",
+    ],
+    "not_required": [
+        "The Gazette of India Extraordinary",
+        "Published by authority",
+        "Part II Section 3 Sub-section ii",
+        "New Delhi, Friday",
+    ],
+}
+
+
+def make_samples(rng, num_samples, words = 12, max_len = 20):
+    """Samples of a small vocabulary of words, so that phrases repeat."""
+    vocabulary = [f"w{i}" for i in range(words)]
+    return [("label", [rng.choice(vocabulary) for _ in range(rng.randrange(max_len))])
+            for _ in range(num_samples)]
+
+
+class TestPhraseFeatures(unittest.TestCase):
+    """The phrase counts, with a vocabulary and hashed, which need no Orange."""
+
+    def test_phrase_index_count(self):
+        rng = random.Random(1)
+        samples = make_samples(rng, 200)
+        for min_n, max_n in ((1, 5), (2, 3), (1, 1), (3, 5)):
+            counter = Counter()
+            for _label, tokens in samples:
+                counter.update(iter_phrases(tokens, min_n, max_n))
+            # every other phrase, so that some prefixes are not phrases of it
+            vocab = sorted(counter)[::2]
+            index = PhraseIndex(vocab, min_n, max_n)
+
+            for _label, tokens in samples:
+                with self.subTest(min_n=min_n, max_n=max_n, tokens=tokens):
+                    expected = Counter(index.index[phrase]
+                                       for phrase in iter_phrases(tokens, min_n, max_n)
+                                       if phrase in index.index)
+                    self.assertEqual(index.count(tokens), expected)
+
+    def test_vectorize_with_vocabulary(self):
+        samples = make_samples(random.Random(2), 50)
+        vocab = ["w1", "w1 w2", "w3 w3 w3", "w0 w1 w2 w3 w4"]
+        X = vectorize(samples, vocab).toarray()
+
+        for row, (_label, tokens) in zip(X, samples):
+            phrases = Counter(iter_phrases(tokens))
+            self.assertEqual(list(row), [phrases[phrase] for phrase in vocab])
+
+    def test_phrase_hasher_row_sums(self):
+        samples = make_samples(random.Random(3), 200) + [("label", [])]
+        for min_n, max_n in ((1, 5), (2, 3), (1, 1)):
+            hasher = PhraseHasher(10, min_n, max_n)
+            X = hasher.transform([tokens for _label, tokens in samples])
+
+            self.assertEqual(X.shape, (len(samples), 1 << 10))
+            # every phrase of a sample is counted once, in some column
+            self.assertEqual(list(X.sum(axis = 1).A1),
+                             [len(list(iter_phrases(tokens, min_n, max_n)))
+                              for _label, tokens in samples])
+
+    def test_phrase_hasher_is_per_phrase(self):
+        hasher = PhraseHasher(16)
+        tokens = tokenize("Hkkjr dk jkti= vlk/kkj.k")
+        # a phrase is the same column in whichever sample and batch it is
+        alone = hasher.transform([tokens])
+        batch = hasher.transform([["ds", "ls"], tokens, tokens[:2]])
+        self.assertEqual((alone != batch[1]).nnz, 0)
+        self.assertEqual((hasher.transform([tokens[:2]]) != batch[2]).nnz, 0)
+
+    def test_phrase_hasher_width(self):
+        for bits in (0, 32):
+            with self.assertRaises(ValueError):
+                PhraseHasher(bits)
+
+
+class CorpusTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = Path(tempfile.mkdtemp(prefix="features-"))
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def write_csv(self, corpus):
+        with open(self.data_dir / features.CORPUS_CSV, "w", encoding="utf8", newline="") as f:
+            writer = csv.DictWriter(f, [features.LABEL_FIELD, "font", "pdf", features.TEXT_FIELD])
+            writer.writeheader()
+            for label, lines in corpus.items():
+                for line in lines:
+                    writer.writerow({features.LABEL_FIELD: label, "font": "", "pdf": "",
+                                     features.TEXT_FIELD: line})
+
+    def write_files(self, corpus):
+        for label, lines in corpus.items():
+            (self.data_dir / f"{label}.txt").write_text("\n".join(lines) + "\n", encoding="utf8")
+
+
+class TestReadCorpus(CorpusTestCase):
+    """read_corpus() in the csv layout FontSurvey -td writes and in the
+    per-class files it wrote before."""
+
+    def assertCorpus(self, samples, counts):
+        self.assertEqual(sorted(samples),
+                         sorted((label, tokenize(line))
+                                for label, lines in CORPUS.items() for line in lines))
+        self.assertEqual(counts, {label: len(lines) for label, lines in CORPUS.items()})
+
+    def test_csv(self):
+        self.write_csv(CORPUS)
+        self.assertCorpus(*features.read_corpus(self.data_dir))
+
+    def test_per_class_files(self):
+        self.write_files(CORPUS)
+        with self.assertLogs(features.logger, logging.WARNING) as logs:
+            self.assertCorpus(*features.read_corpus(self.data_dir))
+        self.assertIn(f"no {features.CORPUS_CSV}", logs.output[0])
+
+    def test_max_per_class(self):
+        self.write_csv(CORPUS)
+        samples, counts = features.read_corpus(self.data_dir, max_per_class=2)
+        self.assertEqual(len(samples), 4)
+        self.assertEqual(counts, {label: 2 for label in CORPUS})
+
+    def test_empty(self):
+        self.write_csv({})
+        with self.assertRaisesRegex(ValueError, "no samples in"):
+            features.read_corpus(self.data_dir)
+
+
+@unittest.skipUnless(features.ORANGE_AVAILABLE, "Orange is needed to build a feature table")
+class TestBuildDataset(CorpusTestCase):
+    """build_dataset() on a tiny corpus."""
+
+    def assertDataset(self, **kwargs):
+        table, vocab = features.build_dataset(self.data_dir, min_samples=2, **kwargs)
+
+        self.assertEqual(len(table), sum(len(lines) for lines in CORPUS.values()))
+        self.assertEqual(sorted(table.domain.class_var.values), sorted(CORPUS))
+        self.assertEqual(table.X.shape[1], len(vocab))
+        return table, vocab
+
+    def test_csv_corpus(self):
+        self.write_csv(CORPUS)
+        _table, vocab = self.assertDataset()
+        self.assertIn("Hkkjr", vocab)
+
+    def test_csv_corpus_hashed(self):
+        self.write_csv(CORPUS)
+        _table, vocab = self.assertDataset(hash_bits=8)
+        self.assertEqual(len(vocab), 2 ** 8)
+
+    def test_per_class_files(self):
+        self.write_files(CORPUS)
+        with self.assertLogs(features.logger, logging.WARNING):
+            self.assertDataset()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import io
+import sys
+import asyncio
+import logging
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from PIL import Image
+
+# so that this file works when run as a script too, and not just through
+# 'python -m unittest' from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from source.LensScheduler import LensPageScheduler, LensOCRError, StubLensAPI
+from source.ParserTool import ChromeLensParserTool
+
+TEST_PDFS_DIR = Path(__file__).resolve().parent / "test_pdfs"
+
+
+class FakePage:
+    def __init__(self, number):
+        self.number = number
+
+
+class FakePixmap:
+    """A page rendered as an image as wide as its page number, for the stub
+    to tell the pages apart by."""
+
+    def __init__(self, page):
+        self.image = Image.new("L", (page.number + 1, 1))
+
+    def tobytes(self, output):
+        buf = io.BytesIO()
+        self.image.save(buf, output.upper())
+        return buf.getvalue()
+
+
+def get_page_num(image):
+    return image.width
+
+
+def read_page(image):
+    return [{"page": get_page_num(image)}]
+
+
+def failing_on(pages, times=None):
+    """An answer that fails the requests for pages: every one, or the first
+    `times` of each page."""
+    failures = {}
+
+    def answer(image):
+        page_num = get_page_num(image)
+        if page_num in pages and (times is None or failures.get(page_num, 0) < times):
+            failures[page_num] = failures.get(page_num, 0) + 1
+            raise ConnectionError(f"no answer for page {page_num}")
+        return read_page(image)
+
+    return answer
+
+
+SLEEP = asyncio.sleep
+
+
+async def no_wait(delay):
+    await SLEEP(0)
+
+
+class TestLensScheduler(unittest.TestCase):
+
+    def schedule(self, lens, num_pages, **kwargs):
+        scheduler = LensPageScheduler(lens, FakePixmap, **kwargs)
+        return scheduler.run([FakePage(i) for i in range(num_pages)])
+
+    def test_page_order(self):
+        lens = StubLensAPI(read_page)
+        results = self.schedule(lens, 7)
+        self.assertEqual(results, [[{"page": i}] for i in range(1, 8)])
+
+    def test_concurrency_limit(self):
+        for concurrency in (1, 3):
+            with self.subTest(concurrency=concurrency):
+                lens = StubLensAPI(read_page, delay=0.01)
+                results = self.schedule(lens, 10, concurrency=concurrency)
+
+                self.assertEqual(lens.max_in_flight, concurrency)
+                self.assertEqual(lens.requests, 10)
+                self.assertEqual(results, [[{"page": i}] for i in range(1, 11)])
+
+    def test_retry_with_jitter(self):
+        lens = StubLensAPI(failing_on({2, 4}, times=2))
+
+        with mock.patch("source.LensScheduler.random.uniform",
+                        return_value=0.0) as uniform, \
+             mock.patch("source.LensScheduler.asyncio.sleep", new=no_wait), \
+             self.assertLogs("source.LensScheduler", logging.WARNING):
+            results = self.schedule(lens, 5, base_delay=1.0, max_delay=1.5)
+
+        self.assertEqual(results, [[{"page": i}] for i in range(1, 6)])
+        self.assertEqual(lens.requests, 5 + 2 * 2)
+        # full jitter: anything from no wait to the exponential delay, capped
+        self.assertEqual(sorted(call.args for call in uniform.call_args_list),
+                         [(0, 1.0), (0, 1.0), (0, 1.5), (0, 1.5)])
+
+    def test_failed_page_fails_the_document(self):
+        lens = StubLensAPI(failing_on({2}), delay=0.01)
+
+        with self.assertLogs("source.LensScheduler", logging.WARNING), \
+             self.assertRaisesRegex(LensOCRError, "Page 2 OCR failed after 3 tries"):
+            self.schedule(lens, 12, concurrency=2, retries=3, base_delay=0.0)
+
+        # the pages still waiting were not sent
+        self.assertLess(lens.requests, 12 + 2)
+
+    def test_partial_failure(self):
+        lens = StubLensAPI(failing_on({2}))
+
+        with self.assertLogs("source.LensScheduler", logging.ERROR) as logs:
+            results = self.schedule(lens, 4, retries=3, base_delay=0.0,
+                                    allow_partial=True)
+
+        self.assertEqual(results, [[{"page": 1}], None, [{"page": 3}], [{"page": 4}]])
+        self.assertEqual(lens.requests, 4 + 2)
+        self.assertIn("Page 2 OCR failed after 3 tries", logs.output[-1])
+
+    def test_breaker(self):
+        for allow_partial in (False, True):
+            with self.subTest(allow_partial=allow_partial):
+                lens = StubLensAPI(failing_on(set(range(1, 21))))
+
+                with mock.patch("source.LensScheduler.asyncio.sleep", new=no_wait), \
+                     self.assertLogs("source.LensScheduler", logging.WARNING), \
+                     self.assertRaisesRegex(LensOCRError, "failed 8 requests in a row"):
+                    self.schedule(lens, 20, concurrency=4, retries=20,
+                                  allow_partial=allow_partial)
+
+                # and not the 20 x 20 of every page waiting out its tries
+                self.assertLessEqual(lens.requests, 8 + 3)
+
+    def test_breaker_resets_on_a_page_read(self):
+        # 2 failed tries of each of 10 pages, 20 failures in all, but never
+        # more than 8 in a row with one page read at a time
+        lens = StubLensAPI(failing_on(set(range(1, 11)), times=2))
+
+        with mock.patch("source.LensScheduler.asyncio.sleep", new=no_wait), \
+             self.assertLogs("source.LensScheduler", logging.WARNING):
+            results = self.schedule(lens, 10, concurrency=1)
+
+        self.assertEqual(results, [[{"page": i}] for i in range(1, 11)])
+
+    def parse(self, lens, **kwargs):
+        tool = ChromeLensParserTool(str(TEST_PDFS_DIR / "act1.pdf"), lens=lens, **kwargs)
+        # the pages of the pdf rendered the way the stub tells them apart
+        tool.get_scheduler = lambda: LensPageScheduler(
+            lens, FakePixmap, retries=2, base_delay=0.0,
+            allow_partial=tool.allow_partial
+        )
+        return tool.build_xml(1, 3)
+
+    def test_parser_fails_on_a_failed_page(self):
+        lens = StubLensAPI(failing_on({2}))
+
+        with self.assertLogs("source.LensScheduler", logging.WARNING), \
+             self.assertRaises(LensOCRError):
+            self.parse(lens)
+
+    def test_parser_keeps_the_other_pages(self):
+        lens = StubLensAPI(failing_on({2}))
+
+        with self.assertLogs("source.LensScheduler", logging.ERROR):
+            pages = self.parse(lens, allow_partial=True)
+
+        self.assertEqual([page.get("id") for page in pages], ["1", "3"])
+
+
+if __name__ == '__main__':
+    unittest.main()
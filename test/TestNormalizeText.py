@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+import unittest
+from pathlib import Path
+
+import pymupdf
+
+# so that this file works when run as a script too, and not just through
+# 'python -m unittest' from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from source.NormalizeText import (NormalizeText, NORMALIZE_MAP,
+                                  compile_normalize_map)
+
+TEST_PDFS_DIR = Path(__file__).resolve().parent / "test_pdfs"
+
+
+def normalize_text_sequential(text, normalize_map = NORMALIZE_MAP):
+    """What normalize_text() did before it was compiled into one pass, one
+    str.replace() per entry of the map."""
+    if not isinstance(text, str):
+        return text
+    for bad, good in normalize_map.items():
+        text = text.replace(bad, good)
+    return text
+
+
+def get_test_pdf_texts():
+    """The text of the test PDFs in blocks of about the size of a textbox,
+    which is what normalize_text() is called on."""
+    texts = []
+    for pdf_path in sorted(TEST_PDFS_DIR.glob("*.pdf")):
+        with pymupdf.open(pdf_path) as doc:
+            for page in doc:
+                texts.extend(block[4] for block in page.get_text("blocks"))
+    return texts
+
+
+class TestNormalizeText(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.normalize_text = NormalizeText().normalize_text
+        cls.texts = get_test_pdf_texts()
+
+    def test_same_as_sequential_on_test_pdfs(self):
+        self.assertTrue(self.texts)
+        for text in self.texts:
+            self.assertEqual(self.normalize_text(text),
+                             normalize_text_sequential(text))
+
+    def test_same_as_sequential_on_every_entry(self):
+        every_entry = "".join(NORMALIZE_MAP)
+        for text in (every_entry, " ".join(NORMALIZE_MAP),
+                     every_entry[::-1], "a" + every_entry * 3 + "z"):
+            self.assertEqual(self.normalize_text(text),
+                             normalize_text_sequential(text))
+
+    def test_not_a_string(self):
+        self.assertIsNone(self.normalize_text(None))
+        self.assertEqual(self.normalize_text(3), 3)
+
+    def test_later_entries_apply_to_earlier_replacements(self):
+        normalize_map = {"a": "b", "b": "c", "c": "c"}
+        normalize_re, replacements = compile_normalize_map(normalize_map)
+        text = "abcab"
+
+        self.assertEqual(
+            normalize_re.sub(lambda m: replacements[m.group()], text),
+            normalize_text_sequential(text, normalize_map)
+        )
+
+    def test_multichar_keys_are_not_compiled(self):
+        self.assertIsNone(compile_normalize_map({"a": "y", "ab": "x"}))
+
+    # timings are only compared when asked for, a loaded machine making them noise
+    @unittest.skipUnless(os.environ.get("RUN_BENCHMARKS"),
+                         "set RUN_BENCHMARKS=1 to time normalize_text")
+    def test_benchmark_against_sequential(self):
+        def best_of(func, repeat = 5):
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for text in self.texts:
+                    func(text)
+                timings.append(time.perf_counter() - start)
+            return min(timings)
+
+        sequential = best_of(normalize_text_sequential)
+        single_pass = best_of(self.normalize_text)
+
+        self.assertLess(single_pass, sequential,
+                        f"normalize_text on {len(self.texts)} text blocks: "
+                        f"sequential {sequential * 1000:.1f} ms, "
+                        f"single pass {single_pass * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    unittest.main()
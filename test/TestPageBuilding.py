@@ -0,0 +1,147 @@
+import io
+import re
+import sys
+import shutil
+import logging
+import tempfile
+import unittest
+from pathlib import Path
+
+import pymupdf
+from PIL import Image
+
+# so that this file works when run as a script too, and not just through
+# 'python -m unittest' from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from source.Main import Main
+from source.LayoutCache import LayoutCache
+
+TEST_PDFS_DIR = Path(__file__).resolve().parent / "test_pdfs"
+
+# page 1 of it draws an inline image, besides its XObjects
+INLINE_IMAGE_PDF = TEST_PDFS_DIR / "gazette1.pdf"
+START_PAGE, END_PAGE = 1, 3
+MIN_IMG_PIXELS = 1
+
+
+def convert(output_dir, layout_cache_dir = None, page_workers = 1,
+            pdf_path = INLINE_IMAGE_PDF, start_page = START_PAGE, end_page = END_PAGE):
+    """The html of start_page..end_page of pdf_path, the page xml built in
+    page_workers processes and read from and written to a LayoutCache in
+    layout_cache_dir if one is given."""
+    main = Main(
+        pdfPath=str(pdf_path),
+        output_dir=str(output_dir),
+        pdf_type="egazette",
+        is_amendment_pdf=False,
+        has_side_notes=False,
+        has_doc_end=False,
+        is_footnote_continuation=False,
+        min_img_pixels=MIN_IMG_PIXELS,
+        ocr_language="eng",
+        is_scanned_copy=False,
+        table_extract=False,
+        layout_cache_size=0,
+        page_workers=page_workers,
+    )
+    if layout_cache_dir is not None:
+        main.layout_cache = LayoutCache(layout_cache_dir)
+
+    try:
+        if not main.parsePDF("egazette", None, None, None, start_page, end_page):
+            raise AssertionError(f"could not parse {pdf_path}")
+        main.buildHTML(start_page, end_page)
+    finally:
+        main.clear_cache_pdf()
+        main.clear_xml_cache()
+
+    html_files = sorted(Path(output_dir).glob("*.html"))
+    if len(html_files) != 1:
+        raise AssertionError(f"expected one html file in {output_dir}, found {html_files}")
+
+    return html_files[0].read_text(encoding="utf-8")
+
+
+class TestPageBuilding(unittest.TestCase):
+    """The html of a pdf does not depend on where its page xml came from:
+    built here, built in worker processes or read from the LayoutCache."""
+
+    @classmethod
+    def setUpClass(cls):
+        logging.disable(logging.WARNING)
+        cls.tmp_dir = Path(tempfile.mkdtemp(prefix="page-building-"))
+        cls.serial_html = convert(cls.tmp_dir / "serial")
+
+    @classmethod
+    def tearDownClass(cls):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+
+    def test_inline_image_is_placed(self):
+        self.assertIn("InlineImage1_0", self.serial_html)
+
+    def test_cold_and_warm_layout_cache(self):
+        cache_dir = self.tmp_dir / "layout"
+        cold = convert(self.tmp_dir / "cold", cache_dir)
+        warm = convert(self.tmp_dir / "warm", cache_dir)
+
+        self.assertEqual(cold, self.serial_html)
+        self.assertEqual(warm, cold)
+
+    def test_page_workers(self):
+        self.assertEqual(convert(self.tmp_dir / "workers", page_workers=3),
+                         self.serial_html)
+
+
+def write_pdf(pdf_path, colours):
+    """A pdf of a page per colour, each drawing an image of just that colour.
+    pymupdf names the image of every page fzImg0."""
+    doc = pymupdf.open()
+    for colour in colours:
+        page = doc.new_page()
+        page.insert_text((72, 72), "A page with an image")
+        buf = io.BytesIO()
+        Image.new("RGB", (64, 48), colour).save(buf, "PNG")
+        page.insert_image(pymupdf.Rect(72, 100, 200, 200), stream=buf.getvalue())
+    doc.save(str(pdf_path))
+    doc.close()
+
+
+class TestPageImages(unittest.TestCase):
+    """Images are told apart by their pixels and not by their names, which are
+    only unique on their page."""
+
+    def setUp(self):
+        logging.disable(logging.WARNING)
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="page-images-"))
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def convert(self, colours):
+        pdf_path = self.tmp_dir / "images.pdf"
+        write_pdf(pdf_path, colours)
+        output_dir = self.tmp_dir / "html"
+        html = convert(output_dir, pdf_path=pdf_path, start_page=1, end_page=len(colours))
+        return (re.findall(r'<img src="([^"]*)"', html),
+                sorted(str(path.relative_to(output_dir)) for path in output_dir.rglob("*.png")))
+
+    def test_images_of_one_name(self):
+        srcs, files = self.convert([(200, 0, 0), (0, 0, 200)])
+
+        self.assertEqual(len(srcs), 2)
+        self.assertNotEqual(srcs[0], srcs[1])
+        self.assertEqual(files, sorted(srcs))
+
+    def test_repeated_image(self):
+        # drawn on pages 1 and 3, a logo: dropped, and the image of page 2 kept
+        srcs, files = self.convert([(200, 0, 0), (0, 0, 200), (200, 0, 0)])
+
+        self.assertEqual(len(srcs), 1)
+        self.assertEqual(files, srcs)
+
+
+if __name__ == '__main__':
+    unittest.main()
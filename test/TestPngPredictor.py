@@ -0,0 +1,161 @@
+import os
+import sys
+import time
+import random
+import unittest
+from pathlib import Path
+
+# so that this file works when run as a script too, and not just through
+# 'python -m unittest' from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pdfminer import utils as pdfminer_utils
+from pdfminer.pdfexceptions import PDFValueError
+
+from source.Figure import apply_png_predictor
+
+
+def apply_png_predictor_bytewise(pred, colors, columns, bitspercomponent, data):
+    """What apply_png_predictor() did before it was vectorised, byte by
+    byte in Python."""
+    nbytes = (colors * columns * bitspercomponent + 7) // 8
+    bpp = max(1, (colors * bitspercomponent + 7) // 8)
+
+    buf = bytearray()
+    line_above = bytearray(nbytes)
+
+    for i in range(0, len(data), nbytes + 1):
+        filter_type = data[i]
+        line = data[i + 1: i + 1 + nbytes]
+        raw = bytearray()
+
+        if filter_type == 0:
+            raw += line
+
+        elif filter_type == 1:
+            for j, x in enumerate(line):
+                left = raw[j - bpp] if j >= bpp else 0
+                raw.append((x + left) & 0xFF)
+
+        elif filter_type == 2:
+            for j, x in enumerate(line):
+                raw.append((x + line_above[j]) & 0xFF)
+
+        elif filter_type == 3:
+            for j, x in enumerate(line):
+                left = raw[j - bpp] if j >= bpp else 0
+                raw.append((x + (left + line_above[j]) // 2) & 0xFF)
+
+        elif filter_type == 4:
+            for j, x in enumerate(line):
+                left = raw[j - bpp] if j >= bpp else 0
+                upleft = line_above[j - bpp] if j >= bpp else 0
+                paeth = pdfminer_utils.paeth_predictor(
+                    left, line_above[j], upleft
+                )
+                raw.append((x + paeth) & 0xFF)
+
+        else:
+            raise PDFValueError(f"Unsupported predictor value: {filter_type}")
+
+        buf += raw
+        line_above = raw + bytearray(nbytes - len(raw))
+
+    return bytes(buf)
+
+
+# (colors, bitspercomponent) of the images pdfs hold: masks, grey, rgb, cmyk
+LAYOUTS = [(1, 1), (1, 2), (1, 4), (1, 8), (3, 8), (4, 8), (1, 16), (3, 16)]
+
+
+def make_data(rng, colors, columns, bitspercomponent, nrows, filters):
+    nbytes = (colors * columns * bitspercomponent + 7) // 8
+    data = bytearray()
+    for _ in range(nrows):
+        data.append(rng.choice(filters))
+        data += bytes(rng.getrandbits(8) for _ in range(nbytes))
+    return bytes(data)
+
+
+class TestPngPredictor(unittest.TestCase):
+
+    def assertSameAsBytewise(self, colors, columns, bitspercomponent, data):
+        self.assertEqual(
+            apply_png_predictor(15, colors, columns, bitspercomponent, data),
+            apply_png_predictor_bytewise(15, colors, columns, bitspercomponent, data)
+        )
+
+    def test_each_filter_alone(self):
+        rng = random.Random(1)
+        for colors, bpc in LAYOUTS:
+            for filter_type in range(5):
+                for columns in (1, 7, 13, 64):
+                    data = make_data(rng, colors, columns, bpc, 6, [filter_type])
+                    with self.subTest(colors=colors, bpc=bpc,
+                                      filter_type=filter_type, columns=columns):
+                        self.assertSameAsBytewise(colors, columns, bpc, data)
+
+    def test_mixed_filters(self):
+        rng = random.Random(2)
+        for colors, bpc in LAYOUTS:
+            for filters in ([0, 1, 2], [0, 1, 2, 3, 4], [2, 4], [3, 2]):
+                data = make_data(rng, colors, 21, bpc, 12, filters)
+                with self.subTest(colors=colors, bpc=bpc, filters=filters):
+                    self.assertSameAsBytewise(colors, 21, bpc, data)
+
+    def test_truncated_last_row(self):
+        rng = random.Random(3)
+        for colors, bpc in LAYOUTS:
+            for filters in ([1], [2], [3], [4], [0, 1, 2, 3, 4]):
+                data = make_data(rng, colors, 9, bpc, 5, filters)
+                nbytes = (colors * 9 * bpc + 7) // 8
+                for cut in (1, nbytes // 2 + 1, nbytes):
+                    with self.subTest(colors=colors, bpc=bpc, filters=filters, cut=cut):
+                        self.assertSameAsBytewise(colors, 9, bpc, data[:-cut])
+
+    def test_empty(self):
+        self.assertSameAsBytewise(1, 8, 8, b"")
+
+    def test_rounded_up_stride(self):
+        # four rows of a 13-pixel-wide 1-bit mask, 2 bytes a row
+        decoded = apply_png_predictor(15, 1, 13, 1, b"\x00\xaa\xf8" * 4)
+        self.assertEqual(decoded, b"\xaa\xf8" * 4)
+
+    def test_unsupported_filter(self):
+        data = make_data(random.Random(4), 1, 8, 8, 3, [0]) + b"\x05" + bytes(8)
+        with self.assertRaisesRegex(PDFValueError, "Unsupported predictor value: 5"):
+            apply_png_predictor(15, 1, 8, 8, data)
+
+    # timings are only compared when asked for, a loaded machine making them noise
+    @unittest.skipUnless(os.environ.get("RUN_BENCHMARKS"),
+                         "set RUN_BENCHMARKS=1 to time apply_png_predictor")
+    def test_benchmark_against_bytewise(self):
+        # a 600 x 800 rgb scan, rows of the filters an encoder picks per row
+        rng = random.Random(5)
+        columns, nrows = 600, 800
+        images = {
+            "Up": make_data(rng, 3, columns, 8, nrows, [2]),
+            "None/Sub/Up": make_data(rng, 3, columns, 8, nrows, [0, 1, 2]),
+            "Paeth": make_data(rng, 3, columns, 8, nrows, [4]),
+        }
+
+        def best_of(func, data, repeat = 3):
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                func(15, 3, columns, 8, data)
+                timings.append(time.perf_counter() - start)
+            return min(timings)
+
+        for name, data in images.items():
+            bytewise = best_of(apply_png_predictor_bytewise, data)
+            vectorised = best_of(apply_png_predictor, data)
+
+            self.assertLess(vectorised, bytewise,
+                            f"apply_png_predictor on a {columns}x{nrows} rgb image, "
+                            f"{name} rows: bytewise {bytewise * 1000:.1f} ms, "
+                            f"vectorised {vectorised * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    unittest.main()
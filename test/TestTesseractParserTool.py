@@ -0,0 +1,415 @@
+import sys
+import time
+import types
+import shutil
+import subprocess
+import logging
+import unittest
+import multiprocessing
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from unittest import mock
+
+import pymupdf
+import pytesseract
+from PIL import Image, ImageDraw, ImageFont
+
+# so that this file works when run as a script too, and not just through
+# 'python -m unittest' from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from source import Utils
+from source.ParserTool import TesseractParserTool, split_into_runs
+
+TEST_PDFS_DIR = Path(__file__).resolve().parent / "test_pdfs"
+
+# 11 pages
+OCR_PDF = TEST_PDFS_DIR / "sebi2.pdf"
+
+TSV_HEADER = ("level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\t"
+              "left\ttop\twidth\theight\tconf\ttext")
+
+
+def fake_ocr_page(self, page, dpi=300):
+    """A reading of a page that names it, the later pages of the pdf read
+    sooner so that the runs of the workers finish out of order."""
+    time.sleep(0.002 * (20 - page.number))
+    self.strategy_stats["colour"]["tries"] += 1
+    self.strategy_stats["colour"]["wins"] += 1
+    return [{"text": f"page{page.number + 1}", "conf": 95.0,
+             "left": 10.0, "top": 10.0, "right": 50.0, "bottom": 20.0,
+             "block": 1, "par": 1, "line": 1}]
+
+
+class TestParseTsv(unittest.TestCase):
+    """tesseract's tsv read into the dict pytesseract.image_to_data() gives."""
+
+    def test_columns(self):
+        data = TesseractParserTool._parse_tsv(
+            TSV_HEADER + "\n"
+            "1\t1\t0\t0\t0\t0\t0\t0\t2480\t3508\t-1\t\n"
+            "5\t1\t1\t1\t1\t1\t120\t200\t86\t30\t96.032539\tGazette\n"
+        )
+
+        self.assertEqual(data["level"], [1, 5])
+        self.assertEqual(data["left"], [0, 120])
+        self.assertEqual(data["conf"], [-1.0, 96.032539])
+        self.assertEqual(data["text"], ["", "Gazette"])
+
+    def test_short_rows(self):
+        # a row of no text can come without its last tab, or more of it
+        data = TesseractParserTool._parse_tsv(
+            TSV_HEADER + "\n"
+            "4\t1\t1\t1\t1\t0\t0\t0\t10\t10\t-1\n"
+            "3\t1\t1\t1\n"
+        )
+
+        self.assertEqual(data["text"], ["", ""])
+        self.assertEqual(data["conf"], [-1.0, -1.0])
+        self.assertEqual(data["par_num"], [1, 1])
+        self.assertEqual(data["line_num"], [1, -1])
+        self.assertEqual(data["word_num"], [0, -1])
+        self.assertEqual(data["height"], [10, -1])
+
+    def test_unreadable_numbers(self):
+        data = TesseractParserTool._parse_tsv(
+            TSV_HEADER + "\n"
+            "5\t1\t1\t1\t1\t1\t-3\tx\t86\t30\tnan?\tword\n"
+        )
+
+        self.assertEqual(data["left"], [-3])
+        self.assertEqual(data["top"], [-1])
+        self.assertEqual(data["conf"], [-1.0])
+
+    def test_empty(self):
+        self.assertEqual(TesseractParserTool._parse_tsv(""), {})
+        self.assertEqual(TesseractParserTool._parse_tsv(TSV_HEADER + "\n"),
+                         {column: [] for column in TSV_HEADER.split("\t")})
+
+    def test_words(self):
+        data = TesseractParserTool._parse_tsv(
+            TSV_HEADER + "\n"
+            "4\t1\t1\t1\t1\t0\t100\t200\t400\t40\t-1\t\n"
+            "5\t1\t1\t1\t1\t1\t100\t200\t80\t40\t91.5\tThe\n"
+            "5\t1\t1\t1\t1\t2\t200\t200\t20\t40\t12\t \n"
+        )
+
+        self.assertEqual(TesseractParserTool._words_from_data(data, 0.5), [{
+            "text": "The", "conf": 91.5,
+            "left": 50.0, "top": 100.0, "right": 90.0, "bottom": 120.0,
+            "block": 1, "par": 1, "line": 1,
+        }])
+
+
+def make_pixmap(paper, ink=None, ink_share=0.1, mode="RGB", size=(400, 600)):
+    """A render of a page of paper grey with lines of ink grey across
+    ink_share of it, as pymupdf renders a page."""
+    image = Image.new("L", size, paper)
+    if ink is not None:
+        draw = ImageDraw.Draw(image)
+        # a line 4 pixels high, as high as the sampling step, every
+        # 4 / ink_share rows
+        every = round(4 / ink_share)
+        for top in range(0, size[1], every):
+            draw.rectangle((0, top, size[0], top + 3), fill=ink)
+    image = image.convert(mode)
+    colorspace = pymupdf.csRGB if mode == "RGB" else pymupdf.csGRAY
+    return pymupdf.Pixmap(colorspace, image.width, image.height, image.tobytes(), 0)
+
+
+class FakePage:
+    def __init__(self, number, pix):
+        self.number = number
+        self.pix = pix
+
+    def get_pixmap(self, dpi=300, alpha=False):
+        return self.pix
+
+
+def words_of(conf, count=3):
+    return [{"text": "word", "conf": conf, "left": 0, "top": 0, "right": 1,
+             "bottom": 1, "block": 1, "par": 1, "line": 1}] * count
+
+
+class TestStrategies(unittest.TestCase):
+    """The strategies a page is read with, on made up renders and readings
+    with no tesseract to read them."""
+
+    def setUp(self):
+        self.tool = TesseractParserTool(str(OCR_PDF), "en")
+
+    def test_render_stats(self):
+        for mode in ("RGB", "L"):
+            with self.subTest(mode=mode):
+                paper, ink, darkest, dark_share = self.tool.get_render_stats(
+                    make_pixmap(240, 20, ink_share=0.1, mode=mode))
+
+                self.assertEqual((paper, ink, darkest), (240, 20, 20))
+                self.assertAlmostEqual(dark_share, 0.1, delta=0.02)
+
+    def test_render_stats_of_rgb(self):
+        image = Image.new("RGB", (64, 64), (250, 240, 230))
+        pix = pymupdf.Pixmap(pymupdf.csRGB, 64, 64, image.tobytes(), 0)
+        grey = image.convert("L").getpixel((0, 0))
+
+        self.assertEqual(self.tool.get_render_stats(pix), (grey, grey, grey, 0.0))
+
+    def test_order(self):
+        strategies = list(TesseractParserTool.STRATEGIES)
+        cases = {
+            "plain": (make_pixmap(255, 0), strategies),
+            "blank": (make_pixmap(255), strategies),
+            "faint": (make_pixmap(230, 170), ["binarized", "colour", "ghostscript"]),
+            "dark": (make_pixmap(100, 0, ink_share=0.5), ["binarized", "colour", "ghostscript"]),
+        }
+        for name, (pix, order) in cases.items():
+            with self.subTest(name):
+                self.assertEqual(self.tool.get_strategy_order(pix), order)
+
+    def test_learned_order(self):
+        self.tool.learned = "ghostscript"
+
+        for paper, ink in ((255, 0), (230, 170)):
+            self.assertEqual(self.tool.get_strategy_order(make_pixmap(paper, ink)),
+                             ["ghostscript", "colour", "binarized"])
+
+        # but a blank render is read as it is first, whatever was learned
+        self.assertEqual(self.tool.get_strategy_order(make_pixmap(255))[0], "colour")
+
+    def test_learn(self):
+        tool = self.tool
+        for strategy in ("binarized", "binarized", "colour", "binarized", "binarized"):
+            tool.learn(strategy)
+            self.assertIsNone(tool.learned)
+
+        tool.learn("binarized")
+        self.assertEqual((tool.learned, tool.streak), ("binarized", 3))
+
+        # another winning resets the streak, but not what was learned
+        tool.learn("ghostscript")
+        self.assertEqual((tool.learned, tool.last_winner, tool.streak),
+                         ("binarized", "ghostscript", 1))
+
+    def test_reading_score(self):
+        score = TesseractParserTool.get_reading_score
+        self.assertEqual(score([]), 0.0)
+        # the -1 of a row tesseract has no confidence for counts for nothing
+        self.assertEqual(score(words_of(-1.0) + words_of(50.0)), 150.0)
+        self.assertGreater(score(words_of(40.0, 5)), score(words_of(90.0, 2)))
+
+    def read(self, readings, pix=None):
+        """_ocr_page() of a page each strategy reads as readings has it."""
+        tried = []
+
+        def ocr_with(strategy, pix, scale, page_number, dpi):
+            tried.append(strategy)
+            return readings[strategy]
+
+        with mock.patch.object(self.tool, "_ocr_with", ocr_with):
+            words = self.tool._ocr_page(FakePage(0, pix or make_pixmap(255, 0)))
+        return words, tried
+
+    def test_first_confident_reading(self):
+        words, tried = self.read({"colour": words_of(30.0), "binarized": words_of(80.0),
+                                  "ghostscript": words_of(99.0)})
+
+        self.assertEqual(words, words_of(80.0))
+        self.assertEqual(tried, ["colour", "binarized"])
+        self.assertEqual(self.tool.strategy_stats["binarized"]["wins"], 1)
+        self.assertEqual(self.tool.last_winner, "binarized")
+
+    def test_best_reading(self):
+        # no reading is confident enough: the one scored highest is kept
+        words, tried = self.read({"colour": words_of(30.0), "binarized": words_of(50.0, 1),
+                                  "ghostscript": []})
+
+        self.assertEqual(words, words_of(30.0))
+        self.assertEqual(tried, list(TesseractParserTool.STRATEGIES))
+        self.assertIsNone(self.tool.last_winner)
+
+    def test_learned_strategy_failing(self):
+        self.tool.learned = "ghostscript"
+        words, tried = self.read({"colour": words_of(90.0), "binarized": [],
+                                  "ghostscript": words_of(10.0)})
+
+        self.assertEqual(tried, ["ghostscript", "colour"])
+        self.assertEqual(words, words_of(90.0))
+        self.assertIsNone(self.tool.learned)
+
+    def test_learned_after_pages_in_a_row(self):
+        readings = {"colour": [], "binarized": words_of(90.0), "ghostscript": []}
+        for _ in range(TesseractParserTool.LEARN_AFTER):
+            _words, tried = self.read(readings)
+            self.assertEqual(tried, ["colour", "binarized"])
+
+        _words, tried = self.read(readings)
+        self.assertEqual(tried, ["binarized"])
+
+
+class TestSplitIntoRuns(unittest.TestCase):
+
+    def test_runs(self):
+        self.assertEqual(split_into_runs(list(range(1, 11)), 4),
+                         [[1, 2, 3], [4, 5, 6], [7, 8, 9], [10]])
+        self.assertEqual(split_into_runs(list(range(1, 9)), 4),
+                         [[1, 2], [3, 4], [5, 6], [7, 8]])
+
+    def test_fewer_pages_than_runs(self):
+        self.assertEqual(split_into_runs([3, 4, 5], 8), [[3], [4], [5]])
+
+    def test_every_page_once_in_order(self):
+        page_nums = list(range(5, 42))
+        for num_runs in range(1, 50):
+            with self.subTest(num_runs=num_runs):
+                runs = split_into_runs(page_nums, num_runs)
+                self.assertLessEqual(len(runs), num_runs)
+                self.assertEqual([page for run in runs for page in run], page_nums)
+
+
+# what libtesseract's tsv renderer gives, without the header the command adds
+API_TSV = ("1\t1\t0\t0\t0\t0\t0\t0\t400\t100\t-1\t\n"
+           "4\t1\t1\t1\t1\t0\t20\t30\t200\t40\t-1\t\n"
+           "5\t1\t1\t1\t1\t1\t20\t30\t90\t40\t95.116737\tGazette\n"
+           "5\t1\t1\t1\t1\t2\t120\t30\t40\t40\t91.8\tof\n")
+
+
+class FakeTessBaseAPI:
+    """Stands in for tesserocr.PyTessBaseAPI, reading every image as API_TSV."""
+
+    def __init__(self, lang, psm, oem):
+        self.lang, self.psm, self.oem = lang, psm, oem
+        self.images = []
+        self.ended = False
+
+    def SetImage(self, image):
+        self.images.append(image.size)
+
+    def Recognize(self):
+        pass
+
+    def GetTSVText(self, page):
+        return API_TSV
+
+    def End(self):
+        self.ended = True
+
+
+def make_fake_tesserocr():
+    return types.SimpleNamespace(PyTessBaseAPI=mock.Mock(side_effect=FakeTessBaseAPI),
+                                 OEM=types.SimpleNamespace(DEFAULT=3))
+
+
+def make_text_image():
+    image = Image.new("L", (800, 200), 255)
+    ImageDraw.Draw(image).text((40, 60), "The Gazette of India", fill=0,
+                               font=ImageFont.load_default(size=48))
+    return image
+
+
+class TestTesserocr(unittest.TestCase):
+    """The tesseract API kept loaded per process, through a stand-in for
+    tesserocr unless said otherwise."""
+
+    def setUp(self):
+        self.tesserocr = make_fake_tesserocr()
+        patcher = mock.patch.dict(sys.modules, {"tesserocr": self.tesserocr})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # the APIs made with the stand-in are not left to the other tests
+        Utils.clear_tesserocr_apis()
+        self.addCleanup(Utils.clear_tesserocr_apis)
+
+    def test_api_per_lang_and_psm(self):
+        eng, _lock = Utils._get_tesserocr_api("eng", 3)
+
+        self.assertIs(Utils._get_tesserocr_api("eng", 3)[0], eng)
+        self.assertIsNot(Utils._get_tesserocr_api("eng", 6)[0], eng)
+        self.assertIsNot(Utils._get_tesserocr_api("hin", 3)[0], eng)
+        self.assertEqual(self.tesserocr.PyTessBaseAPI.call_count, 3)
+
+        image = make_text_image()
+        Utils.get_tesserocr_tsv(image, "eng")
+        Utils.get_tesserocr_tsv(image, "eng")
+        self.assertEqual(eng.images, [image.size, image.size])
+        self.assertEqual(self.tesserocr.PyTessBaseAPI.call_count, 3)
+
+    def test_clear(self):
+        apis = [Utils._get_tesserocr_api("eng", psm)[0] for psm in (3, 6)]
+
+        Utils.clear_tesserocr_apis()
+
+        self.assertTrue(all(api.ended for api in apis))
+        self.assertEqual(Utils._TESSEROCR_APIS, {})
+        # and the next one needed is loaded anew
+        self.assertIsNot(Utils._get_tesserocr_api("eng", 3)[0], apis[0])
+        self.assertEqual(self.tesserocr.PyTessBaseAPI.call_count, 3)
+
+    def test_tsv(self):
+        self.assertEqual(Utils.get_tesserocr_tsv(make_text_image(), "eng"),
+                         Utils.TESSERACT_TSV_HEADER + "\n" + API_TSV)
+
+    def test_same_words_as_the_command(self):
+        image_bytes = TesseractParserTool._to_pnm(make_text_image())
+        tsv = Utils.TESSERACT_TSV_HEADER + "\n" + API_TSV
+        command = subprocess.CompletedProcess([], 0, stdout=tsv.encode("utf-8"))
+
+        with mock.patch("source.ParserTool.subprocess.run", return_value=command):
+            by_command = TesseractParserTool(str(OCR_PDF), "en")._words_from_image_bytes(
+                image_bytes, 0.24, 1)
+        by_api = TesseractParserTool(str(OCR_PDF), "en", engine="tesserocr") \
+            ._words_from_image_bytes(image_bytes, 0.24, 1)
+
+        self.assertEqual([word["text"] for word in by_api], ["Gazette", "of"])
+        self.assertEqual(by_api, by_command)
+
+
+@unittest.skipUnless(Utils.is_tesserocr_available()
+                     and shutil.which(pytesseract.pytesseract.tesseract_cmd),
+                     "tesserocr and the tesseract command are needed")
+class TestTesserocrReading(unittest.TestCase):
+    """What libtesseract reads of an image comes out as the same words
+    through tesserocr as through the tesseract command."""
+
+    def tearDown(self):
+        Utils.clear_tesserocr_apis()
+
+    def test_same_words_as_the_command(self):
+        image_bytes = TesseractParserTool._to_pnm(make_text_image())
+
+        by_command = TesseractParserTool(str(OCR_PDF), "en")._words_from_image_bytes(
+            image_bytes, 0.24, 1)
+        by_api = TesseractParserTool(str(OCR_PDF), "en", engine="tesserocr") \
+            ._words_from_image_bytes(image_bytes, 0.24, 1)
+
+        self.assertTrue(by_command)
+        self.assertEqual(by_api, by_command)
+
+
+@unittest.skipUnless(multiprocessing.get_start_method() == "fork",
+                     "the workers have to inherit the patched _ocr_page")
+class TestOcrWorkers(unittest.TestCase):
+    """The pages OCRed in worker processes come back in page order, as they
+    are OCRed in this one."""
+
+    def build_xml(self, workers):
+        tool = TesseractParserTool(str(OCR_PDF), "en", workers=workers)
+        # and not OCRed here after all, which is logged as a warning
+        with mock.patch.object(TesseractParserTool, "_ocr_page", fake_ocr_page), \
+             self.assertNoLogs("source.ParserTool", logging.WARNING):
+            pages = tool.build_xml(2, 10)
+        return [ET.tostring(page, encoding="unicode") for page in pages], tool
+
+    def test_page_order(self):
+        serial, _tool = self.build_xml(1)
+        parallel, tool = self.build_xml(3)
+
+        self.assertEqual(parallel, serial)
+        self.assertEqual([ET.fromstring(page).get("id") for page in parallel],
+                         [str(page_num) for page_num in range(2, 11)])
+        self.assertIn(">p<", parallel[0])
+        # the stats of every worker added up
+        self.assertEqual(tool.strategy_stats["colour"], {"tries": 9, "wins": 9, "seconds": 0.0})
+
+
+if __name__ == '__main__':
+    unittest.main()